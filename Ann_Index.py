@@ -0,0 +1,269 @@
+"""Nearest neighbour backends for catalogs far larger than the bundled one.
+
+Three backends answer kneighbours(test_point, k) / kneighbours_batch(test_points, k)
+like KNNEngine and can be passed to KNearestNeighbours in place of the data:
+
+- 'brute':   KNNEngine itself, exact
+- 'grouped': GroupedIndex (Grouped_Index.py), exact, one distance per distinct
+             feature vector and only for the vectors near the query
+- 'ivf':     an inverted file index. A k-means coarse quantizer (pure NumPy)
+             splits the movies into lists; a query scans only the nprobe lists
+             with the closest centroids and ranks those movies with the exact
+             distance of the engine's feature space. More probes, higher recall,
+             higher latency.
+
+Build, save and check recall against the exact backend:
+
+    python Ann_Index.py --lists 256 --out ./Data/ann
+    python Ann_Index.py --report --nprobe 1 2 4 8 16
+
+A saved index is reused while it matches the catalog, the feature space and
+--lists; --rebuild forces a new one. Every save writes a new generation of
+files (centroids.3.npy, ...) and then swaps in the meta file naming them, so
+a reader never pairs a meta file with arrays it does not describe.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from Catalog import CATALOG_DIR, load_catalog
+from Classifier import FeatureSpace, KNNEngine
+from Grouped_Index import GroupedIndex
+
+ANN_DIR = './Data/ann'
+DEFAULT_NPROBE = 8
+ASSIGN_CHUNK = 65536  # rows assigned to centroids at a time
+LEGACY_FILES = {'centroids': 'centroids.npy', 'order': 'order.npy', 'offsets': 'offsets.npy'}
+
+
+def _nearest_centroid(points, centroids):
+    """Return the index of the closest centroid of every point (squared euclidean, float32)"""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(points.shape[0], dtype=np.int32)
+    for start in range(0, points.shape[0], ASSIGN_CHUNK):
+        chunk = points[start:start + ASSIGN_CHUNK]
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 does not change the argmin
+        scores = centroid_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        labels[start:start + ASSIGN_CHUNK] = np.argmin(scores, axis=1)
+    return labels
+
+
+def kmeans(points, n_clusters, iterations=10, sample=100000, seed=0):
+    """Lloyd's k-means on a random sample of the points, returns the (n_clusters x d) float32 centroids"""
+    rng = np.random.default_rng(seed)
+    if points.shape[0] > sample:
+        points = points[np.sort(rng.choice(points.shape[0], sample, replace=False))]
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    n_clusters = min(n_clusters, points.shape[0])
+    centroids = points[rng.choice(points.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest_centroid(points, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters with random points so every list stays usable
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(points.shape[0], len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Approximate nearest neighbours: k-means lists over the engine's feature space, exact re-ranking"""
+
+    def __init__(self, engine, centroids, order, offsets, nprobe=DEFAULT_NPROBE):
+        self.engine = engine
+        self.centroids = centroids
+        # Movie IDs grouped by list, list i is order[offsets[i]:offsets[i + 1]]
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, engine, n_lists=None, nprobe=DEFAULT_NPROBE, iterations=10, seed=0):
+        """Cluster the engine's rows into n_lists lists (about sqrt(rows) by default)"""
+        points = cls._points(engine, engine.matrix)
+        n_lists = n_lists or max(1, int(np.sqrt(len(engine))))
+        centroids = kmeans(points, n_lists, iterations, seed=seed)
+        labels = _nearest_centroid(np.asarray(points, dtype=np.float32), centroids)
+        order = np.argsort(labels, kind='stable').astype(np.int32)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        return cls(engine, centroids, order, offsets, nprobe)
+
+    @staticmethod
+    def _points(engine, rows):
+        # Lists are built in the weighted euclidean view of the space whatever its metric;
+        # the final ranking always uses the space's own distance
+        return engine.space.transform(np.atleast_2d(rows))
+
+    def __len__(self):
+        return len(self.engine)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def candidates(self, test_point, nprobe=None):
+        """Return the IDs of the movies in the nprobe lists closest to the query"""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        point = np.asarray(self._points(self.engine, np.asarray(test_point, dtype=np.float64)), dtype=np.float32)
+        gaps = ((self.centroids - point) ** 2).sum(axis=1)
+        lists = np.argpartition(gaps, nprobe - 1)[:nprobe] if nprobe < self.n_lists else np.arange(self.n_lists)
+        ids = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        # Sorted IDs keep ties broken by index, as in the exact search
+        return np.sort(ids)
+
+    def kneighbours(self, test_point, k, nprobe=None):
+        """Method returns the indices and distances of (approximately) the k nearest rows"""
+        ids = self.candidates(test_point, nprobe)
+        distances = self.engine.distances_to(test_point, ids)
+        order = KNNEngine.select(distances, k)
+        return ids[order].astype(np.intp), distances[order]
+
+    def kneighbours_batch(self, test_points, k, nprobe=None):
+        """Method returns the (n_queries x k) indices and distances, rows padded with -1 / inf when short"""
+        queries = np.atleast_2d(np.asarray(test_points, dtype=np.float64))
+        indices = np.full((queries.shape[0], k), -1, dtype=np.intp)
+        distances = np.full((queries.shape[0], k), np.inf)
+        for row, query in enumerate(queries):
+            found, found_distances = self.kneighbours(query, k, nprobe)
+            indices[row, :len(found)] = found
+            distances[row, :len(found)] = found_distances
+        return indices, distances
+
+    def save(self, index_dir=ANN_DIR, catalog_version=None):
+        """Write the lists as a new generation of files, then the meta file naming them and recording
+        the catalog and space they were built from"""
+        os.makedirs(index_dir, exist_ok=True)
+        previous = _read_meta(index_dir) or {}
+        generation = previous.get('generation', 0) + 1
+        files = {name: f'{name}.{generation}.npy' for name in ('centroids', 'order', 'offsets')}
+        # Never files an existing meta names, so a reader pairs a meta only with its own arrays
+        for name, array in (('centroids', self.centroids), ('order', self.order), ('offsets', self.offsets)):
+            np.save(os.path.join(index_dir, files[name]), array)
+        meta = {'catalog_version': catalog_version, 'rows': len(self), 'lists': self.n_lists,
+                'nprobe': self.nprobe, 'space': self.engine.space.signature, 'generation': generation,
+                'files': files}
+        # Write the meta last, and swap it in, so a half-written index never looks fresh
+        tmp_path = os.path.join(index_dir, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(index_dir, 'meta.json'))
+        # Keep the previous generation for readers that opened its meta just before the swap
+        keep = set(files.values()) | set(previous.get('files', LEGACY_FILES).values())
+        for name in LEGACY_FILES:
+            for path in glob.glob(os.path.join(index_dir, f'{name}*.npy')):
+                if os.path.basename(path) not in keep:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    @classmethod
+    def load(cls, engine, index_dir=ANN_DIR, catalog_version=None):
+        """Open a saved index for an engine, returns None when missing or built from other data"""
+        meta = _read_meta(index_dir)
+        if meta is None or meta.get('rows') != len(engine) or meta.get('space') != engine.space.signature:
+            return None
+        if catalog_version is not None and meta.get('catalog_version') != catalog_version:
+            return None
+        # Indexes written before generations have fixed file names
+        files = meta.get('files', LEGACY_FILES)
+        try:
+            centroids = np.load(os.path.join(index_dir, files['centroids']))
+            order = np.load(os.path.join(index_dir, files['order']), mmap_mode='r')
+            offsets = np.load(os.path.join(index_dir, files['offsets']))
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(engine, centroids, order, offsets, meta.get('nprobe', DEFAULT_NPROBE))
+
+
+def _read_meta(index_dir):
+    try:
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def make_backend(name, engine, **options):
+    """Return the 'brute' or 'grouped' (exact) or 'ivf' (approximate) backend over an engine"""
+    if name == 'brute':
+        return engine
+    if name == 'grouped':
+        return GroupedIndex(engine, **options)
+    if name == 'ivf':
+        return IVFIndex.build(engine, **options)
+    raise ValueError(f"Unknown backend {name!r}, expected 'brute', 'grouped' or 'ivf'")
+
+
+def recall_report(engine, index, queries, k=10, nprobes=(1, 2, 4, 8, 16)):
+    """Compare the index against the exact search, returns one row per nprobe
+
+    recall@k counts an approximate neighbour as found when it is no farther than
+    the exact k-th neighbour, so movies tied at the same distance count as equal.
+    """
+    started = time.perf_counter()
+    exact = [engine.kneighbours(query, k) for query in queries]
+    exact_ms = (time.perf_counter() - started) / len(queries) * 1000
+    report = []
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        approximate = [index.kneighbours(query, k, nprobe) for query in queries]
+        ms = (time.perf_counter() - started) / len(queries) * 1000
+        found = sum(int(np.sum(distances <= exact_distances[-1])) if len(exact_distances) else 0
+                    for (_, distances), (_, exact_distances) in zip(approximate, exact))
+        report.append({'nprobe': nprobe, 'recall': found / (k * len(queries)), 'ms_per_query': ms,
+                       'exact_ms_per_query': exact_ms})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an IVF nearest neighbour index and report its recall')
+    parser.add_argument('--catalog', default=CATALOG_DIR, help='catalog directory (falls back to the JSON files)')
+    parser.add_argument('--out', default=ANN_DIR, help='index directory')
+    parser.add_argument('--lists', type=int, default=None,
+                        help='number of k-means lists (default: sqrt(rows), or those of the saved index)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[DEFAULT_NPROBE],
+                        help='lists scanned per query, saved with the index (several values with --report)')
+    parser.add_argument('--rebuild', action='store_true', help='build a new index even when the saved one matches')
+    parser.add_argument('--report', action='store_true', help='print recall@k and latency against the exact search')
+    parser.add_argument('--queries', type=int, default=200, help='catalog movies used as report queries')
+    parser.add_argument('-k', type=int, default=10, help='neighbours per query in the report')
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    engine = KNNEngine(catalog.matrix, space=FeatureSpace())
+    index = None if args.rebuild else IVFIndex.load(engine, args.out, catalog.version)
+    # k-means makes at most one list per movie
+    if index is None or (args.lists and min(args.lists, len(engine)) != index.n_lists):
+        started = time.perf_counter()
+        index = IVFIndex.build(engine, args.lists, args.nprobe[0])
+        index.save(args.out, catalog.version)
+        print(f'Built {index.n_lists} lists over {len(index)} movies in {time.perf_counter() - started:.1f}s '
+              f'to {args.out}')
+    elif index.nprobe != args.nprobe[0]:
+        # Same lists, only the default number of probes changes
+        index.nprobe = args.nprobe[0]
+        index.save(args.out, catalog.version)
+        print(f'Saved nprobe {index.nprobe} with the {index.n_lists} lists in {args.out}')
+    if args.report:
+        rng = np.random.default_rng(0)
+        picks = rng.choice(len(engine), min(args.queries, len(engine)), replace=False)
+        queries = [np.asarray(engine.matrix[i]) for i in picks]
+        print(f'recall@{args.k} over {len(queries)} queries (exact search: ', end='')
+        for i, row in enumerate(recall_report(engine, index, queries, args.k, args.nprobe)):
+            if i == 0:
+                print(f"{row['exact_ms_per_query']:.2f} ms/query)")
+            print(f"  nprobe {row['nprobe']:4d}: recall {row['recall']:.3f}, {row['ms_per_query']:.2f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
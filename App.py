@@ -1,94 +1,47 @@
 
 import streamlit as st
-
-# Page configuration
-st.set_page_config(
-    page_title="CinemaScope - Movie Recommendation System",
-    page_icon="🎬",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-from PIL import Image
-import json
-import re
 import os
-from Classifier import KNearestNeighbours
-from bs4 import BeautifulSoup
-import requests, io
-import PIL.Image
-from urllib.request import urlopen
+from Recommender import Recommender, catalog_key
+import Enrichment
+import Metrics
+from Enrichment import fetch_poster, fetch_movie_info
+import threading
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# Load data
-@st.cache_data
-def load_data():
-    with open('./Data/movie_data.json', 'r+', encoding='utf-8') as f:
-        data = json.load(f)
-    with open('./Data/movie_titles.json', 'r+', encoding='utf-8') as f:
-        movie_titles = json.load(f)
-    return data, movie_titles
+# Load the catalog (memory-mapped binary catalog, or the JSON files when it has not been exported)
+# and its indexes once per process, shared across sessions. Keyed by the catalog version and the
+# neighbour index's meta file, so a rerun after Catalog_Update.py swapped a new version in loads it
+# while sessions mid-run keep the one they started with
+@st.cache_resource(max_entries=2)
+def load_recommender(version, index_stamp):
+    return Recommender.load()
 
-data, movie_titles = load_data()
-hdr = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+# The Recommender of the catalog version the current run started with, set by main()
+recommender = None
 
-# OMDB API configuration (optional - can be set via environment variable or Streamlit secrets)
-OMDB_API_KEY = None
-try:
-    # Try to get from Streamlit secrets first
-    if hasattr(st, 'secrets') and 'omdb_api_key' in st.secrets:
-        OMDB_API_KEY = st.secrets['omdb_api_key']
-    # Try environment variable
-    import os
-    if not OMDB_API_KEY:
-        OMDB_API_KEY = os.getenv('OMDB_API_KEY')
-except:
-    pass
+# Concurrent enrichment of a recommendation page
+MAX_FETCH_WORKERS = 20  # one thread per card on the largest page
+PAGE_FETCH_DEADLINE = 30  # seconds
 
-def extract_imdb_id(imdb_link):
-    """Extract IMDB ID from IMDB URL"""
+def configure_omdb():
+    """Set up the OMDB API key (optional - can be set via environment variable or Streamlit secrets)"""
+    api_key = None
     try:
-        # Pattern: tt followed by 7-8 digits
-        match = re.search(r'tt\d{7,8}', imdb_link)
-        if match:
-            return match.group(0)
+        # Try to get from Streamlit secrets first
+        if hasattr(st, 'secrets') and 'omdb_api_key' in st.secrets:
+            api_key = st.secrets['omdb_api_key']
+        # Try environment variable
+        if not api_key:
+            api_key = os.getenv('OMDB_API_KEY')
     except:
         pass
-    return None
-
-def fetch_from_omdb(imdb_id=None, movie_title=None):
-    """Fetch movie data from OMDB API"""
-    if not OMDB_API_KEY:
-        return None
-    
-    try:
-        base_url = "http://www.omdbapi.com/"
-        params = {"apikey": OMDB_API_KEY}
-        
-        # Prefer IMDB ID over title (more accurate)
-        if imdb_id:
-            params["i"] = imdb_id
-            response = requests.get(base_url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("Response") == "True":
-                    return data
-        
-        # Fallback to title search if IMDB ID didn't work
-        if movie_title:
-            # Clean title - remove year if present in parentheses
-            clean_title = re.sub(r'\s*\(\d{4}\)\s*$', '', movie_title).strip()
-            params = {"apikey": OMDB_API_KEY, "t": clean_title}
-            response = requests.get(base_url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("Response") == "True":
-                    return data
-    except Exception as e:
-        pass
-    return None
+    Enrichment.OMDB_API_KEY = api_key
+    return api_key
 
 # Advanced Custom CSS with Dark Theme
-st.markdown("""
+APP_CSS = """
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&family=Playfair+Display:wght@700;800;900&display=swap');
     
@@ -453,299 +406,50 @@ st.markdown("""
         background: linear-gradient(135deg, #ffed4e, #ffd700);
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+# Whether the st.cache_data lookup running on this thread called its function
+_cache_lookup = threading.local()
+
+def counted_cache_data(name, **options):
+    """st.cache_data that counts its hits and misses in cache_requests_total{cache=name}
+
+    Streamlit does not say whether a call was served from its cache, but the
+    cached function only runs on a miss, on the calling thread.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def compute(*args, **kwargs):
+            _cache_lookup.missed = True
+            return fn(*args, **kwargs)
+
+        cached = st.cache_data(**options)(compute)
+
+        @wraps(fn)
+        def lookup(*args, **kwargs):
+            _cache_lookup.missed = False
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                Metrics.count('cache_requests_total', cache=name, result='miss' if _cache_lookup.missed else 'hit')
 
-@st.cache_data(ttl=1800, show_spinner=False)  # Cache for 30 minutes
+        lookup.clear = cached.clear
+        return lookup
+    return decorate
 
+@counted_cache_data('app_posters', ttl=1800, show_spinner=False)  # Cache for 30 minutes
 def movie_poster_fetcher(imdb_link, movie_title=None):
     """Fetch and display movie poster from IMDB with OMDB API fallback"""
-    # First, try OMDB API (more reliable)
-    imdb_id = extract_imdb_id(imdb_link)
-    if imdb_id or movie_title:
-        omdb_data = fetch_from_omdb(imdb_id=imdb_id, movie_title=movie_title)
-        if omdb_data and omdb_data.get("Poster") and omdb_data["Poster"] != "N/A":
-            try:
-                poster_url = omdb_data["Poster"]
-                u = urlopen(poster_url)
-                raw_data = u.read()
-                image = PIL.Image.open(io.BytesIO(raw_data))
-                image = image.resize((220, 330))
-                return image
-            except:
-                pass
-    
-    # Fallback to IMDB scraping
-    try:
-        url_data = requests.get(imdb_link, headers=hdr, timeout=15).text
-        s_data = BeautifulSoup(url_data, 'html.parser')
-        
-        # Method 1: Try JSON-LD structured data (most reliable)
-        json_ld = s_data.find("script", type="application/ld+json")
-        if json_ld:
-            try:
-                data = json.loads(json_ld.string)
-                if isinstance(data, dict) and 'image' in data:
-                    poster_url = data['image']
-                    if isinstance(poster_url, str) and poster_url.startswith('http'):
-                        u = urlopen(poster_url)
-                        raw_data = u.read()
-                        image = PIL.Image.open(io.BytesIO(raw_data))
-                        image = image.resize((220, 330))
-                        return image
-            except:
-                pass
-        
-        # Method 2: Try Open Graph image
-        og_image = s_data.find("meta", property="og:image")
-        if og_image and 'content' in og_image.attrs:
-            poster_url = og_image['content']
-            if poster_url.startswith('http'):
-                try:
-                    u = urlopen(poster_url)
-                    raw_data = u.read()
-                    image = PIL.Image.open(io.BytesIO(raw_data))
-                    image = image.resize((220, 330))
-                    return image
-                except:
-                    pass
-        
-        # Method 3: Try the new IMDB structure with various selectors
-        selectors = [
-            ("div", {"class": "ipc-media--poster-27x40"}),
-            ("div", {"class": "ipc-media--poster"}),
-            ("div", {"class": "poster"}),
-            ("img", {"class": "ipc-image"}),
-            ("img", {"data-testid": "hero-poster"}),
-        ]
-        
-        for tag, attrs in selectors:
-            element = s_data.find(tag, attrs)
-            if element:
-                img_tag = element.find("img") if element.name != "img" else element
-                if img_tag:
-                    # Try multiple attributes
-                    for attr in ['src', 'data-src', 'srcset', 'data-image-url']:
-                        if attr in img_tag.attrs:
-                            poster_url = img_tag[attr]
-                            if attr == 'srcset':
-                                poster_url = poster_url.split(',')[0].split()[0]
-                            
-                            if poster_url and poster_url.startswith('http'):
-                                try:
-                                    # Clean up URL
-                                    if '._V1_' in poster_url:
-                                        # Try to get higher resolution
-                                        poster_url = poster_url.split('._V1_')[0] + '._V1_SX300.jpg'
-                                    u = urlopen(poster_url)
-                                    raw_data = u.read()
-                                    image = PIL.Image.open(io.BytesIO(raw_data))
-                                    image = image.resize((220, 330))
-                                    return image
-                                except:
-                                    continue
-        
-        # Method 4: Search all images for poster-like URLs
-        all_imgs = s_data.find_all("img")
-        for img in all_imgs:
-            src = img.get('src') or img.get('data-src') or img.get('data-image-url')
-            if src and ('poster' in src.lower() or 'images' in src.lower()):
-                if src.startswith('http') or src.startswith('//'):
-                    if not src.startswith('http'):
-                        src = 'https:' + src
-                    try:
-                        u = urlopen(src)
-                        raw_data = u.read()
-                        image = PIL.Image.open(io.BytesIO(raw_data))
-                        image = image.resize((220, 330))
-                        return image
-                    except:
-                        continue
-        
-        return None
-    except Exception as e:
-        # Try one more time with a simpler approach - extract from page source
-        try:
-            # Look for image URLs in the raw HTML
-            if 'images' in url_data.lower() or 'poster' in url_data.lower():
-                # Find image URLs
-                img_pattern = r'https?://[^"\s]+\.(?:jpg|jpeg|png|webp)[^"\s]*'
-                matches = re.findall(img_pattern, url_data)
-                for img_url in matches[:5]:  # Try first 5 matches
-                    if 'poster' in img_url.lower() or 'images' in img_url.lower():
-                        try:
-                            u = urlopen(img_url)
-                            raw_data = u.read()
-                            image = PIL.Image.open(io.BytesIO(raw_data))
-                            image = image.resize((220, 330))
-                            return image
-                        except:
-                            continue
-        except:
-            pass
-        return None
+    return fetch_poster(imdb_link, movie_title=movie_title)
 
-@st.cache_data(ttl=1800, show_spinner=False)  # Cache for 30 minutes  
+@counted_cache_data('app_movie_info', ttl=1800, show_spinner=False)  # Cache for 30 minutes
 def get_movie_info(imdb_link, movie_title=None):
     """Extract movie information from IMDB with OMDB API fallback"""
-    # First, try OMDB API (more reliable)
-    imdb_id = extract_imdb_id(imdb_link)
-    if imdb_id or movie_title:
-        omdb_data = fetch_from_omdb(imdb_id=imdb_id, movie_title=movie_title)
-        if omdb_data:
-            title = omdb_data.get("Title", "")
-            plot = omdb_data.get("Plot", "")
-            actors = omdb_data.get("Actors", "")
-            
-            # If we got data from OMDB, return it
-            if plot and plot != "N/A":
-                return title, actors, plot, ""
-            elif title:
-                # At least we have a title
-                return title, actors, "", ""
-    
-    # Fallback to IMDB scraping
-    try:
-        url_data = requests.get(imdb_link, headers=hdr, timeout=15).text
-        s_data = BeautifulSoup(url_data, 'html.parser')
-        
-        # Initialize return values
-        title = ""
-        cast = ""
-        story = ""
-        
-        # Method 1: Try JSON-LD structured data (most reliable)
-        json_ld = s_data.find("script", type="application/ld+json")
-        if json_ld:
-            try:
-                data = json.loads(json_ld.string)
-                if isinstance(data, dict):
-                    if 'name' in data:
-                        title = data['name']
-                    if 'description' in data:
-                        story = data['description']
-                    if 'actor' in data:
-                        actors = data['actor']
-                        if isinstance(actors, list):
-                            cast_names = [actor.get('name', '') for actor in actors[:5] if isinstance(actor, dict)]
-                            cast = ", ".join([name for name in cast_names if name])
-            except:
-                pass
-        
-        # Method 2: Try meta description (very reliable for basic info)
-        imdb_content = s_data.find("meta", {"name": "description"})
-        if imdb_content and 'content' in imdb_content.attrs:
-            movie_descr = imdb_content.attrs['content']
-            if movie_descr and len(movie_descr) > 10:
-                # Parse the description - usually format: "Title. Cast info. Story info."
-                parts = movie_descr.split(".")
-                if not title and len(parts) >= 1:
-                    title = parts[0].strip()
-                if not cast and len(parts) >= 2:
-                    cast = parts[1].strip()
-                if not story and len(parts) >= 3:
-                    story = ".".join(parts[2:]).strip()
-        
-        # Method 3: Extract plot summary from page with multiple selectors
-        if not story:
-            plot_selectors = [
-                ("div", {"data-testid": "plot"}),
-                ("span", {"data-testid": "plot-xl"}),
-                ("span", {"data-testid": "plot-l"}),
-                ("div", {"class": "plot_summary"}),
-                ("div", {"class": "summary_text"}),
-                ("p", {"data-testid": "plot"}),
-            ]
-            
-            for tag, attrs in plot_selectors:
-                plot_div = s_data.find(tag, attrs)
-                if plot_div:
-                    story = plot_div.get_text(strip=True)
-                    story = " ".join(story.split())
-                    if story and len(story) > 20:  # Valid plot
-                        break
-        
-        # Method 4: Extract cast information with multiple methods
-        if not cast:
-            # Try structured data first
-            cast_section = s_data.find("div", {"data-testid": "title-cast"})
-            if not cast_section:
-                cast_section = s_data.find("table", class_="cast_list")
-            if not cast_section:
-                cast_section = s_data.find("div", class_="cast_list")
-            
-            if cast_section:
-                cast_links = cast_section.find_all("a", href=True)
-                cast_names = []
-                for link in cast_links[:8]:  # Get more names
-                    name = link.get_text(strip=True)
-                    if name and name not in ["See full cast", "See full cast & crew", "See more"]:
-                        # Check if it's a valid name (not a link text)
-                        if len(name) > 2 and not name.startswith("http"):
-                            cast_names.append(name)
-                if cast_names:
-                    cast = ", ".join(cast_names[:5])  # Limit to 5
-        
-        # Method 5: Extract title with multiple selectors
-        if not title:
-            title_selectors = [
-                ("h1", {"data-testid": "hero-title-block__title"}),
-                ("h1", {"class": "title_wrapper"}),
-                ("title", {}),
-                ("meta", {"property": "og:title"}),
-            ]
-            
-            for tag, attrs in title_selectors:
-                title_elem = s_data.find(tag, attrs)
-                if title_elem:
-                    if tag == "meta" and 'content' in title_elem.attrs:
-                        title = title_elem['content']
-                    else:
-                        title = title_elem.get_text(strip=True)
-                    if title:
-                        # Clean up title
-                        title = title.split(" - IMDb")[0].split(" | ")[0].split(" (")[0].strip()
-                        break
-        
-        # Clean and return (without prefixes, we'll add them in display)
-        title = title if title else ""
-        cast = cast if cast else ""
-        story = story if story else ""
-        
-        # Final fallback: Try to extract from raw HTML if nothing found
-        if not story and not cast:
-            try:
-                # Look for common patterns in the HTML
-                page_text = s_data.get_text()
-                
-                # Try to find plot in common locations
-                plot_keywords = ['plot', 'summary', 'synopsis', 'story']
-                for keyword in plot_keywords:
-                    # Look for text near these keywords
-                    idx = page_text.lower().find(keyword)
-                    if idx > 0:
-                        # Extract surrounding text
-                        snippet = page_text[max(0, idx-50):idx+200]
-                        if len(snippet) > 30:
-                            story = snippet.strip()
-                            break
-            except:
-                pass
-        
-        return title, cast, story, ""
-        
-    except Exception as e:
-        # Last resort: return empty but don't fail
-        return "", "", "", ""
+    return fetch_movie_info(imdb_link, movie_title=movie_title)
 
-def KNN_Movie_Recommender(test_point, k):
-    """Generate movie recommendations using KNN algorithm"""
-    target = [0 for item in movie_titles]
-    model = KNearestNeighbours(data, target, test_point, k=k)
-    model.fit()
-    table = []
-    for i in model.indices:
-        table.append([movie_titles[i][0], movie_titles[i][2], data[i][-1]])
-    return table
+def recommendation_table(indices):
+    """Build the [title, link, rating] rows for a list of movie indices"""
+    return recommender.table(indices)
 
 def clean_text(text):
     """Clean and prepare text for display"""
@@ -757,11 +461,18 @@ def clean_text(text):
     text = text.replace("Cast:", "").replace("Story:", "").strip()
     return text
 
-def display_movie_card(movie, link, ratings, index, show_poster=False):
-    """Display a beautifully formatted movie card"""
-    # Fetch movie information and poster (pass movie title for OMDB fallback)
-    title_info, cast_info, story_info, total_rat = get_movie_info(link, movie_title=movie)
+@Metrics.span('card_fetch')
+def fetch_movie_card(movie, link, show_poster=False):
+    """Fetch the information (and optionally the poster) shown on a movie card"""
+    # Pass movie title for OMDB fallback
+    movie_info = get_movie_info(link, movie_title=movie)
     poster = movie_poster_fetcher(link, movie_title=movie) if show_poster else None
+    return movie_info, poster
+
+@Metrics.span('card_render')
+def render_movie_card(movie, link, ratings, index, show_poster, movie_info, poster):
+    """Render a movie card from already fetched information and poster"""
+    title_info, cast_info, story_info, total_rat = movie_info
     
     # Clean and prepare content - be more lenient with what we accept
     title_text = clean_text(title_info) if title_info and len(title_info.strip()) > 0 else ""
@@ -849,7 +560,107 @@ def display_movie_card(movie, link, ratings, index, show_poster=False):
             </div>
             """, unsafe_allow_html=True)
 
+def _run_with_context(ctx, fn, *args):
+    # Let worker threads use st.cache_data like the script thread does
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fn(*args)
+
+@Metrics.span('page')
+def display_recommendations(table, show_poster, start=1):
+    """Display a page of movie cards, fetching all of them concurrently and rendering each as it arrives
+
+    Cards are numbered from start. Returns the (movie_info, poster) of every
+    card, so the page can be drawn again without fetching anything.
+    """
+    cards = [(("", "", "", ""), None)] * len(table)
+    if not table:
+        return cards
+    # Reserve one slot per card so the page keeps its order whatever finishes first
+    slots = [st.empty() for _ in table]
+    progress_bar = st.progress(0)
+    ctx = get_script_run_ctx()
+    pool = ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(table)))
+    futures = {
+        pool.submit(_run_with_context, ctx, fetch_movie_card, movie, link, show_poster): idx
+        for idx, (movie, link, ratings) in enumerate(table)
+    }
+    pending = set(range(len(table)))
+    try:
+        for done, future in enumerate(as_completed(futures, timeout=PAGE_FETCH_DEADLINE), 1):
+            idx = futures[future]
+            try:
+                movie_info, poster = future.result()
+            except Exception:
+                movie_info, poster = ("", "", "", ""), None
+            cards[idx] = movie_info, poster
+            movie, link, ratings = table[idx]
+            with slots[idx].container():
+                render_movie_card(movie, link, ratings, start + idx, show_poster, movie_info, poster)
+            pending.discard(idx)
+            progress_bar.progress(done / len(table))
+    except FuturesTimeout:
+        # Deadline reached: show the remaining cards without the missing details
+        for idx in sorted(pending):
+            movie, link, ratings = table[idx]
+            with slots[idx].container():
+                render_movie_card(movie, link, ratings, start + idx, show_poster, ("", "", "", ""), None)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        progress_bar.empty()
+    return cards
+
+def start_results(query, cursor):
+    """Make a new query the session's current result list, its first page is loaded by show_results"""
+    st.session_state['results'] = {'query': query, 'cursor': cursor, 'pages': [], 'more': True}
+
+def _load_more():
+    st.session_state['results']['more'] = True
+
+def show_results(query, page_size, show_poster, heading):
+    """Show the pages of the current result list loaded so far, then a button loading the next one
+
+    Pages already shown are drawn from the cards kept in the session; only a
+    new page is searched for and fetched, so scrolling through n results costs
+    a few partial selections (see NeighbourCursor) plus one fetch per movie.
+    """
+    results = st.session_state.get('results')
+    if results is None or results['query'] != query:
+        return
+    st.markdown(f'<div class="section-title">{heading}</div>', unsafe_allow_html=True)
+    start = 1
+    for table, cards in results['pages']:
+        for offset, ((movie, link, ratings), (movie_info, poster)) in enumerate(zip(table, cards)):
+            render_movie_card(movie, link, ratings, start + offset, show_poster, movie_info, poster)
+        start += len(table)
+    if results['more']:
+        results['more'] = False
+        with st.spinner('🎬 Finding more movies...'):
+            indices, _ = results['cursor'].next_page(page_size)
+        table = recommendation_table(indices)
+        results['pages'].append((table, display_recommendations(table, show_poster, start)))
+        start += len(table)
+    if start == 1:
+        st.info("No movies match this query.")
+    elif not results['cursor'].exhausted:
+        st.button('⬇️ Load more', key='load_more', on_click=_load_more)
+
 def main():
+    global recommender
+
+    # Page configuration
+    st.set_page_config(
+        page_title="CinemaScope - Movie Recommendation System",
+        page_icon="🎬",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    omdb_api_key = configure_omdb()
+    # Stage timings and cache/HTTP counters at http://127.0.0.1:$METRICS_PORT/metrics, when it is set
+    Metrics.start_http_server()
+    st.markdown(APP_CSS, unsafe_allow_html=True)
+    # One catalog version for the whole run, even if an update lands meanwhile
+    recommender = load_recommender(*catalog_key())
+    movie_titles = recommender.catalog
 
     # Sidebar with enhanced design
     with st.sidebar:
@@ -887,7 +698,7 @@ def main():
         """, unsafe_allow_html=True)
         
         # OMDB API Key info (optional)
-        if OMDB_API_KEY:
+        if omdb_api_key:
             st.markdown("""
             <div style="background: rgba(0, 150, 0, 0.2); padding: 1rem; border-radius: 10px; border: 2px solid rgba(0, 255, 0, 0.3); margin-top: 1rem;">
                 <p style="color: rgba(0, 255, 0, 0.9); font-size: 0.9rem; margin: 0;">
@@ -934,10 +745,7 @@ def main():
     
     st.markdown('<div class="section-title">🎯 Choose Your Recommendation Type</div>', unsafe_allow_html=True)
     
-    genres = ['Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
-              'Fantasy', 'Film-Noir', 'Game-Show', 'History', 'Horror', 'Music', 'Musical', 'Mystery', 'News',
-              'Reality-TV', 'Romance', 'Sci-Fi', 'Short', 'Sport', 'Thriller', 'War', 'Western']
-    movies = [title[0] for title in movie_titles]
+    genres = recommender.genres
     
     # Recommendation type selection
     category = ['--Select--', 'Movie based', 'Genre based']
@@ -957,21 +765,33 @@ def main():
     
     elif cat_op == category[1]:  # Movie-based recommendations
         st.markdown("### 🎬 Select a Movie")
-        select_movie = st.selectbox(
-            'Choose a movie you enjoyed (recommendations will be based on this selection)',
-            ['--Select--'] + movies,
+        # Only the best matches of the typed title are sent to the browser, never the whole catalog
+        query = st.text_input('Search for a movie you enjoyed', key='movie_search',
+                              placeholder='Type a title, e.g. The Dark Knight')
+        matches = recommender.titles.search(query) if query else []
+        if query and not matches:
+            st.warning('⚠️ No movie matches this title, try another spelling.')
+        movie_index = st.selectbox(
+            'Choose the movie (recommendations will be based on this selection)',
+            [None] + matches,
+            format_func=lambda i: '--Select--' if i is None else recommender.titles.label(i),
             key='movie_select'
         )
         
-        if select_movie != '--Select--':
+        if movie_index is not None:
+            select_movie = movie_titles.title(movie_index)
             dec = st.radio("**Display Options**", ('Show Posters', 'Text Only'), key='poster_radio1')
             show_poster = (dec == 'Show Posters')
             
+            similarity = 'Genres & rating'
+            if recommender.content_index is not None:
+                similarity = st.radio("**Similar by**", ('Genres & rating', 'Cast, crew & keywords'), key='similarity_radio')
+            
             if show_poster:
                 st.info("ℹ️ Fetching movie posters may take a moment. Please be patient.")
             
             no_of_reco = st.slider(
-                '**Number of recommendations:**',
+                '**Recommendations per page:**',
                 min_value=5,
                 max_value=20,
                 step=1,
@@ -979,24 +799,12 @@ def main():
                 key='num_reco1'
             )
             
+            by = 'content' if similarity == 'Cast, crew & keywords' else 'genres'
+            query = ('movie', recommender.version, movie_index, by, show_poster)
             if st.button('🔍 Get Recommendations', key='get_reco1'):
-                with st.spinner('🎬 Analyzing movies and generating recommendations...'):
-                    genres_data = data[movies.index(select_movie)]
-                    test_points = genres_data
-                    table = KNN_Movie_Recommender(test_points, no_of_reco + 1)
-                    table.pop(0)
-                    
-                    st.markdown(f'<div class="section-title">✨ Recommended Movies Similar to "{select_movie}"</div>', unsafe_allow_html=True)
-                    
-                    # Add progress bar
-                    progress_bar = st.progress(0)
-                    total_movies = len(table)
-                    
-                    for idx, (movie, link, ratings) in enumerate(table, 1):
-                        progress_bar.progress((idx) / total_movies)
-                        display_movie_card(movie, link, ratings, idx, show_poster)
-                    
-                    progress_bar.empty()
+                start_results(query, recommender.similar_cursor(movie_index, by))
+            show_results(query, no_of_reco, show_poster,
+                         f'✨ Recommended Movies Similar to "{select_movie}"')
     
     elif cat_op == category[2]:  # Genre-based recommendations
         st.markdown("### 🎭 Select Your Favorite Genres")
@@ -1029,7 +837,7 @@ def main():
                 )
             with col2:
                 no_of_reco = st.number_input(
-                    '**Number of recommendations:**',
+                    '**Recommendations per page:**',
                     min_value=5,
                     max_value=20,
                     step=1,
@@ -1037,24 +845,12 @@ def main():
                     key='num_reco2'
                 )
             
+            query = ('genres', recommender.version, tuple(sel_gen), imdb_score, show_poster)
             if st.button('🔍 Get Recommendations', key='get_reco2'):
-                with st.spinner('🎬 Finding the perfect movies for you...'):
-                    test_point = [1 if genre in sel_gen else 0 for genre in genres]
-                    test_point.append(imdb_score)
-                    table = KNN_Movie_Recommender(test_point, no_of_reco)
-                    
-                    st.markdown(f'<div class="section-title">✨ Movies Matching Your Preferences</div>', unsafe_allow_html=True)
-                    
-                    # Add progress bar
-                    progress_bar = st.progress(0)
-                    total_movies = len(table)
-                    
-                    for idx, (movie, link, ratings) in enumerate(table, 1):
-                        progress_bar.progress((idx) / total_movies)
-                        display_movie_card(movie, link, ratings, idx, show_poster)
-                    
-                    progress_bar.empty()
+                start_results(query, recommender.genre_cursor(sel_gen, imdb_score))
+            show_results(query, no_of_reco, show_poster, '✨ Movies Matching Your Preferences')
         else:
             st.info("👆 Please select at least one genre to get recommendations.")
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Load test for the JSON API: p50/p99 latency and throughput per endpoint, and worker memory.
+
+By default the API runs under gunicorn (--preload, --workers N) on a free
+local port for the duration of the run; --url targets a server that is
+already running instead. Requests are sent from a pool of client threads over
+keep-alive connections, a mix of genre queries, similar-movie lookups and
+batches.
+
+After the run, the memory of every gunicorn worker is read from
+/proc/<pid>/smaps_rollup (Linux only): RSS, PSS (shared pages split between
+the processes mapping them) and private memory, the part a worker holds for
+itself and what every extra worker costs.
+
+    python Benchmarks/api_load.py --requests 2000 --concurrency 16 --workers 4
+    python Benchmarks/api_load.py --url http://127.0.0.1:8000 --pid 12345
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from Catalog import GENRES  # noqa: E402
+from Http import make_session  # noqa: E402
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, port):
+    """Start the API under gunicorn and wait for it to answer, returns the process"""
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(workers),
+                                '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'Api:app'], cwd=ROOT)
+    session = make_session(retries=0)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if session.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                return process
+        except OSError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def worker_memory(master_pid):
+    """Return the RSS, PSS and private memory in MB of every child process of master_pid, [] off Linux"""
+    workers = []
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return workers
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'r', encoding='utf-8') as f:
+                # The parent PID follows the state, after the parenthesized command name
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            if parent != master_pid:
+                continue
+            fields = {}
+            with open(f'/proc/{pid}/smaps_rollup', 'r', encoding='utf-8') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if value.strip().endswith('kB'):
+                        fields[name] = int(value.split()[0]) / 1024
+        except (OSError, ValueError, IndexError):
+            continue
+        workers.append({'rss': fields['Rss'], 'pss': fields['Pss'],
+                        'private': fields['Private_Clean'] + fields['Private_Dirty']})
+    return workers
+
+
+def make_requests(n, movies, batch_size, seed=0):
+    """Return (endpoint name, method, path, json body) tuples for a mixed workload"""
+    rng = random.Random(seed)
+
+    def genre_query():
+        return {'genres': rng.sample(GENRES, rng.randint(1, 3)), 'score': rng.randint(1, 10), 'k': 10}
+
+    workload = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.45:
+            query = genre_query()
+            path = f"/recommend/genres?genres={','.join(query['genres'])}&score={query['score']}&k=10"
+            workload.append(('genres', 'GET', path, None))
+        elif kind < 0.9:
+            workload.append(('similar', 'GET', f'/movies/{rng.randrange(movies)}/similar?k=10', None))
+        else:
+            queries = [genre_query() if rng.random() < 0.5 else {'movie': rng.randrange(movies), 'k': 10}
+                       for _ in range(batch_size)]
+            workload.append(('batch', 'POST', '/recommend/batch', {'queries': queries}))
+    return workload
+
+
+def run(base_url, workload, concurrency):
+    """Send the workload, returns ({endpoint: latencies in ms}, wall seconds, errors)"""
+    session = make_session(max_per_host=concurrency, retries=0)
+
+    def send(item):
+        name, method, path, body = item
+        started = time.perf_counter()
+        response = session.request(method, base_url + path, json=body, timeout=30)
+        return name, (time.perf_counter() - started) * 1000, response.status_code
+
+    latencies = {}
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, ms, status in pool.map(send, workload):
+            latencies.setdefault(name, []).append(ms)
+            errors += status != 200
+    return latencies, time.perf_counter() - started, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the recommendation API')
+    parser.add_argument('--url', help='API base URL (default: start gunicorn locally)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers when starting the API')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--batch-size', type=int, default=32, help='queries per batch request')
+    parser.add_argument('--warmup', type=int, default=200, help='requests sent before measuring')
+    parser.add_argument('--pid', type=int, help='gunicorn master PID of the server at --url, to read its workers\' '
+                                                'memory')
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.url
+    master_pid = args.pid
+    if base_url is None:
+        port = _free_port()
+        process = start_gunicorn(args.workers, port)
+        base_url = f'http://127.0.0.1:{port}'
+        master_pid = process.pid
+    try:
+        movies = make_session().get(f'{base_url}/health', timeout=10).json()['movies']
+        run(base_url, make_requests(args.warmup, movies, args.batch_size, seed=1), args.concurrency)
+        latencies, wall, errors = run(base_url, make_requests(args.requests, movies, args.batch_size),
+                                      args.concurrency)
+        # After the run, so the workers have touched everything their requests need
+        workers = worker_memory(master_pid) if master_pid else []
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f'{args.requests} requests, {args.concurrency} clients against {base_url}'
+          + (f' (gunicorn --preload, {args.workers} workers)' if process is not None else ''))
+    print(f'  throughput {args.requests / wall:.0f} req/s, {errors} errors')
+    for name, values in sorted(latencies.items()):
+        values = np.asarray(values)
+        print(f'  {name:8s} n={len(values):5d}  p50 {np.percentile(values, 50):7.2f} ms  '
+              f'p99 {np.percentile(values, 99):7.2f} ms')
+    for i, worker in enumerate(workers):
+        print(f'  worker {i}  RSS {worker["rss"]:6.1f} MB  PSS {worker["pss"]:6.1f} MB  '
+              f'private {worker["private"]:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare the fast-path IMDb extractor against the full BeautifulSoup parse.
+
+Runs both on every *.html file in Benchmarks/fixtures, fed in 16 KB chunks as
+they would arrive from the network, checks that the fast path returns the same
+title/cast/plot and a prefix of the same poster candidates, and prints the
+time per page and how much of the page each path read.
+
+    python Benchmarks/imdb_extract.py
+    python Benchmarks/imdb_extract.py --repeat 50 path/to/saved_page.html
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Enrichment import READ_CHUNK, parse_imdb_html  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class CountingChunks:
+    """Iterate over a page in fixed-size chunks, counting the characters handed out"""
+
+    def __init__(self, text, size=READ_CHUNK):
+        self.text = text
+        self.size = size
+        self.read = 0
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self.size):
+            chunk = self.text[start:start + self.size]
+            self.read += len(chunk)
+            yield chunk
+
+
+def run(text, fast, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        chunks = CountingChunks(text)
+        started = time.perf_counter()
+        page = parse_imdb_html(chunks, fast)
+        best = min(best, time.perf_counter() - started)
+    return page, best, chunks.read
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark IMDb page extraction')
+    parser.add_argument('pages', nargs='*', help='HTML files (default: Benchmarks/fixtures/*.html)')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per page, the best one is reported')
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(os.path.join(FIXTURES, '*.html')))
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        full, full_time, full_read = run(text, False, args.repeat)
+        fast, fast_time, fast_read = run(text, True, args.repeat)
+        same_info = (fast.title, fast.cast, fast.story) == (full.title, full.cast, full.story)
+        same_posters = full.poster_urls[:len(fast.poster_urls)] == fast.poster_urls
+        path_taken = 'head only' if not fast.complete else 'full parse fallback'
+        print(f'{os.path.basename(path)} ({len(text) / 1024:.0f} KB)')
+        print(f'  full parse: {full_time * 1000:8.2f} ms, read {full_read / 1024:6.0f} KB')
+        print(f'  fast path:  {fast_time * 1000:8.2f} ms, read {fast_read / 1024:6.0f} KB ({path_taken}), '
+              f'{full_time / fast_time:.0f}x faster')
+        print(f'  same info: {same_info}, same poster candidates: {same_posters}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Measure the cold import time of the recommendation core, and what it pulls in.
+
+Every run is a fresh interpreter, so nothing is cached in sys.modules. Prints
+the best import time of each module over --repeat runs, the heavy packages
+the import loaded, and the time of the first get_recommender() call, which
+is where the catalog, NumPy and the indexes are loaded.
+
+    python Benchmarks/import_time.py
+    python Benchmarks/import_time.py --repeat 10 Recommender Api
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY = ('numpy', 'scipy', 'pandas', 'streamlit', 'PIL', 'bs4', 'requests', 'flask')
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+loaded = None
+if {load}:
+    started = time.perf_counter()
+    {module}.get_recommender()
+    loaded = time.perf_counter() - started
+print(json.dumps({{'import': imported, 'load': loaded, 'heavy': heavy}}))
+'''
+
+
+def probe(module, load):
+    code = PROBE.format(module=module, load=load, heavy=HEAVY)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold import time of the recommendation modules')
+    parser.add_argument('modules', nargs='*', default=['Recommender'], help='modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module, the best is reported')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [probe(module, module == 'Recommender') for _ in range(args.repeat)]
+        best = min(run['import'] for run in runs) * 1000
+        print(f'{module}: import {best:.1f} ms, heavy packages loaded: {", ".join(runs[0]["heavy"]) or "none"}')
+        if runs[0]['load'] is not None:
+            load = min(run['load'] for run in runs) * 1000
+            print(f'  first get_recommender(): {load:.0f} ms (catalog, NumPy, engine and indexes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""Reproducible benchmark suite: catalog load, KNN, enrichment and page render.
+
+Sections (all by default, or pick some with --sections):
+
+- load:       cold load_catalog() from the binary catalog and from the JSON
+              files, and the first get_recommender(), each in a fresh interpreter
+- knn:        what the Genre-based and Movie-based searches run
+              (Recommender.by_features / similar), KNearestNeighbours.fit and
+              the batched search, at several k
+- scale:      KNNEngine, GenreIndex and GroupedIndex on synthetic catalogs of
+              --sizes rows (catalog rows resampled with jittered scores)
+- enrichment: what get_movie_info and movie_poster_fetcher fetch, through the
+              OMDb and the IMDb path, against Stub_Server replaying the saved
+              responses of Benchmarks/fixtures with --latency added to each
+- render:     the Streamlit page through streamlit.testing's AppTest: the
+              start page, and a Movie-based result page with and without
+              posters (enrichment served by the same stub)
+
+Queries and synthetic catalogs are seeded, the persistent enrichment store is
+turned off and the in-process caches are cleared before every cold
+measurement. Results are written as JSON: one record per benchmark with its
+parameters and latency percentiles, plus the machine, the commit and the
+options of the run. --compare prints the p50 change against an earlier file.
+
+    python Benchmarks/suite.py
+    python Benchmarks/suite.py --sections knn scale --sizes 10000 100000 1000000
+    python Benchmarks/suite.py --out new.json --compare Data/benchmarks/baseline.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import Enrichment  # noqa: E402
+import Store  # noqa: E402
+from Catalog import load_catalog  # noqa: E402
+from Classifier import FeatureSpace, KNearestNeighbours, KNNEngine  # noqa: E402
+from Genre_Index import GenreIndex  # noqa: E402
+from Grouped_Index import GroupedIndex  # noqa: E402
+from Prefetch import rebase_link  # noqa: E402
+from Recommender import Recommender  # noqa: E402
+from Stub_Server import start_stub_server  # noqa: E402
+
+SECTIONS = ('load', 'knn', 'scale', 'enrichment', 'render')
+RESULTS_DIR = './Data/benchmarks'
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+APP = os.path.join(ROOT, 'App.py')
+# Distance rows computed per size step of the scale section, bounds its run time on big catalogs
+SCALE_BUDGET = 20_000_000
+
+LOAD_PROBE = '''
+import json, time
+started = time.perf_counter()
+{code}
+print(json.dumps(time.perf_counter() - started))
+'''
+LOAD_CASES = {
+    'load_catalog_binary': 'from Catalog import load_catalog; load_catalog()',
+    'load_catalog_json': 'from Catalog import Catalog; Catalog.from_json()',
+    'get_recommender': 'import Recommender; Recommender.get_recommender()',
+}
+
+
+class Results:
+    """Latency records of one run, printed as they come"""
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, section, name, times_ms, **params):
+        values = np.asarray(times_ms, dtype=np.float64)
+        record = {'section': section, 'name': name, 'params': params, 'n': len(values),
+                  'mean_ms': float(values.mean()), 'min_ms': float(values.min()),
+                  'p50_ms': float(np.percentile(values, 50)), 'p90_ms': float(np.percentile(values, 90)),
+                  'p99_ms': float(np.percentile(values, 99))}
+        self.records.append(record)
+        label = ' '.join(f'{key}={value}' for key, value in params.items())
+        print(f'  {section:10s} {name:28s} {label:34s} p50 {record["p50_ms"]:9.3f} ms  '
+              f'p99 {record["p99_ms"]:9.3f} ms  (n={len(values)})', flush=True)
+        return record
+
+
+def measure(fn, repeat, warmup=1, before=None):
+    """Call fn repeat times after warmup calls, returns the latencies in ms (before() runs untimed first)"""
+    for _ in range(warmup):
+        if before:
+            before()
+        fn()
+    times = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def record_key(record):
+    return record['section'], record['name'], json.dumps(record['params'], sort_keys=True)
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'commit': commit}
+
+
+def genre_queries(recommender, n, seed=0):
+    """Seeded genre queries like the app's: 1-3 genres and a minimum score"""
+    rng = np.random.default_rng(seed)
+    genres = list(recommender.genres)
+    return [np.asarray(recommender.genre_point(list(rng.choice(genres, rng.integers(1, 4), replace=False)),
+                                               float(rng.integers(1, 11))), dtype=np.float64)
+            for _ in range(n)]
+
+
+def synthetic_matrix(matrix, rows, seed=0):
+    """Resample catalog rows up to the given size, jittering the scores so rows are not all duplicates"""
+    rng = np.random.default_rng(seed)
+    out = np.array(matrix[rng.integers(0, len(matrix), rows)], dtype=np.float64)
+    out[:, -1] = np.clip(np.round(out[:, -1] + rng.normal(0, 0.5, rows), 1), 1, 10)
+    return out
+
+
+def bench_load(results, args):
+    for name, code in LOAD_CASES.items():
+        times = []
+        for _ in range(args.cold_repeat):
+            output = subprocess.run([sys.executable, '-c', LOAD_PROBE.format(code=code)], cwd=ROOT,
+                                    capture_output=True, text=True, check=True)
+            times.append(json.loads(output.stdout.strip().splitlines()[-1]) * 1000)
+        results.add('load', name, times, cold=True)
+
+
+def bench_knn(results, args):
+    recommender = Recommender.load()
+    queries = genre_queries(recommender, 256)
+    rng = np.random.default_rng(1)
+    movies = rng.integers(0, len(recommender), 256).tolist()
+    targets = list(range(len(recommender)))
+    for k in args.k:
+        points = itertools.cycle(queries)
+        results.add('knn', 'by_features', measure(lambda: recommender.by_features(next(points), k), args.repeat), k=k)
+        points = itertools.cycle(queries)
+        results.add('knn', 'full_scan', measure(lambda: recommender.engine.kneighbours(next(points), k),
+                                                args.repeat), k=k)
+        points = itertools.cycle(queries)
+        results.add('knn', 'knearestneighbours_fit', measure(
+            lambda: KNearestNeighbours(recommender.engine, targets, next(points), k).fit(), args.repeat), k=k)
+        ids = itertools.cycle(movies)
+        results.add('knn', 'similar', measure(lambda: recommender.similar(next(ids), k), args.repeat), k=k,
+                    neighbour_index=recommender.neighbour_index is not None)
+        for batch in args.batch:
+            block = np.asarray(queries[:batch])
+            results.add('knn', 'by_features_batch', measure(lambda: recommender.by_features_batch(block, k),
+                                                            max(3, args.repeat // batch)), k=k, batch=batch)
+
+
+def bench_scale(results, args):
+    catalog = load_catalog()
+    space = FeatureSpace()
+    for size in args.sizes:
+        matrix = synthetic_matrix(catalog.matrix, size)
+        started = time.perf_counter()
+        engine = KNNEngine(matrix, space=space)
+        genre_index = GenreIndex(engine)
+        built = time.perf_counter()
+        grouped = GroupedIndex(engine)
+        results.add('scale', 'build_engine_and_genre_index', [(built - started) * 1000], rows=size)
+        results.add('scale', 'build_grouped_index', [(time.perf_counter() - built) * 1000], rows=size,
+                    groups=grouped.n_groups)
+        queries = [np.asarray(matrix[i]) for i in np.random.default_rng(2).integers(0, size, 64)]
+        repeat = int(max(3, min(args.repeat, SCALE_BUDGET // size)))
+        for k in args.k:
+            for name, backend in (('full_scan', engine), ('genre_index', genre_index), ('grouped_index', grouped)):
+                points = itertools.cycle(queries)
+                results.add('scale', name, measure(lambda: backend.kneighbours(next(points), k), repeat),
+                            rows=size, k=k)
+        del engine, genre_index, grouped, matrix
+
+
+def _clear_enrichment_caches():
+    Enrichment._omdb_cache.clear()
+    Enrichment._imdb_cache.clear()
+
+
+def bench_enrichment(results, args, base_url):
+    catalog = load_catalog()
+    rng = np.random.default_rng(3)
+    movies = [(rebase_link(catalog.link(i), base_url), catalog.title(i)) for i in rng.integers(0, len(catalog), 64)]
+    cases = (('movie_info', Enrichment.fetch_movie_info), ('poster', Enrichment.fetch_poster))
+    for source, api_key in (('omdb', 'bench'), ('imdb', None)):
+        Enrichment.OMDB_API_KEY = api_key
+        for name, fetch in cases:
+            cycle = itertools.cycle(movies)
+            results.add('enrichment', name, measure(lambda: fetch(*next(cycle)), args.fetch_repeat,
+                                                    before=_clear_enrichment_caches),
+                        source=source, cache='cold', latency_ms=args.latency * 1000)
+        results.add('enrichment', 'movie_info', measure(lambda: Enrichment.fetch_movie_info(*movies[0]),
+                                                        args.repeat), source=source, cache='memo',
+                    latency_ms=args.latency * 1000)
+
+        # A page of cards fetched concurrently, as display_recommendations does
+        def page(size=10):
+            with ThreadPoolExecutor(max_workers=size) as pool:
+                list(pool.map(lambda movie: (Enrichment.fetch_movie_info(*movie), Enrichment.fetch_poster(*movie)),
+                              movies[:size]))
+        results.add('enrichment', 'page_of_10_cards', measure(page, args.fetch_repeat, before=_clear_enrichment_caches),
+                    source=source, cache='cold', latency_ms=args.latency * 1000)
+
+
+def bench_render(results, args):
+    try:
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print('  render: streamlit is not installed, skipped')
+        return
+    # App.configure_omdb() reads the key on every run; the stub answers every lookup
+    os.environ['OMDB_API_KEY'] = 'bench'
+
+    def start_page():
+        return AppTest.from_file(APP, default_timeout=120).run()
+
+    results.add('render', 'start_page', measure(start_page, args.render_repeat), cache='warm_resources')
+
+    def clear():
+        st.cache_data.clear()
+        _clear_enrichment_caches()
+
+    for show_poster in (False, True):
+        pages = []
+
+        # Everything up to the click is untimed: open the page and pick a movie
+        def prepare():
+            clear()
+            at = start_page()
+            at.selectbox(key='cat_select').select('Movie based').run()
+            at.text_input(key='movie_search').input('avatar').run()
+            at.selectbox(key='movie_select').select_index(1).run()
+            at.radio(key='poster_radio1').set_value('Show Posters' if show_poster else 'Text Only').run()
+            pages.append(at)
+
+        def click():
+            at = pages.pop()
+            at.button(key='get_reco1').click().run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+
+        results.add('render', 'movie_recommendations', measure(click, args.render_repeat, before=prepare),
+                    k=10, posters=show_poster, cache='cold', latency_ms=args.latency * 1000)
+
+
+def compare(records, path):
+    """Print the p50 change of every benchmark also found in an earlier results file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        earlier = {record_key(record): record for record in json.load(f)['results']}
+    print(f'p50 against {path}:')
+    for record in records:
+        old = earlier.get(record_key(record))
+        if old is None or not old['p50_ms']:
+            continue
+        change = record['p50_ms'] / old['p50_ms'] - 1
+        label = ' '.join(f'{key}={value}' for key, value in record['params'].items())
+        print(f'  {record["section"]:10s} {record["name"]:28s} {label:34s} {old["p50_ms"]:9.3f} -> '
+              f'{record["p50_ms"]:9.3f} ms ({change:+.1%})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark loading, KNN, enrichment and page rendering')
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument('--out', default=None, help='results file (default: Data/benchmarks/<time>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('-k', type=int, nargs='+', default=[5, 10, 50, 100], help='neighbours per query')
+    parser.add_argument('--batch', type=int, nargs='+', default=[64], help='queries per batched call')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='rows of the synthetic catalogs')
+    parser.add_argument('--repeat', type=int, default=200, help='timed calls per in-process benchmark')
+    parser.add_argument('--cold-repeat', type=int, default=5, help='fresh interpreters per load benchmark')
+    parser.add_argument('--fetch-repeat', type=int, default=20, help='timed cold fetches per enrichment benchmark')
+    parser.add_argument('--render-repeat', type=int, default=3, help='timed page renders')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub server adds to every response')
+    args = parser.parse_args()
+
+    # The app and the loaders use paths relative to the project; never touch the real enrichment store
+    os.chdir(ROOT)
+    Store.STORE_PATH = ''
+    results = Results()
+    started = datetime.datetime.now(datetime.timezone.utc)
+    server = None
+    try:
+        for section in args.sections:
+            print(f'{section}:', flush=True)
+            if section in ('enrichment', 'render') and server is None:
+                server, base_url = start_stub_server(latency=args.latency, replay=FIXTURES)
+                Enrichment.OMDB_URL = f'{base_url}/omdb/'
+            if section == 'load':
+                bench_load(results, args)
+            elif section == 'knn':
+                bench_knn(results, args)
+            elif section == 'scale':
+                bench_scale(results, args)
+            elif section == 'enrichment':
+                bench_enrichment(results, args, base_url)
+            else:
+                bench_render(results, args)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    out = args.out or os.path.join(RESULTS_DIR, started.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'started': started.isoformat(), 'machine': machine_info(), 'options': vars(args),
+                   'results': results.records}, f, indent=1)
+    print(f'Wrote {len(results.records)} results to {out}')
+    if args.compare:
+        compare(results.records, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,584 @@
+"""Binary, memory-mapped movie catalog.
+
+A catalog directory holds:
+
+    matrix.npy          (n_movies x 27) float64 genre flags + IMDb score
+    strings.bin         UTF-8 titles and IMDb links packed back to back
+    string_offsets.npy  int64 offsets into strings.bin, row i spans
+                        [2i, 2i+1) for the title and [2i+1, 2i+2) for the link
+    years.npy           int16 release year of every movie, 0 when unknown
+                        (catalogs written before it existed have none)
+    manifest.json       row/column counts, genre names and the catalog version
+    prepared.<space>.<version>.npy
+                        the matrix as a feature space compares it (score
+                        rescaled, features weighted), written by the first
+                        process that needs it (Catalog.features)
+
+Opening a catalog maps the arrays with np.load(mmap_mode='r'), so a cold start
+only reads the manifest and every worker process shares the same pages through
+the OS page cache.
+
+The manifest's row count is authoritative: CatalogUpdater leaves spare rows at
+the end of the files for appends and writes changed files as new generations
+(matrix.3.npy, ...), which the manifest names. One updater at a time holds
+update.lock, so two commits never start from the same manifest.
+"""
+import glob
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run one update at a time
+    fcntl = None
+
+CATALOG_DIR = './Data/catalog'
+DATA_PATH = './Data/movie_data.json'
+TITLES_PATH = './Data/movie_titles.json'
+FORMAT_VERSION = 1
+# Genre columns of the matrix, in order, for catalogs whose manifest has no genre names
+GENRES = ['Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+          'Fantasy', 'Film-Noir', 'Game-Show', 'History', 'Horror', 'Music', 'Musical', 'Mystery', 'News',
+          'Reality-TV', 'Romance', 'Sci-Fi', 'Short', 'Sport', 'Thriller', 'War', 'Western']
+# Spare rows left when the matrix has to grow: 25% more, and at least this many
+GROWTH = 1.25
+MIN_SPARE_ROWS = 1024
+LOCK_FILE = 'update.lock'
+# Times load_catalog reads the manifest again when a commit deleted the files it named
+OPEN_RETRIES = 5
+
+
+def matrix_digest(matrix):
+    """Return the SHA-256 of the float64 matrix bytes, used as the catalog version"""
+    return hashlib.sha256(np.ascontiguousarray(matrix, dtype=np.float64).tobytes()).hexdigest()
+
+
+def pack_strings(movie_titles):
+    """Pack (title, index, link) rows into a UTF-8 blob and its offsets"""
+    encoded = []
+    for title, _, link in movie_titles:
+        encoded.append(title.encode('utf-8'))
+        encoded.append(link.encode('utf-8'))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return b''.join(encoded), offsets
+
+
+class Catalog:
+    """Movie feature matrix plus titles and links, indexable like movie_titles"""
+
+    def __init__(self, matrix, strings, offsets, manifest, years=None, catalog_dir=None):
+        self.matrix = matrix
+        self.strings = strings
+        self.offsets = offsets
+        self.manifest = manifest
+        self.years = years
+        # Where the catalog was opened from, None for in-memory catalogs
+        self.catalog_dir = catalog_dir
+        self._titles = None
+
+    @classmethod
+    def open(cls, catalog_dir=CATALOG_DIR):
+        """Memory-map a catalog written by write_catalog"""
+        with open(os.path.join(catalog_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format {manifest.get('format')!r}")
+        files = manifest['files']
+        matrix = np.load(os.path.join(catalog_dir, files['matrix']), mmap_mode='r')
+        offsets = np.load(os.path.join(catalog_dir, files['offsets']), mmap_mode='r')
+        strings_path = os.path.join(catalog_dir, files['strings'])
+        if os.path.getsize(strings_path):
+            strings = np.memmap(strings_path, dtype=np.uint8, mode='r')
+        else:
+            strings = np.empty(0, dtype=np.uint8)
+        years = np.load(os.path.join(catalog_dir, files['years']), mmap_mode='r') if 'years' in files else None
+        rows = manifest['rows']
+        # Rows past the manifest's count are spare capacity (or appends not committed yet)
+        if matrix.shape[0] < rows or offsets.shape[0] < 2 * rows + 1 or strings.shape[0] < offsets[2 * rows] \
+                or (years is not None and years.shape[0] < rows):
+            raise ValueError('Catalog files do not match the manifest')
+        if years is not None:
+            years = years[:rows]
+        return cls(matrix[:rows], strings, offsets[:2 * rows + 1], manifest, years, catalog_dir)
+
+    @classmethod
+    def from_json(cls, data_path=DATA_PATH, titles_path=TITLES_PATH):
+        """Build an in-memory catalog from the legacy JSON files"""
+        with open(data_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with open(titles_path, 'r', encoding='utf-8') as f:
+            movie_titles = json.load(f)
+        return cls.from_rows(data, movie_titles)
+
+    @classmethod
+    def from_rows(cls, data, movie_titles, genres=None, years=None):
+        """Build an in-memory catalog from feature rows and (title, index, link) rows"""
+        matrix = np.ascontiguousarray(data, dtype=np.float64)
+        blob, offsets = pack_strings(movie_titles)
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': matrix_digest(matrix),
+            'rows': int(matrix.shape[0]),
+            'columns': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'genres': list(genres) if genres is not None else None,
+        }
+        if years is not None:
+            years = np.asarray(years, dtype=np.int16)
+        return cls(matrix, np.frombuffer(blob, dtype=np.uint8), offsets, manifest, years)
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def genres(self):
+        return self.manifest.get('genres')
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def _string(self, slot):
+        return bytes(self.strings[self.offsets[slot]:self.offsets[slot + 1]]).decode('utf-8')
+
+    def title(self, i):
+        return self._string(2 * i)
+
+    def link(self, i):
+        return self._string(2 * i + 1)
+
+    def year(self, i):
+        """Return the release year of movie i, None when unknown"""
+        if self.years is None or not self.years[i]:
+            return None
+        return int(self.years[i])
+
+    def features(self, space):
+        """Return the matrix as the feature space compares it (space.prepare), memory-mapped
+
+        The prepared matrix is saved next to the catalog by the first process that
+        needs it, so every worker maps the same pages instead of holding its own
+        copy. Returns the matrix itself when the space uses it unchanged, and None
+        when there is nothing to share: in-memory catalogs, and spaces whose
+        prepared form is not a single array (cosine and jaccard keep a few bytes a
+        movie).
+        """
+        if self.catalog_dir is None or space.metric != 'euclidean':
+            return None
+        key = hashlib.sha1(space.signature.encode('utf-8')).hexdigest()[:12]
+        path = os.path.join(self.catalog_dir, f'prepared.{key}.{self.version[:16]}.npy')
+        try:
+            features = np.load(path, mmap_mode='r')
+            if features.shape == self.matrix.shape:
+                return features
+        except (OSError, ValueError):
+            pass
+        features = space.prepare(self.matrix)
+        if np.may_share_memory(features, self.matrix):
+            return features
+        try:
+            # Unique per process, several workers may start on a new version at once
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, features)
+            os.replace(tmp_path, path)
+            # Older versions in this space; processes that still map one keep their pages
+            for old in glob.glob(os.path.join(self.catalog_dir, f'prepared.{key}.*.npy')):
+                if old != path:
+                    os.remove(old)
+            return np.load(path, mmap_mode='r')
+        except OSError:
+            # A read-only catalog: keep this process's copy
+            return features
+
+    def titles(self):
+        """Return every title as a list"""
+        if self._titles is None:
+            self._titles = [self.title(i) for i in range(len(self))]
+        return self._titles
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('catalog index out of range')
+        return self.title(i), i, self.link(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class CatalogWriter:
+    """Stream rows into a catalog directory without holding the whole catalog in memory"""
+
+    files = {'matrix': 'matrix.npy', 'strings': 'strings.bin', 'offsets': 'string_offsets.npy', 'years': 'years.npy'}
+
+    def __init__(self, catalog_dir, rows, columns, genres=None):
+        os.makedirs(catalog_dir, exist_ok=True)
+        self.catalog_dir = catalog_dir
+        self.rows = rows
+        self.columns = columns
+        self.genres = list(genres) if genres is not None else None
+        self.written = 0
+        self.digest = hashlib.sha256()
+        # Lay out the .npy headers, then stream chunks into the data sections with plain
+        # file writes so no dirty mapped pages pile up while writing large catalogs
+        self.matrix = self._open_npy('matrix', np.float64, (rows, columns))
+        self.offsets = self._open_npy('offsets', np.int64, (2 * rows + 1,))
+        self.offsets.write(np.zeros(1, dtype=np.int64).tobytes())
+        self.years = self._open_npy('years', np.int16, (rows,))
+        self.string_end = 0
+        self.strings = open(self._path('strings'), 'wb')
+
+    def _open_npy(self, part, dtype, shape):
+        array = np.lib.format.open_memmap(self._path(part), mode='w+', dtype=dtype, shape=shape)
+        header_size = array.offset
+        del array
+        f = open(self._path(part), 'r+b')
+        f.seek(header_size)
+        return f
+
+    def _path(self, part):
+        return os.path.join(self.catalog_dir, self.files[part])
+
+    def append(self, data, titles, links, years=None):
+        """Append a chunk of feature rows with their titles, links and release years (0 or None when unknown)"""
+        block = np.ascontiguousarray(data, dtype=np.float64).reshape(-1, self.columns)
+        stop = self.written + block.shape[0]
+        if stop > self.rows or len(titles) != block.shape[0] or len(links) != block.shape[0]:
+            raise ValueError('Chunk does not fit the catalog being written')
+        self.matrix.write(block.tobytes())
+        self.digest.update(block.tobytes())
+        if years is None:
+            years = np.zeros(block.shape[0], dtype=np.int16)
+        self.years.write(np.array([year or 0 for year in years], dtype=np.int16).tobytes())
+        encoded = []
+        for title, link in zip(titles, links):
+            encoded.append(title.encode('utf-8'))
+            encoded.append(link.encode('utf-8'))
+        sizes = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+        ends = self.string_end + np.cumsum(sizes)
+        self.offsets.write(ends.tobytes())
+        self.strings.write(b''.join(encoded))
+        if len(ends):
+            self.string_end = int(ends[-1])
+        self.written = stop
+
+    def close(self):
+        """Flush the files and swap the manifest in, returns the manifest"""
+        if self.written != self.rows:
+            raise ValueError(f'Expected {self.rows} rows, got {self.written}')
+        for f in (self.matrix, self.offsets, self.strings, self.years):
+            f.close()
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': self.digest.hexdigest(),
+            'rows': self.rows,
+            'columns': self.columns,
+            'genres': self.genres,
+            'files': dict(self.files),
+        }
+        # Swap the manifest in last so readers never see a half-written catalog
+        tmp_path = os.path.join(self.catalog_dir, 'manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.catalog_dir, 'manifest.json'))
+        return manifest
+
+
+class CatalogUpdate:
+    """What a CatalogUpdater commit changed, for the indexes that have to follow it"""
+
+    def __init__(self, manifest, previous_version, appended, updated, previous_rows, renamed=()):
+        self.manifest = manifest
+        self.previous_version = previous_version
+        self.appended = appended
+        self.updated = updated
+        # Feature rows the updated movies had before the commit
+        self.previous_rows = previous_rows
+        # Updated movies whose title or link changed: the row may now hold another movie
+        self.renamed = list(renamed)
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def changed(self):
+        return self.updated + self.appended
+
+
+def _generation_name(name, generation):
+    stem, ext = os.path.splitext(name)
+    return f'{stem.split(".")[0]}.{generation}{ext}'
+
+
+class CatalogUpdater:
+    """Append movies to a catalog or update existing ones without rewriting it
+
+    upsert() stages a movie and commit() publishes every staged one. New rows
+    are written into the spare rows at the end of the files, past the row count
+    readers use; a changed existing row goes into new copies of the files it
+    touches (the next generation). Readers only see a change once the manifest
+    is swapped in, so a worker maps either the old or the new catalog, never a
+    mix, and no row it can see is ever modified.
+
+    An updater holds an exclusive lock on the catalog from creation to close(),
+    so other updaters wait instead of reading the same manifest and overwriting
+    each other's commit. Use it as a context manager to release the lock, and
+    keep work that has to follow the commit (index updates) inside the block.
+    """
+
+    def __init__(self, catalog_dir=CATALOG_DIR):
+        self.catalog_dir = catalog_dir
+        self.lock = open(self._path(LOCK_FILE), 'a')
+        if fcntl is not None:
+            fcntl.flock(self.lock.fileno(), fcntl.LOCK_EX)
+        try:
+            self.catalog = Catalog.open(catalog_dir)
+        except BaseException:
+            self.close()
+            raise
+        self.staged = {}  # row -> (features, title, link, year)
+        self.links = {}  # link -> row, for the staged movies
+        self.appended = 0
+
+    def close(self):
+        """Release the catalog lock, staged movies that were not committed are dropped"""
+        # Closing the file releases the lock
+        self.lock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _path(self, name):
+        return os.path.join(self.catalog_dir, name)
+
+    def find(self, link):
+        """Return the row of the movie with this IMDb link, None when it is not in the catalog"""
+        if link in self.links:
+            return self.links[link]
+        needle = link.encode('utf-8')
+        offsets = self.catalog.offsets
+        end = int(offsets[-1])
+        if not needle or end == 0:
+            return None
+        with open(self._path(self.catalog.manifest['files']['strings']), 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+            position = blob.find(needle, 0, end)
+            while position >= 0:
+                # A hit only counts when it is exactly the link string of a row
+                slot = int(np.searchsorted(offsets, position, side='right')) - 1
+                if slot % 2 == 1 and offsets[slot] == position and offsets[slot + 1] == position + len(needle):
+                    return slot // 2
+                position = blob.find(needle, position + 1, end)
+        return None
+
+    def upsert(self, features, title, link, index=None, year=None):
+        """Stage a movie, returns its row
+
+        The movie replaces row `index`, or the row with the same IMDb link, and is
+        appended after the last row when there is neither. An update without a
+        year keeps the year the movie had.
+        """
+        features = np.asarray(features, dtype=np.float64).reshape(-1)
+        if features.shape[0] != self.catalog.matrix.shape[1]:
+            raise ValueError(f'Expected {self.catalog.matrix.shape[1]} features, got {features.shape[0]}')
+        rows = len(self.catalog) + self.appended
+        if index is None:
+            index = self.find(link)
+        if index is None:
+            index = rows
+            self.appended += 1
+        elif not 0 <= index < rows:
+            raise ValueError(f'Row {index} is not in the catalog ({rows} rows)')
+        if year is None and index < len(self.catalog) and self.catalog.years is not None:
+            year = self.catalog.year(index)
+        self.staged[index] = (features, title, link, year or 0)
+        self.links[link] = index
+        return index
+
+    def commit(self):
+        """Write the staged movies and swap the new manifest in, returns a CatalogUpdate"""
+        catalog = self.catalog
+        previous = catalog.manifest
+        old_rows = len(catalog)
+        rows = old_rows + self.appended
+        updated = sorted(i for i in self.staged if i < old_rows)
+        appended = list(range(old_rows, rows))
+        previous_rows = {i: np.array(catalog.matrix[i]) for i in updated}
+        if not self.staged:
+            return CatalogUpdate(previous, previous['version'], [], [], {})
+
+        files = dict(previous['files'])
+        generation = previous.get('generation', 0) + 1
+        new_files = dict(files)
+        matrix_file = np.load(self._path(files['matrix']), mmap_mode='r')
+        offsets_file = np.load(self._path(files['offsets']), mmap_mode='r')
+        capacity = min(matrix_file.shape[0], (offsets_file.shape[0] - 1) // 2)
+        has_years = 'years' in files
+        if has_years:
+            capacity = min(capacity, np.load(self._path(files['years']), mmap_mode='r').shape[0])
+
+        # Titles and links: appended strings go after the last visible byte, in place;
+        # changing an existing one shifts every later offset, so the blob gets a new copy
+        encoded = {i: (title.encode('utf-8'), link.encode('utf-8')) for i, (_, title, link, _) in self.staged.items()}
+        rewrite = [i for i in updated if encoded[i] != (catalog.title(i).encode('utf-8'),
+                                                      catalog.link(i).encode('utf-8'))]
+        sizes = np.diff(np.asarray(catalog.offsets, dtype=np.int64))
+        pieces = []
+        if rewrite:
+            old_blob = catalog.strings
+            start = 0
+            for i in rewrite:
+                pieces.append(bytes(old_blob[start:catalog.offsets[2 * i]]))
+                pieces.extend(encoded[i])
+                sizes[2 * i:2 * i + 2] = [len(item) for item in encoded[i]]
+                start = int(catalog.offsets[2 * i + 2])
+            pieces.append(bytes(old_blob[start:catalog.offsets[-1]]))
+        for i in appended:
+            pieces.extend(encoded[i])
+        sizes = np.concatenate([sizes, [len(item) for i in appended for item in encoded[i]]]).astype(np.int64)
+        offsets = np.zeros(2 * rows + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        if rewrite:
+            new_files['strings'] = _generation_name(files['strings'], generation)
+            with open(self._path(new_files['strings']), 'wb') as f:
+                f.write(b''.join(pieces))
+                os.fsync(f.fileno())
+        elif pieces:
+            with open(self._path(files['strings']), 'r+b') as f:
+                f.seek(int(catalog.offsets[-1]))
+                f.write(b''.join(pieces))
+                os.fsync(f.fileno())
+
+        # Matrix and offsets: in place when the new rows fit the spare rows and no visible
+        # row changes, otherwise a new generation with room to grow
+        grow = rows > capacity
+        if grow:
+            capacity = max(rows, int(old_rows * GROWTH), old_rows + MIN_SPARE_ROWS)
+        block = np.stack([self.staged[i][0] for i in appended]) if appended else None
+        if updated or grow:
+            new_files['matrix'] = _generation_name(files['matrix'], generation)
+            matrix = np.lib.format.open_memmap(self._path(new_files['matrix']), mode='w+', dtype=np.float64,
+                                               shape=(capacity, catalog.matrix.shape[1]))
+            matrix[:old_rows] = catalog.matrix
+            for i in updated:
+                matrix[i] = self.staged[i][0]
+        else:
+            matrix = np.lib.format.open_memmap(self._path(files['matrix']), mode='r+')
+        if block is not None:
+            matrix[old_rows:rows] = block
+        matrix.flush()
+        del matrix
+        if rewrite or grow:
+            new_files['offsets'] = _generation_name(files['offsets'], generation)
+            offsets_out = np.lib.format.open_memmap(self._path(new_files['offsets']), mode='w+', dtype=np.int64,
+                                                    shape=(2 * capacity + 1,))
+            offsets_out[:2 * rows + 1] = offsets
+        else:
+            offsets_out = np.lib.format.open_memmap(self._path(files['offsets']), mode='r+')
+            offsets_out[2 * old_rows + 1:2 * rows + 1] = offsets[2 * old_rows + 1:]
+        offsets_out.flush()
+        del offsets_out
+        if has_years:
+            # Years follow the matrix: in place for appends only, a new generation otherwise
+            if updated or grow:
+                new_files['years'] = _generation_name(files['years'], generation)
+                years = np.lib.format.open_memmap(self._path(new_files['years']), mode='w+', dtype=np.int16,
+                                                  shape=(capacity,))
+                years[:old_rows] = catalog.years
+                for i in updated:
+                    years[i] = self.staged[i][3]
+            else:
+                years = np.lib.format.open_memmap(self._path(files['years']), mode='r+')
+            years[old_rows:rows] = [self.staged[i][3] for i in appended]
+            years.flush()
+            del years
+
+        # The version chains the previous one with the change, no need to hash the whole matrix again
+        digest = hashlib.sha256(previous['version'].encode('ascii'))
+        for i in sorted(self.staged):
+            digest.update(np.int64(i).tobytes() + self.staged[i][0].tobytes())
+            digest.update(b'\0'.join(encoded[i]) + b'\0' + np.int16(self.staged[i][3]).tobytes())
+        manifest = dict(previous, version=digest.hexdigest(), rows=rows, files=new_files,
+                        generation=generation if new_files != files else previous.get('generation', 0))
+        tmp_path = self._path('manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self._path('manifest.json'))
+        self._collect(set(files.values()) | set(new_files.values()))
+
+        self.catalog = Catalog.open(self.catalog_dir)
+        self.staged, self.links, self.appended = {}, {}, 0
+        return CatalogUpdate(manifest, previous['version'], appended, updated, previous_rows, rewrite)
+
+    def _collect(self, keep):
+        """Delete the files of generations older than the previous one"""
+        for name in CatalogWriter.files.values():
+            stem, ext = os.path.splitext(name)
+            for path in [self._path(name)] + glob.glob(self._path(f'{stem}.*{ext}')):
+                if os.path.basename(path) not in keep:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+def write_catalog(data, movie_titles, catalog_dir=CATALOG_DIR, genres=None):
+    """Write feature rows and (title, index, link) rows as a binary catalog"""
+    matrix = np.ascontiguousarray(data, dtype=np.float64)
+    rows = list(movie_titles)
+    writer = CatalogWriter(catalog_dir, matrix.shape[0], matrix.shape[1] if matrix.ndim == 2 else 0, genres)
+    writer.append(matrix, [row[0] for row in rows], [row[2] for row in rows])
+    return writer.close()
+
+
+def load_catalog(catalog_dir=CATALOG_DIR, data_path=DATA_PATH, titles_path=TITLES_PATH):
+    """Open the binary catalog, falling back to the JSON files only when there is no manifest
+
+    A commit deletes the files of the generation before the previous one, which a
+    reader may have just read the manifest of: it then reads the new manifest.
+    """
+    if not os.path.exists(os.path.join(catalog_dir, 'manifest.json')):
+        return Catalog.from_json(data_path, titles_path)
+    for attempt in range(OPEN_RETRIES):
+        try:
+            return Catalog.open(catalog_dir)
+        except FileNotFoundError:
+            if attempt == OPEN_RETRIES - 1:
+                raise
+
+
+_versions = {}
+
+
+def current_version(catalog_dir=CATALOG_DIR):
+    """Return the version named by the catalog's manifest (None without one), re-read only when it is replaced"""
+    path = os.path.join(catalog_dir, 'manifest.json')
+    try:
+        stat = os.stat(path)
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = _versions.get(path)
+        if cached is None or cached[0] != key:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = _versions[path] = (key, json.load(f).get('version'))
+    except (OSError, ValueError):
+        return None
+    return cached[1]
+
+
+if __name__ == '__main__':
+    # Convert the JSON files into a binary catalog
+    catalog = Catalog.from_json()
+    manifest = write_catalog(catalog.matrix, catalog, CATALOG_DIR)
+    print(f"Wrote {manifest['rows']} movies to {CATALOG_DIR} (version {manifest['version'][:12]})")
@@ -0,0 +1,121 @@
+"""Add or update movies in the live catalog, no rebuild and no app restart.
+
+Each movie is upserted into the binary catalog (matched by IMDb link, or by
+row with --row), then the precomputed neighbour index is brought up to date
+for the movies the change can affect, and the content index is carried over
+(new movies have no cast or crew in it until it is rebuilt). Running app
+processes pick the new version up on their next rerun. Updates of one
+catalog run one at a time: a second one waits for the first to finish.
+
+    python Catalog_Update.py --title "Dune" --link "http://www.imdb.com/title/tt1160419/" \\
+        --genres Action Adventure Sci-Fi --score 8.0 --year 2021
+    python Catalog_Update.py --batch new_movies.jsonl
+
+A batch file holds one JSON object per line with title, link, genres (a list of
+names) and score, and optionally year and the row to update.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from Catalog import CATALOG_DIR, GENRES, CatalogUpdater
+from Classifier import FeatureSpace, KNNEngine
+from Neighbour_Index import INDEX_DIR, NeighbourIndex, update_index
+
+# Same default as Content_Similarity.CONTENT_DIR, which needs scipy to import
+CONTENT_DIR = './Data/content'
+
+
+def feature_row(genres, score, genre_names=GENRES):
+    """Return the [genre flags..., imdb_score] vector of a movie"""
+    unknown = [genre for genre in genres if genre not in genre_names]
+    if unknown:
+        raise ValueError(f'Unknown genres: {", ".join(unknown)}')
+    row = np.zeros(len(genre_names) + 1)
+    row[[genre_names.index(genre) for genre in genres]] = 1.0
+    row[-1] = float(score)
+    return row
+
+
+def follow_content_index(update, content_dir):
+    """Carry the content index over the update, returns the movies it has no content for, None when it is stale"""
+    try:
+        from Content_Similarity import update_content_index
+    except ImportError:
+        # Without scipy the app cannot load the content index either
+        return None
+    return update_content_index(update, content_dir)
+
+
+def apply_updates(movies, catalog_dir=CATALOG_DIR, index_dir=INDEX_DIR, content_dir=CONTENT_DIR):
+    """Upsert movies, returns (CatalogUpdate, whether the neighbour index was updated,
+    movies without content in the carried over content index or None when it was not)
+
+    Every movie is a dict with title, link, genres and score, and optionally year and row.
+    """
+    # The catalog stays locked until the indexes have followed the commit
+    with CatalogUpdater(catalog_dir) as updater:
+        genre_names = updater.catalog.genres or GENRES
+        for movie in movies:
+            features = feature_row(movie['genres'], movie['score'], genre_names)
+            updater.upsert(features, movie['title'], movie['link'], movie.get('row'), movie.get('year'))
+        update = updater.commit()
+        if not update.changed:
+            return update, False, []
+
+        # Follow the change in the space the index was built in; an index that is missing or
+        # already stale is left alone and the app keeps using the live scan until it is rebuilt
+        index = NeighbourIndex.load(index_dir)
+        updated_index = False
+        if index is not None:
+            space = FeatureSpace.from_signature(index.meta.get('space', FeatureSpace.raw().signature))
+            engine = KNNEngine(updater.catalog.matrix, space=space)
+            updated_index = update_index(update, engine, index_dir)
+        return update, updated_index, follow_content_index(update, content_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add or update movies in the catalog and its neighbour index')
+    parser.add_argument('--catalog', default=CATALOG_DIR, help='catalog directory')
+    parser.add_argument('--index', dest='index_dir', default=INDEX_DIR, help='neighbour index directory')
+    parser.add_argument('--content', dest='content_dir', default=CONTENT_DIR, help='content index directory')
+    parser.add_argument('--batch', help='JSON lines file of movies to upsert')
+    parser.add_argument('--title', help='movie title')
+    parser.add_argument('--link', help='IMDb link, the movie with this link is updated when there is one')
+    parser.add_argument('--genres', nargs='+', default=[], help='genre names')
+    parser.add_argument('--score', type=float, help='IMDb score')
+    parser.add_argument('--year', type=int, default=None, help='release year')
+    parser.add_argument('--row', type=int, default=None, help='update this row instead of matching the link')
+    args = parser.parse_args()
+
+    if args.batch:
+        with open(args.batch, 'r', encoding='utf-8') as f:
+            movies = [json.loads(line) for line in f if line.strip()]
+    elif args.title and args.link and args.score is not None:
+        movies = [{'title': args.title, 'link': args.link, 'genres': args.genres, 'score': args.score,
+                   'year': args.year, 'row': args.row}]
+    else:
+        parser.error('give --batch, or --title, --link and --score')
+
+    started = time.perf_counter()
+    try:
+        update, updated_index, no_content = apply_updates(movies, args.catalog, args.index_dir, args.content_dir)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f'Appended {len(update.appended)} and updated {len(update.updated)} movies in {elapsed:.1f} ms, '
+          f'catalog version {update.version[:12]}')
+    if not updated_index:
+        print(f'The neighbour index in {args.index_dir} was not updated, rebuild it with python Neighbour_Index.py')
+    if no_content is None:
+        print(f'The content index in {args.content_dir} was not updated, similar movies by cast and crew are '
+              f'off until it is rebuilt with python Content_Similarity.py')
+    elif no_content:
+        print(f'{len(no_content)} movies have no cast, crew or keywords in the content index until it is rebuilt '
+              f'with python Content_Similarity.py from a CSV that has them')
+
+
+if __name__ == '__main__':
+    main()
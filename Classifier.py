@@ -1,10 +1,285 @@
+import json
 import numpy as np
 from operator import itemgetter
 
+# Number of set bits in every byte value, for numpy versions without np.bitwise_count
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Function returns the number of set bits of every element of an unsigned integer array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    return _POPCOUNT8[words.view(np.uint8)].reshape(words.shape + (-1,)).sum(axis=-1, dtype=np.uint8)
+
+
+def pack_bits(flags):
+    """Function packs the rows of a 0/1 matrix into rows of uint64 words"""
+    flags = np.asarray(flags) > 0
+    packed = np.packbits(flags, axis=1, bitorder='little')
+    words = -(-packed.shape[1] // 8)
+    padded = np.zeros((packed.shape[0], words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8')
+
+
+def euclidean_distances(matrix, queries):
+    """Function returns the (n_queries x n_rows) euclidean distance matrix"""
+    diff = matrix[None, :, :] - queries[:, None, :]
+    # Row-wise dot products reduce in the same order as np.linalg.norm on a single vector
+    return np.sqrt(np.matmul(diff[..., None, :], diff[..., :, None]).reshape(queries.shape[0], -1))
+
+
+class FeatureSpace:
+    """How movie vectors laid out as [genre flags..., imdb_score] are compared
+
+    metric:          'euclidean' over all (weighted) features, or 'cosine' / 'jaccard'
+                     distance between the genre sets plus the weighted score gap
+    genre_weights:   one weight for every genre, or a single weight for all of them
+    score_weight:    weight of the score feature
+    normalize_score: rescale the score from score_range to [0, 1], so a full-range
+                     score gap weighs as much as one differing genre instead of nine
+    """
+
+    METRICS = ('euclidean', 'cosine', 'jaccard')
+
+    def __init__(self, metric='euclidean', genre_weights=1.0, score_weight=1.0, normalize_score=True,
+                 score_range=(1.0, 10.0)):
+        if metric not in self.METRICS:
+            raise ValueError(f'Unknown metric {metric!r}, expected one of {", ".join(self.METRICS)}')
+        self.metric = metric
+        self.genre_weights = np.asarray(genre_weights, dtype=np.float64)
+        self.score_weight = float(score_weight)
+        self.normalize_score = normalize_score
+        self.score_range = (float(score_range[0]), float(score_range[1]))
+
+    @classmethod
+    def raw(cls):
+        """The original space: plain euclidean distance over the unscaled vectors"""
+        return cls(normalize_score=False)
+
+    @classmethod
+    def from_signature(cls, signature):
+        """Rebuild the space an index was built in from its stored signature"""
+        options = json.loads(signature)
+        return cls(options['metric'], options['genre_weights'], options['score_weight'], options['normalize_score'],
+                   options['score_range'])
+
+    @property
+    def signature(self):
+        """A string that identifies the space, stored with indexes built in it"""
+        return json.dumps({'metric': self.metric, 'genre_weights': self.genre_weights.tolist(),
+                           'score_weight': self.score_weight, 'normalize_score': self.normalize_score,
+                           'score_range': list(self.score_range)}, sort_keys=True)
+
+    @property
+    def uniform_genres(self):
+        return self.genre_weights.ndim == 0 or bool(np.all(self.genre_weights == self.genre_weights.flat[0]))
+
+    def scores(self, rows):
+        """Method returns the (normalized) score column of a matrix"""
+        scores = rows[:, -1]
+        if self.normalize_score:
+            low, high = self.score_range
+            scores = (scores - low) / (high - low)
+        return scores
+
+    def transform(self, rows):
+        """Method returns the rows with the score normalized and every feature weighted (euclidean metric)"""
+        rows = np.asarray(rows)
+        if not self.normalize_score and self.score_weight == 1 and self.uniform_genres \
+                and float(self.genre_weights.flat[0]) == 1:
+            # Identity, keep the distances bitwise identical to the raw vectors
+            return rows
+        out = np.array(rows, dtype=np.float64)
+        out[:, :-1] *= self.genre_weights
+        out[:, -1] = self.scores(out) * self.score_weight
+        return out
+
+    def prepare(self, rows):
+        """Method returns the representation distances() works on for a (n x features) matrix"""
+        rows = np.atleast_2d(np.asarray(rows))
+        if self.metric == 'euclidean':
+            return self.transform(rows)
+        scores = self.scores(np.asarray(rows[:, -1:], dtype=np.float64)) * self.score_weight
+        if self.uniform_genres:
+            # Genre sets as bit-packed words, intersections are popcounts of ANDed words
+            bits = pack_bits(rows[:, :-1])
+            return bits, popcount(bits).sum(axis=1, dtype=np.int64).astype(np.float64), scores
+        flags = (np.asarray(rows[:, :-1]) > 0).astype(np.float64)
+        return flags, flags @ self.genre_weights, scores
+
+    def subset(self, prepared, rows):
+        """Method returns the prepared representation of a subset of rows"""
+        if self.metric == 'euclidean':
+            return prepared[rows]
+        return tuple(part[rows] for part in prepared)
+
+    def distances(self, prepared, queries):
+        """Method returns the (n_queries x n_rows) distances between two prepared matrices"""
+        if self.metric == 'euclidean':
+            return euclidean_distances(prepared, queries)
+        rows, row_sizes, row_scores = prepared
+        query_rows, query_sizes, query_scores = queries
+        if self.uniform_genres:
+            overlap = popcount(query_rows[:, None, :] & rows[None, :, :]).sum(axis=2, dtype=np.int64)
+        else:
+            # Weighted intersection of binary vectors: sum of the weights of the shared genres
+            overlap = (query_rows * self.genre_weights) @ rows.T
+        overlap = overlap.astype(np.float64)
+        if self.metric == 'cosine':
+            denominator = np.sqrt(query_sizes[:, None] * row_sizes[None, :])
+            empty = 1.0  # a movie without genres is unlike everything
+        else:
+            denominator = query_sizes[:, None] + row_sizes[None, :] - overlap
+            empty = 0.0  # two empty genre sets are identical
+        with np.errstate(divide='ignore', invalid='ignore'):
+            genre_distance = np.where(denominator > 0, 1.0 - overlap / denominator, empty)
+        return genre_distance + np.abs(query_scores[:, None] - row_scores[None, :])
+
+
+class KNNEngine:
+    """Vectorized nearest neighbour search over a fixed movie matrix"""
+
+    def __init__(self, data, dtype=np.float64, space=None, features=None):
+        # Hold the whole catalog once as a contiguous matrix; float64 keeps every
+        # distance bitwise identical to dist(), float32 halves the memory
+        self.matrix = np.ascontiguousarray(data, dtype=dtype)
+        self.space = space if space is not None else FeatureSpace.raw()
+        # The rows as the space compares them (the matrix itself in the raw space), computed
+        # here unless given, e.g. memory-mapped by Catalog.features so processes share them
+        self.features = features if features is not None else self.space.prepare(self.matrix)
+        # Squared norms of the euclidean features, computed by the first batched search
+        self._norms = None
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def distances(self, test_point):
+        """Method returns the distance from the test point to every row"""
+        return self._distances(np.asarray(test_point, dtype=self.matrix.dtype)[None, :])[0]
+
+    def distances_to(self, test_point, rows):
+        """Method returns the distance from the test point to the given rows only"""
+        query = self.space.prepare(np.asarray(test_point, dtype=self.matrix.dtype)[None, :])
+        return self.space.distances(self.space.subset(self.features, rows), query)[0]
+
+    def _distances(self, queries):
+        """Method returns the (n_queries x n_rows) distance matrix for a chunk of queries"""
+        return self.space.distances(self.features, self.space.prepare(queries))
+
+    @staticmethod
+    def select(distances, k):
+        """Method returns the indices of the k smallest distances, ties broken by index"""
+        n = distances.shape[0]
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k < n:
+            # Partial selection of the k-th distance, then keep everything up to it so ties stay stable
+            kth = np.partition(distances, k - 1)[k - 1]
+            candidates = np.flatnonzero(distances <= kth)
+        else:
+            candidates = np.arange(n)
+        order = np.lexsort((candidates, distances[candidates]))
+        return candidates[order[:k]]
+
+    def kneighbours(self, test_point, k):
+        """Method returns the indices and distances of the k nearest rows"""
+        distances = self.distances(test_point)
+        indices = self.select(distances, k)
+        return indices, distances[indices]
+
+    def _block(self, queries, start, stop):
+        """Method returns the distances from prepared queries to rows start:stop, squared and
+        approximate (one matrix product) for the euclidean metric, exact for the others"""
+        if self.space.metric != 'euclidean':
+            return self.space.distances(self.space.subset(self.features, slice(start, stop)), queries)
+        if self._norms is None:
+            self._norms = np.einsum('ij,ij->i', self.features, self.features)
+        rows = self.features[start:stop]
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+        block = queries @ rows.T
+        block *= -2
+        block += query_norms[:, None]
+        block += self._norms[None, start:stop]
+        return block
+
+    def _margin(self, queries):
+        """Method returns how far each query's approximate block distances can be from the exact ones"""
+        if self.space.metric != 'euclidean':
+            return np.zeros(len(queries[0]))
+        if self._norms is None:
+            self._norms = np.einsum('ij,ij->i', self.features, self.features)
+        eps = np.finfo(np.result_type(self.features.dtype, queries.dtype)).eps
+        # Rounding of ||q||^2 - 2 q.x + ||x||^2 and of the exact distance, generously bounded
+        return 8 * (queries.shape[1] + 2) * eps * (np.einsum('ij,ij->i', queries, queries) + self._norms.max())
+
+    def kneighbours_batch(self, test_points, k, max_bytes=8 * 1024 * 1024):
+        """Method returns the (n_queries x k) indices and distances of the k nearest rows for every query
+
+        Queries and rows are both processed in blocks whose distance matrix stays under
+        max_bytes. A first pass keeps the k smallest (euclidean: approximate, from one
+        matrix product per block) distances of every query; a second collects every row
+        within the k-th of them, which get exact distances and are ranked with ties
+        broken by index, so the result equals kneighbours() for every query.
+        """
+        queries = np.atleast_2d(np.asarray(test_points, dtype=self.matrix.dtype))
+        n_queries, n_rows = queries.shape[0], len(self)
+        k = max(0, min(k, n_rows))
+        indices = np.empty((n_queries, k), dtype=np.intp)
+        distances = np.empty((n_queries, k), dtype=self.matrix.dtype)
+        if k == 0 or n_queries == 0:
+            return indices, distances
+        # Blocks of block_rows rows by chunk queries, 8 bytes a distance
+        block_rows = min(n_rows, max(k, max_bytes // 8 // min(n_queries, 32)))
+        chunk = max(1, max_bytes // 8 // block_rows)
+        for first in range(0, n_queries, chunk):
+            prepared = self.space.prepare(queries[first:first + chunk])
+            margin = self._margin(prepared)
+            # Pass 1: the k smallest block distances of every query, by one partial selection per block
+            best = None
+            for start in range(0, n_rows, block_rows):
+                block = pool = self._block(prepared, start, start + block_rows)
+                pool = pool if best is None else np.hstack([best, pool])
+                best = np.partition(pool, k - 1, axis=1)[:, :k] if pool.shape[1] > k else pool
+            bound = best.max(axis=1) + margin
+            # Pass 2: every row that can be among the k nearest of a query
+            owners, rows, values = [], [], []
+            for start in range(0, n_rows, block_rows):
+                # With a single block of rows, pass 1 already computed it
+                if block_rows < n_rows:
+                    block = self._block(prepared, start, start + block_rows)
+                query_ids, row_ids = np.nonzero(block <= bound[:, None])
+                owners.append(query_ids)
+                rows.append(row_ids + start)
+                values.append(block[query_ids, row_ids])
+            owners, rows, values = np.concatenate(owners), np.concatenate(rows), np.concatenate(values)
+            if self.space.metric == 'euclidean':
+                # Exact distances of the candidates, reduced the way euclidean_distances() does
+                diff = self.features[rows] - prepared[owners]
+                values = np.sqrt(np.matmul(diff[:, None, :], diff[:, :, None]).reshape(-1))
+            order = np.lexsort((rows, values, owners))
+            counts = np.bincount(owners, minlength=len(bound))
+            take = order[(np.cumsum(counts) - counts)[:, None] + np.arange(k)]
+            indices[first:first + chunk] = rows[take]
+            distances[first:first + chunk] = values[take]
+        return indices, distances
+
 
 class KNearestNeighbours:
-    def __init__(self, data, target, test_point, k):
+    """K nearest neighbours classification of a test point
+
+    After fit(), distances holds the (distance, index) pairs of the k nearest
+    rows only, nearest first. They are the euclidean distances over the raw
+    vectors that dist() computes, unless a feature space is given or data is an
+    engine or index built in one (such as the app's): they are then distances in
+    that space, e.g. with the score rescaled to [0, 1].
+    """
+
+    def __init__(self, data, target, test_point, k, space=None):
         self.data = data
+        self.space = space
         self.target = target
         self.test_point = test_point
         self.k = k
@@ -21,16 +296,17 @@ class KNearestNeighbours:
 
     def fit(self):
         """Method that performs the KNN classification"""
-        # Create a list of (distance, index) tuples from the test point to each point in the data
-        self.distances.extend([(self.dist(self.test_point, point), i) for point, i in zip(self.data, [i for i in range(len(self.data))])])
-        # Sort the distances in ascending order
-        sorted_li = sorted(self.distances, key=itemgetter(0))
+        # Reuse a prebuilt engine or index backend (see Ann_Index) when one is passed in place of the raw data
+        engine = self.data if hasattr(self.data, 'kneighbours') else KNNEngine(self.data, space=self.space)
+        # Fetch the (distance, index) tuples of the k nearest points, nearest first
+        indices, distances = engine.kneighbours(self.test_point, self.k)
+        self.distances.extend(zip(distances.tolist(), indices.tolist()))
         # Fetch the indices of the k nearest point from the data
-        self.indices.extend([index for (val, index) in sorted_li[:self.k]])
+        self.indices.extend(indices.tolist())
         # Fetch the categories from the train data target
         for i in self.indices:
             self.categories.append(self.target[i])
         # Fetch the count for each category from the K nearest neighbours
         self.counts.extend([(i, self.categories.count(i)) for i in set(self.categories)])
         # Find the highest repeated category among the K nearest neighbours
-        self.category_assigned = sorted(self.counts, key=itemgetter(1), reverse=True)[0][0]
\ No newline at end of file
+        self.category_assigned = sorted(self.counts, key=itemgetter(1), reverse=True)[0][0]
@@ -0,0 +1,229 @@
+"""Content-based similarity from the metadata the genre vectors leave out.
+
+Every movie in movie_metadata.csv becomes a sparse TF-IDF row over tokens such
+as ``director:james cameron``, ``actor:sigourney weaver``, ``keyword:alien``,
+``language:english``, ``country:usa``, ``rating:pg-13`` and ``decade:1980s``.
+Rows are weighted per field and L2-normalized, so the dot product of two rows
+is their cosine similarity. The matrix is stored as CSR together with its
+transpose (one posting list of movies per token): a query only walks the
+postings of its own tokens, so its cost grows with the non-zeros it touches,
+not with vocabulary x movies.
+
+    python Content_Similarity.py --csv ./Data/movie_metadata.csv --out ./Data/content
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from Catalog import CATALOG_DIR, load_catalog
+
+CONTENT_DIR = './Data/content'
+CSV_PATH = './Data/movie_metadata.csv'
+CHUNK_SIZE = 50000
+COLUMNS = ['director_name', 'actor_1_name', 'actor_2_name', 'actor_3_name', 'plot_keywords', 'language',
+           'country', 'title_year', 'content_rating']
+# Relative weight of every token field in the similarity
+FIELD_WEIGHTS = {'director': 1.0, 'actor': 1.0, 'keyword': 1.0, 'language': 0.5, 'country': 0.5,
+                 'rating': 0.5, 'decade': 0.5}
+
+
+def _clean(value):
+    return str(value).strip().lower() if value is not None and str(value).strip() else None
+
+
+def movie_tokens(row):
+    """Return the field:value tokens of one metadata row (missing cells are None)"""
+    tokens = []
+    for field, column in (('director', 'director_name'), ('language', 'language'), ('country', 'country'),
+                          ('rating', 'content_rating')):
+        value = _clean(row[column])
+        if value:
+            tokens.append(f'{field}:{value}')
+    for column in ('actor_1_name', 'actor_2_name', 'actor_3_name'):
+        value = _clean(row[column])
+        if value:
+            tokens.append(f'actor:{value}')
+    keywords = _clean(row['plot_keywords'])
+    if keywords:
+        tokens.extend(f'keyword:{keyword.strip()}' for keyword in keywords.split('|') if keyword.strip())
+    if row['title_year'] is not None:
+        tokens.append(f'decade:{int(row["title_year"]) // 10 * 10}s')
+    return tokens
+
+
+def build_content_matrix(csv_path=CSV_PATH, chunk_size=CHUNK_SIZE, field_weights=FIELD_WEIGHTS):
+    """Read the metadata CSV in chunks, returns (CSR tf-idf matrix, vocabulary list)"""
+    # pandas is only needed to build the index, it is imported here so loading one stays light
+    import pandas as pd
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    counts = []
+    for chunk in pd.read_csv(csv_path, usecols=COLUMNS, chunksize=chunk_size):
+        for row in chunk.astype(object).where(chunk.notna(), None).to_dict('records'):
+            row_counts = {}
+            for token in movie_tokens(row):
+                column = vocabulary.setdefault(token, len(vocabulary))
+                row_counts[column] = row_counts.get(column, 0) + 1
+            indices.extend(row_counts)
+            counts.extend(row_counts.values())
+            indptr.append(len(indices))
+    tokens = list(vocabulary)
+    matrix = sp.csr_matrix((np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int32),
+                            np.asarray(indptr, dtype=np.int64)), shape=(len(indptr) - 1, len(tokens)))
+    matrix.sum_duplicates()
+
+    # Smoothed idf, as in scikit-learn: rare tokens (one director, one keyword) count most
+    rows = matrix.shape[0]
+    document_frequency = np.bincount(matrix.indices, minlength=len(tokens))
+    idf = np.log((1 + rows) / (1 + document_frequency)) + 1
+    weights = np.array([field_weights.get(token.split(':', 1)[0], 1.0) for token in tokens])
+    matrix.data *= (idf * weights)[matrix.indices]
+
+    # L2-normalize every row so dot products are cosine similarities
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+    return matrix, tokens
+
+
+def save_content_index(matrix, tokens, catalog_version, content_dir=CONTENT_DIR, vocabulary=True):
+    """Write the matrix, its vocabulary (unless it is unchanged) and the meta file
+
+    Every file is written under a temporary name and swapped in, so a reader gets the old or the new one.
+    """
+    os.makedirs(content_dir, exist_ok=True)
+    path = os.path.join(content_dir, 'tfidf.npz')
+    with open(path + '.tmp', 'wb') as f:
+        sp.save_npz(f, matrix.tocsr())
+    os.replace(path + '.tmp', path)
+    if vocabulary:
+        path = os.path.join(content_dir, 'vocabulary.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(tokens, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+    meta = {'catalog_version': catalog_version, 'rows': int(matrix.shape[0]), 'tokens': len(tokens),
+            'nnz': int(matrix.nnz), 'field_weights': FIELD_WEIGHTS}
+    # Write the meta last so a half-written index never looks fresh
+    path = os.path.join(content_dir, 'meta.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+
+class ContentIndex:
+    """Sparse cosine top-k over the tf-idf rows"""
+
+    def __init__(self, matrix, tokens=None, meta=None):
+        self.matrix = matrix.tocsr()
+        # Token -> movies posting lists for the queries
+        self.postings = self.matrix.T.tocsr()
+        self.tokens = tokens
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, content_dir=CONTENT_DIR):
+        """Open a saved index, returns None when it does not exist"""
+        try:
+            with open(os.path.join(content_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            matrix = sp.load_npz(os.path.join(content_dir, 'tfidf.npz'))
+            with open(os.path.join(content_dir, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Arrays swapped in after this meta was read belong to the next version
+        if matrix.shape[0] != meta.get('rows'):
+            return None
+        return cls(matrix, tokens, meta)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def is_fresh(self, catalog_version, rows):
+        """Check the index was built for the current catalog"""
+        return self.meta.get('catalog_version') == catalog_version and self.meta.get('rows') == rows
+
+    def scores(self, query):
+        """Return the (movie IDs, cosine similarities) of every movie sharing a token with a 1 x tokens query row"""
+        query = sp.csr_matrix(query)
+        tokens, weights = query.indices, query.data
+        starts = self.postings.indptr[tokens]
+        lengths = self.postings.indptr[tokens + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        # Positions of the query's posting lists inside postings.indices, concatenated;
+        # only those entries are read, nothing is sized by the number of movies
+        positions = np.arange(total) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        ids, inverse = np.unique(self.postings.indices[positions], return_inverse=True)
+        similarities = np.bincount(inverse, weights=self.postings.data[positions] * np.repeat(weights, lengths))
+        return ids.astype(np.intp), similarities
+
+    def top_k(self, query, k, exclude=None):
+        """Return the indices and similarities of the k most similar movies, ties broken by index"""
+        ids, similarities = self.scores(query)
+        if exclude is not None:
+            keep = ids != exclude
+            ids, similarities = ids[keep], similarities[keep]
+        keep = similarities > 0
+        ids, similarities = ids[keep], similarities[keep]
+        k = min(k, len(ids))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        if k < len(ids):
+            # Partial selection of the k-th similarity, then keep every tie with it
+            kth = np.partition(similarities, len(ids) - k)[len(ids) - k]
+            candidates = np.flatnonzero(similarities >= kth)
+        else:
+            candidates = np.arange(len(ids))
+        order = np.lexsort((ids[candidates], -similarities[candidates]))[:k]
+        return ids[candidates[order]], similarities[candidates[order]]
+
+    def similar(self, movie_index, k):
+        """Return the k movies most similar to a catalog movie (never the movie itself)"""
+        return self.top_k(self.matrix[movie_index], k, exclude=movie_index)
+
+
+def update_content_index(update, content_dir=CONTENT_DIR):
+    """Carry the index over a CatalogUpdate, returns the movies left without content, None when it is stale
+
+    Cast, crew and keywords come from the metadata CSV, not from the catalog, so a
+    movie whose genres or score changed keeps its row. An appended movie, or a row
+    whose title or link changed, gets an empty row: it is similar to nothing until
+    the index is rebuilt from a CSV that has it.
+    """
+    index = ContentIndex.load(content_dir)
+    old_rows = update.manifest['rows'] - len(update.appended)
+    if index is None or not index.is_fresh(update.previous_version, old_rows):
+        return None
+    keep = np.ones(old_rows)
+    keep[update.renamed] = 0
+    matrix = sp.vstack([sp.diags(keep) @ index.matrix, sp.csr_matrix((len(update.appended), index.matrix.shape[1]))])
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    save_content_index(matrix, index.tokens, update.version, content_dir, vocabulary=False)
+    return update.renamed + update.appended
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the content (cast, crew, keywords) similarity index')
+    parser.add_argument('--csv', default=CSV_PATH, help='IMDb 5000 style metadata CSV')
+    parser.add_argument('--out', default=CONTENT_DIR, help='output directory')
+    parser.add_argument('--catalog', default=CATALOG_DIR, help='catalog directory whose version is recorded')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='CSV rows processed per chunk')
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    matrix, tokens = build_content_matrix(args.csv, args.chunk_size)
+    if matrix.shape[0] != len(catalog):
+        parser.error(f'{args.csv} has {matrix.shape[0]} movies but the catalog has {len(catalog)}')
+    save_content_index(matrix, tokens, catalog.version, args.out)
+    print(f'Wrote {matrix.shape[0]} movies x {len(tokens)} tokens ({matrix.nnz} non-zeros) to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
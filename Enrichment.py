@@ -0,0 +1,656 @@
+"""Movie enrichment shared by the poster and information lookups.
+
+Every title's OMDb record and IMDb page are fetched at most once and cached in
+parsed form, so a card that shows both a poster and its plot/cast costs one
+OMDb lookup and at most one IMDb page download instead of two of each.
+OMDb records, parsed plot/cast and poster thumbnails (JPEG bytes) are also
+written to the persistent store (Store.py), so they survive restarts and are
+shared by every worker process. All network calls go through the pooled client in Http.py.
+Lookups in both caches and the time of every stage are recorded in Metrics.py.
+"""
+import codecs
+import html
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import PIL.Image
+import requests
+from bs4 import BeautifulSoup
+
+import Http
+import Metrics
+from Store import get_store
+
+OMDB_URL = "http://www.omdbapi.com/"
+OMDB_API_KEY = os.getenv('OMDB_API_KEY')
+POSTER_SIZE = (220, 330)
+# st.image passes JPEG bytes through untouched but re-encodes WebP, so posters are kept as JPEG
+POSTER_FORMAT = 'JPEG'
+POSTER_QUALITY = 85
+NEGATIVE_TTL = 24 * 3600  # seconds a failed lookup is remembered in the store
+READ_CHUNK = 16 * 1024  # bytes read from an IMDB page at a time
+HEAD_SCAN_LIMIT = 512 * 1024  # characters read looking for </head> before giving up on the fast path
+# OMDb errors that mean the movie is not there; any other error (a request limit, a bad key) may pass
+OMDB_MISSES = ('Movie not found!', 'Incorrect IMDb ID.')
+# Statuses that mean a page or poster is not there; any other failure may pass
+NOT_FOUND = (404, 410)
+
+
+class TransientError(Exception):
+    """A lookup that failed for a reason that may pass (network error, timeout, 429 or 5xx)
+
+    It is raised instead of returning an empty result, so the failure is never
+    stored as a miss in the memo caches or in the persistent store.
+    """
+
+
+class MemoCache:
+    """Thread-safe LRU memo with a TTL where concurrent callers of the same key share one computation"""
+
+    def __init__(self, name, maxsize=1024, ttl=1800):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    Metrics.count('cache_requests_total', cache=self.name, result='hit')
+                    return entry[1]
+                event = self.inflight.get(key)
+                if event is None:
+                    event = self.inflight[key] = threading.Event()
+                    Metrics.count('cache_requests_total', cache=self.name, result='miss')
+                    break
+            # Another thread is already fetching this key, wait for its result
+            Metrics.count('cache_requests_total', cache=self.name, result='shared')
+            event.wait()
+        try:
+            value = compute()
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_omdb_cache = MemoCache('omdb')
+_imdb_cache = MemoCache('imdb')
+
+
+def extract_imdb_id(imdb_link):
+    """Extract IMDB ID from IMDB URL"""
+    try:
+        # Pattern: tt followed by 7-8 digits
+        match = re.search(r'tt\d{7,8}', imdb_link)
+        if match:
+            return match.group(0)
+    except:
+        pass
+    return None
+
+
+def _omdb_lookup(params):
+    """Return the OMDB record for the query, None when OMDB has no such movie (TransientError on failure)"""
+    try:
+        response = Http.get(OMDB_URL, params=params)
+        if response.status_code in NOT_FOUND:
+            return None
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError) as error:
+        raise TransientError(f'OMDB lookup failed: {error}') from error
+    if data.get("Response") == "True":
+        return data
+    if data.get("Error") in OMDB_MISSES:
+        return None
+    raise TransientError(f'OMDB lookup failed: {data.get("Error")}')
+
+
+@Metrics.span('omdb')
+def fetch_from_omdb(imdb_id=None, movie_title=None):
+    """Fetch movie data from OMDB API
+
+    Returns None when OMDB has no such movie, raises TransientError when it could not be asked.
+    """
+    if not OMDB_API_KEY:
+        return None
+
+    # Prefer IMDB ID over title (more accurate)
+    if imdb_id:
+        data = _omdb_lookup({"apikey": OMDB_API_KEY, "i": imdb_id})
+        if data is not None:
+            return data
+
+    # Fallback to title search if IMDB ID didn't work
+    if movie_title:
+        # Clean title - remove year if present in parentheses
+        clean_title = re.sub(r'\s*\(\d{4}\)\s*$', '', movie_title).strip()
+        return _omdb_lookup({"apikey": OMDB_API_KEY, "t": clean_title})
+    return None
+
+
+def store_key(kind, imdb_link, movie_title=None):
+    """Return the persistent store key of a movie, by IMDB ID when the link has one"""
+    imdb_id = extract_imdb_id(imdb_link)
+    return f'{kind}:{imdb_id}' if imdb_id else f'{kind}:title:{movie_title}'
+
+
+def is_failed_lookup(raw):
+    """Tell whether a raw store value records a failed lookup rather than a result"""
+    return raw in (b'', b'null', json.dumps(["", "", "", ""]).encode('utf-8'))
+
+
+def _stored(key, compute, encode, decode, is_empty):
+    """Serve a value from the persistent store, computing and saving it on a miss
+
+    An empty value is a definitive miss and is kept for NEGATIVE_TTL; a
+    TransientError from compute() is passed on and nothing is stored.
+    """
+    store = get_store()
+    if store is not None:
+        try:
+            raw = store.get(key)
+            if raw is not None:
+                value = decode(raw)
+                Metrics.count('cache_requests_total', cache='store', result='hit')
+                return value
+        except Exception:
+            pass
+        Metrics.count('cache_requests_total', cache='store', result='miss')
+    value = compute()
+    if store is not None:
+        try:
+            store.put(key, encode(value), NEGATIVE_TTL if is_empty(value) else None)
+        except Exception:
+            pass
+    return value
+
+
+def get_omdb_record(imdb_link, movie_title=None):
+    """Return the cached OMDB record of a movie, fetching it on first use"""
+    imdb_id = extract_imdb_id(imdb_link)
+    if not OMDB_API_KEY or not (imdb_id or movie_title):
+        return None
+    return _omdb_cache.get_or_compute((imdb_id, movie_title), lambda: _stored(
+        store_key('omdb', imdb_link, movie_title),
+        lambda: fetch_from_omdb(imdb_id=imdb_id, movie_title=movie_title),
+        lambda record: json.dumps(record).encode('utf-8'),
+        json.loads,
+        lambda record: record is None))
+
+
+class ImdbPage:
+    """Everything the app uses from one IMDB title page, parsed once"""
+
+    def __init__(self, poster_urls, title, cast, story, complete=True):
+        self.poster_urls = poster_urls
+        self.title = title
+        self.cast = cast
+        self.story = story
+        # False when only the <head> was read: poster_urls then holds the first candidates only
+        self.complete = complete
+
+
+def get_imdb_page(imdb_link, complete=False):
+    """Return the cached parsed IMDB page of a movie, downloading it on first use
+
+    None when the page does not exist or cannot be parsed, TransientError when
+    it could not be downloaded. With complete=True the whole page is parsed,
+    for callers that need more than the candidates found in the page head.
+    """
+    page = _imdb_cache.get_or_compute(imdb_link, lambda: _fetch_imdb_page(imdb_link))
+    if complete and page is not None and not page.complete:
+        page = _imdb_cache.get_or_compute((imdb_link, 'complete'), lambda: _fetch_imdb_page(imdb_link, fast=False))
+    return page
+
+
+@Metrics.span('imdb_page')
+def _fetch_imdb_page(imdb_link, fast=True):
+    try:
+        with Http.stream(imdb_link) as response:
+            if response.status_code in NOT_FOUND:
+                return None
+            response.raise_for_status()
+            return parse_imdb_html(_decoded_chunks(response), fast)
+    except requests.RequestException as error:
+        raise TransientError(f'IMDB page {imdb_link}: {error}') from error
+    except Exception:
+        return None
+
+
+def _decoded_chunks(response):
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    for chunk in response.iter_content(READ_CHUNK):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_HEAD_END = re.compile(r'</head\s*>', re.I)
+_META = re.compile(r"""<meta\b((?:[^>"']|"[^"]*"|'[^']*')*)>""", re.I)
+_SCRIPT = re.compile(r"""<script\b((?:[^>"']|"[^"]*"|'[^']*')*)>(.*?)</script""", re.I | re.S)
+_ATTR = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?""")
+
+
+def parse_imdb_html(chunks, fast=True):
+    """Build an ImdbPage from an IMDB title page given as an iterable of text chunks
+
+    The fast path reads only up to </head> and picks the JSON-LD block, og:image
+    and meta description out of it with a few regexes. The page is parsed in full
+    with BeautifulSoup (reading the rest of the chunks) only when those tags
+    leave the title, cast or plot empty, or give no poster candidate.
+    """
+    chunks = iter(chunks)
+    parts = []
+    if fast:
+        size = 0
+        for chunk in chunks:
+            parts.append(chunk)
+            # Look for </head> in the new chunk plus a few characters carried over from the previous one
+            window = ''.join(parts[-2:])[-(len(chunk) + 8):]
+            size += len(chunk)
+            if _HEAD_END.search(window) or size >= HEAD_SCAN_LIMIT:
+                break
+        json_ld, og_image, description = _scan_head(''.join(parts))
+        poster_urls = _head_poster_urls(json_ld, og_image)
+        title, cast, story = _head_info(json_ld, description)
+        if poster_urls and title and cast and story:
+            return ImdbPage(list(dict.fromkeys(poster_urls)), title, cast, story, complete=False)
+    parts.extend(chunks)
+    url_data = ''.join(parts)
+    s_data = BeautifulSoup(url_data, 'html.parser')
+    head = _soup_head(s_data)
+    poster_urls = _parse_poster_urls(s_data, url_data, head)
+    title, cast, story = _parse_info(s_data, head)
+    return ImdbPage(poster_urls, title, cast, story)
+
+
+def _tag_attrs(text):
+    attrs = {}
+    for name, double, single, bare in _ATTR.findall(text):
+        attrs[name.lower()] = html.unescape(double or single or bare)
+    return attrs
+
+
+def _scan_head(head_html):
+    """Return the (JSON-LD data, og:image URL, meta description) found in raw HTML, None for what is missing"""
+    head_html = _COMMENT.sub('', head_html)
+    json_ld = og_image = description = None
+    for match in _SCRIPT.finditer(head_html):
+        if _tag_attrs(match.group(1)).get('type') == 'application/ld+json':
+            json_ld = _json_ld_data(match.group(2))
+            break
+    for match in _META.finditer(head_html):
+        attrs = _tag_attrs(match.group(1))
+        if og_image is None and attrs.get('property') == 'og:image':
+            og_image = attrs.get('content', '')
+        if description is None and attrs.get('name') == 'description':
+            description = attrs.get('content', '')
+        if og_image is not None and description is not None:
+            break
+    return json_ld, og_image, description
+
+
+def _soup_head(s_data):
+    """Same as _scan_head, on a fully parsed page"""
+    json_ld = s_data.find("script", type="application/ld+json")
+    og_image = s_data.find("meta", property="og:image")
+    description = s_data.find("meta", {"name": "description"})
+    return (_json_ld_data(json_ld.string) if json_ld else None,
+            og_image.get('content', '') if og_image else None,
+            description.get('content', '') if description else None)
+
+
+def _json_ld_data(text):
+    try:
+        return json.loads(text)
+    except:
+        return None
+
+
+def _head_poster_urls(data, og_image):
+    """Poster candidates from the page head, most reliable first"""
+    poster_urls = []
+
+    # Method 1: Try JSON-LD structured data (most reliable)
+    if isinstance(data, dict) and 'image' in data:
+        poster_url = data['image']
+        if isinstance(poster_url, str) and poster_url.startswith('http'):
+            poster_urls.append(poster_url)
+
+    # Method 2: Try Open Graph image
+    if og_image and og_image.startswith('http'):
+        poster_urls.append(og_image)
+
+    return poster_urls
+
+
+def _head_info(data, movie_descr):
+    """(title, cast, story) from the page head, empty strings for what is missing"""
+    title = ""
+    cast = ""
+    story = ""
+
+    # Method 1: Try JSON-LD structured data (most reliable)
+    if isinstance(data, dict):
+        try:
+            if 'name' in data:
+                title = data['name']
+            if 'description' in data:
+                story = data['description']
+            if 'actor' in data:
+                actors = data['actor']
+                if isinstance(actors, list):
+                    cast_names = [actor.get('name', '') for actor in actors[:5] if isinstance(actor, dict)]
+                    cast = ", ".join([name for name in cast_names if name])
+        except:
+            pass
+
+    # Method 2: Try meta description (very reliable for basic info)
+    if movie_descr and len(movie_descr) > 10:
+        # Parse the description - usually format: "Title. Cast info. Story info."
+        parts = movie_descr.split(".")
+        if not title and len(parts) >= 1:
+            title = parts[0].strip()
+        if not cast and len(parts) >= 2:
+            cast = parts[1].strip()
+        if not story and len(parts) >= 3:
+            story = ".".join(parts[2:]).strip()
+
+    return title, cast, story
+
+
+def _parse_poster_urls(s_data, url_data, head):
+    """Collect candidate poster URLs from an IMDB page, most reliable first"""
+    json_ld, og_image, _ = head
+    poster_urls = _head_poster_urls(json_ld, og_image)
+
+    # Method 3: Try the new IMDB structure with various selectors
+    selectors = [
+        ("div", {"class": "ipc-media--poster-27x40"}),
+        ("div", {"class": "ipc-media--poster"}),
+        ("div", {"class": "poster"}),
+        ("img", {"class": "ipc-image"}),
+        ("img", {"data-testid": "hero-poster"}),
+    ]
+
+    for tag, attrs in selectors:
+        element = s_data.find(tag, attrs)
+        if element:
+            img_tag = element.find("img") if element.name != "img" else element
+            if img_tag:
+                # Try multiple attributes
+                for attr in ['src', 'data-src', 'srcset', 'data-image-url']:
+                    if attr in img_tag.attrs:
+                        poster_url = img_tag[attr]
+                        if attr == 'srcset':
+                            poster_url = poster_url.split(',')[0].split()[0]
+
+                        if poster_url and poster_url.startswith('http'):
+                            # Clean up URL
+                            if '._V1_' in poster_url:
+                                # Try to get higher resolution
+                                poster_url = poster_url.split('._V1_')[0] + '._V1_SX300.jpg'
+                            poster_urls.append(poster_url)
+
+    # Method 4: Search all images for poster-like URLs
+    for img in s_data.find_all("img"):
+        src = img.get('src') or img.get('data-src') or img.get('data-image-url')
+        if src and ('poster' in src.lower() or 'images' in src.lower()):
+            if src.startswith('http') or src.startswith('//'):
+                if not src.startswith('http'):
+                    src = 'https:' + src
+                poster_urls.append(src)
+
+    # Method 5: Look for image URLs in the raw HTML
+    if 'images' in url_data.lower() or 'poster' in url_data.lower():
+        img_pattern = r'https?://[^"\s]+\.(?:jpg|jpeg|png|webp)[^"\s]*'
+        matches = re.findall(img_pattern, url_data)
+        for img_url in matches[:5]:  # Try first 5 matches
+            if 'poster' in img_url.lower() or 'images' in img_url.lower():
+                poster_urls.append(img_url)
+
+    # Keep the first occurrence of every URL
+    return list(dict.fromkeys(poster_urls))
+
+
+def _parse_info(s_data, head):
+    """Extract (title, cast, story) from a parsed IMDB page"""
+    # Methods 1-2: JSON-LD structured data, then the meta description
+    json_ld, _, description = head
+    title, cast, story = _head_info(json_ld, description)
+
+    # Method 3: Extract plot summary from page with multiple selectors
+    if not story:
+        plot_selectors = [
+            ("div", {"data-testid": "plot"}),
+            ("span", {"data-testid": "plot-xl"}),
+            ("span", {"data-testid": "plot-l"}),
+            ("div", {"class": "plot_summary"}),
+            ("div", {"class": "summary_text"}),
+            ("p", {"data-testid": "plot"}),
+        ]
+
+        for tag, attrs in plot_selectors:
+            plot_div = s_data.find(tag, attrs)
+            if plot_div:
+                story = plot_div.get_text(strip=True)
+                story = " ".join(story.split())
+                if story and len(story) > 20:  # Valid plot
+                    break
+
+    # Method 4: Extract cast information with multiple methods
+    if not cast:
+        # Try structured data first
+        cast_section = s_data.find("div", {"data-testid": "title-cast"})
+        if not cast_section:
+            cast_section = s_data.find("table", class_="cast_list")
+        if not cast_section:
+            cast_section = s_data.find("div", class_="cast_list")
+
+        if cast_section:
+            cast_links = cast_section.find_all("a", href=True)
+            cast_names = []
+            for link in cast_links[:8]:  # Get more names
+                name = link.get_text(strip=True)
+                if name and name not in ["See full cast", "See full cast & crew", "See more"]:
+                    # Check if it's a valid name (not a link text)
+                    if len(name) > 2 and not name.startswith("http"):
+                        cast_names.append(name)
+            if cast_names:
+                cast = ", ".join(cast_names[:5])  # Limit to 5
+
+    # Method 5: Extract title with multiple selectors
+    if not title:
+        title_selectors = [
+            ("h1", {"data-testid": "hero-title-block__title"}),
+            ("h1", {"class": "title_wrapper"}),
+            ("title", {}),
+            ("meta", {"property": "og:title"}),
+        ]
+
+        for tag, attrs in title_selectors:
+            title_elem = s_data.find(tag, attrs)
+            if title_elem:
+                if tag == "meta" and 'content' in title_elem.attrs:
+                    title = title_elem['content']
+                else:
+                    title = title_elem.get_text(strip=True)
+                if title:
+                    # Clean up title
+                    title = title.split(" - IMDb")[0].split(" | ")[0].split(" (")[0].strip()
+                    break
+
+    # Clean and return (without prefixes, we'll add them in display)
+    title = title if title else ""
+    cast = cast if cast else ""
+    story = story if story else ""
+
+    # Final fallback: Try to extract from raw HTML if nothing found
+    if not story and not cast:
+        try:
+            # Look for common patterns in the HTML
+            page_text = s_data.get_text()
+
+            # Try to find plot in common locations
+            plot_keywords = ['plot', 'summary', 'synopsis', 'story']
+            for keyword in plot_keywords:
+                # Look for text near these keywords
+                idx = page_text.lower().find(keyword)
+                if idx > 0:
+                    # Extract surrounding text
+                    snippet = page_text[max(0, idx-50):idx+200]
+                    if len(snippet) > 30:
+                        story = snippet.strip()
+                        break
+        except:
+            pass
+
+    return title, cast, story
+
+
+def download_poster(poster_url):
+    """Download a poster image and return its card-sized thumbnail bytes"""
+    response = Http.get(poster_url)
+    response.raise_for_status()
+    return make_thumbnail(response.content)
+
+
+@Metrics.span('poster_decode')
+def make_thumbnail(raw_data):
+    """Decode a poster straight down to card size and encode it as compact JPEG bytes"""
+    image = PIL.Image.open(io.BytesIO(raw_data))
+    # JPEGs are scaled down by 1/2, 1/4 or 1/8 while decoding, never below the card size
+    image.draft('RGB', POSTER_SIZE)
+    image = image.convert('RGB').resize(POSTER_SIZE, PIL.Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format=POSTER_FORMAT, quality=POSTER_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+@Metrics.span('fetch_poster')
+def fetch_poster(imdb_link, movie_title=None):
+    """Fetch movie poster thumbnail bytes from the store, OMDB, or the IMDB page
+
+    Returns None when there is none, raises TransientError when a source could
+    not be reached and none of the others had a poster.
+    """
+    return _stored(store_key('poster', imdb_link, movie_title),
+                   lambda: _fetch_poster(imdb_link, movie_title),
+                   lambda poster: poster or b'', lambda raw: raw or None, lambda poster: poster is None)
+
+
+def _download(poster_url, failures):
+    """Download a poster, None when it fails (network failures are added to failures)"""
+    try:
+        return download_poster(poster_url)
+    except requests.RequestException as error:
+        if getattr(error.response, 'status_code', None) not in NOT_FOUND:
+            failures.append(error)
+    except Exception:
+        # Not an image
+        pass
+    return None
+
+
+def _fetch_poster(imdb_link, movie_title=None):
+    failures = []
+    # First, try OMDB API (more reliable)
+    try:
+        omdb_data = get_omdb_record(imdb_link, movie_title)
+    except TransientError as error:
+        omdb_data = None
+        failures.append(error)
+    if omdb_data and omdb_data.get("Poster") and omdb_data["Poster"] != "N/A":
+        poster = _download(omdb_data["Poster"], failures)
+        if poster is not None:
+            return poster
+
+    # Fallback to the poster candidates found on the IMDB page
+    tried = set()
+    complete = False
+    while True:
+        try:
+            page = get_imdb_page(imdb_link, complete=complete)
+        except TransientError as error:
+            failures.append(error)
+            break
+        if page is None:
+            break
+        for poster_url in page.poster_urls:
+            if poster_url not in tried:
+                tried.add(poster_url)
+                poster = _download(poster_url, failures)
+                if poster is not None:
+                    return poster
+        if page.complete:
+            break
+        # Only the page head was read, try the remaining candidates of the full page
+        complete = True
+    if failures:
+        # Some source could not be asked: not a definitive miss
+        raise TransientError(f'No poster for {imdb_link}: {failures[0]}') from failures[0]
+    return None
+
+
+@Metrics.span('fetch_movie_info')
+def fetch_movie_info(imdb_link, movie_title=None):
+    """Fetch movie information (title, cast, story, rating) from the store, OMDB, or the IMDB page
+
+    Empty strings when neither has the movie, raises TransientError when a source could not be
+    reached and the other had nothing.
+    """
+    return _stored(store_key('info', imdb_link, movie_title),
+                   lambda: _fetch_movie_info(imdb_link, movie_title),
+                   lambda info: json.dumps(info).encode('utf-8'),
+                   lambda raw: tuple(json.loads(raw)),
+                   lambda info: not any(info))
+
+
+def _fetch_movie_info(imdb_link, movie_title=None):
+    # First, try OMDB API (more reliable), the IMDB page may still have the movie when it fails
+    failure = None
+    try:
+        omdb_data = get_omdb_record(imdb_link, movie_title)
+    except TransientError as error:
+        omdb_data, failure = None, error
+    if omdb_data:
+        title = omdb_data.get("Title", "")
+        plot = omdb_data.get("Plot", "")
+        actors = omdb_data.get("Actors", "")
+
+        # If we got data from OMDB, return it
+        if plot and plot != "N/A":
+            return title, actors, plot, ""
+        elif title:
+            # At least we have a title
+            return title, actors, "", ""
+
+    # Fallback to IMDB scraping
+    page = get_imdb_page(imdb_link)
+    if page is None:
+        if failure is not None:
+            raise failure
+        # Last resort: return empty but don't fail
+        return "", "", "", ""
+    return page.title, page.cast, page.story, ""
@@ -0,0 +1,110 @@
+"""Bit-packed genre index for Genre-based recommendations.
+
+Every movie's genre flags are packed into one uint32 mask next to its score
+(normalized and weighted as the feature space says), and an inverted index
+maps each genre to the sorted IDs of the movies that have it. A query only
+reads the postings of its selected genres. The genre part of the distance of
+those candidates comes from popcounts of XORed / ANDed masks, candidates
+outside the score window that could still make the top k are dropped, and only
+the survivors get an exact distance from the engine. Movies that share no
+genre with the query are provably farther than the k-th candidate in almost
+every case; when they are not, the query falls back to the full scan, so
+results always equal KNNEngine.kneighbours.
+"""
+import numpy as np
+
+from Classifier import KNNEngine, popcount
+
+MAX_GENRES = 32
+# Relative slack on the popcount distances, far above their rounding error
+PRUNE_TOLERANCE = 1e-9
+
+
+class GenreIndex:
+    """Genre masks, scores and genre -> movie postings over an engine's matrix"""
+
+    def __init__(self, engine):
+        space = engine.space
+        n_genres = engine.matrix.shape[1] - 1
+        if n_genres > MAX_GENRES:
+            raise ValueError(f'{n_genres} genres do not fit a uint32 mask')
+        if not space.uniform_genres:
+            raise ValueError('The genre index needs equal genre weights')
+        self.engine = engine
+        self.space = space
+        flags = np.asarray(engine.matrix[:, :-1]) > 0
+        bits = np.uint32(1) << np.arange(n_genres, dtype=np.uint32)
+        self.masks = np.bitwise_or.reduce(np.where(flags, bits, np.uint32(0)), axis=1).astype(np.uint32)
+        self.sizes = popcount(self.masks).astype(np.int64)
+        self.min_size = int(self.sizes.min()) if len(self.sizes) else 0
+        self.scores = space.scores(np.asarray(engine.matrix, dtype=np.float64)) * space.score_weight
+        self.postings = [np.flatnonzero(flags[:, g]).astype(np.int32) for g in range(n_genres)]
+
+    def __len__(self):
+        return self.masks.shape[0]
+
+    def query_mask(self, test_point):
+        """Return the uint32 genre mask of a feature vector"""
+        flags = np.asarray(test_point[:-1]) > 0
+        return np.uint32(sum(1 << int(g) for g in np.flatnonzero(flags)))
+
+    def candidates(self, test_point):
+        """Return the sorted IDs of the movies sharing at least one genre with the query"""
+        mask = int(self.query_mask(test_point))
+        lists = [self.postings[g] for g in range(len(self.postings)) if mask >> g & 1]
+        if len(lists) <= 1:
+            return lists[0] if lists else np.empty(0, dtype=np.int32)
+        # Union of the postings through a bitmap, cheaper than sorting them
+        hit = np.zeros(len(self), dtype=bool)
+        for ids in lists:
+            hit[ids] = True
+        return np.flatnonzero(hit).astype(np.int32)
+
+    def _genre_distances(self, ids, mask, query_size):
+        """Genre part of the distance from popcounts (squared for euclidean)"""
+        if self.space.metric == 'euclidean':
+            weight = float(self.space.genre_weights.flat[0])
+            return weight * weight * popcount(self.masks[ids] ^ mask).astype(np.float64)
+        overlap = popcount(self.masks[ids] & mask).astype(np.float64)
+        if self.space.metric == 'cosine':
+            return 1.0 - overlap / np.sqrt(query_size * self.sizes[ids])
+        return 1.0 - overlap / (query_size + self.sizes[ids] - overlap)
+
+    def _combine(self, genre, score_gap):
+        if self.space.metric == 'euclidean':
+            return np.sqrt(genre + score_gap * score_gap)
+        return genre + score_gap
+
+    def _outside_bound(self, query_size):
+        """Lower bound on the distance of a movie sharing no genre with the query"""
+        if self.space.metric == 'euclidean':
+            # Every selected genre differs, and so does every genre of the movie
+            weight = float(self.space.genre_weights.flat[0])
+            return weight * np.sqrt(query_size + self.min_size)
+        return 1.0
+
+    def kneighbours(self, test_point, k):
+        """Method returns the indices and distances of the k nearest rows, same as KNNEngine.kneighbours"""
+        test_point = np.asarray(test_point, dtype=np.float64)
+        mask = self.query_mask(test_point)
+        query_size = int(popcount(mask))
+        ids = self.candidates(test_point)
+        shared = len(ids)
+        if query_size == 0 or k <= 0 or shared < k:
+            return self.engine.kneighbours(test_point, k)
+
+        # Cheap distances from the masks and the score column, then keep the candidates
+        # whose score lies within the window that can still beat the k-th of them
+        query_score = self.space.scores(test_point[None, :])[0] * self.space.score_weight
+        score_gap = np.abs(self.scores[ids] - query_score)
+        cheap = self._combine(self._genre_distances(ids, mask, query_size), score_gap)
+        bound = np.partition(cheap, k - 1)[k - 1]
+        ids = ids[cheap <= bound * (1 + PRUNE_TOLERANCE) + PRUNE_TOLERANCE]
+
+        # Exact distances for the survivors, computed like the full scan
+        distances = self.engine.distances_to(test_point, ids)
+        order = KNNEngine.select(distances, k)
+        # Anything sharing no genre is at least this far away; on a tie it might win on index
+        if shared < len(self) and distances[order[-1]] >= self._outside_bound(query_size):
+            return self.engine.kneighbours(test_point, k)
+        return ids[order].astype(np.intp), distances[order]
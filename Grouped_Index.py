@@ -0,0 +1,150 @@
+"""Exact nearest neighbours over equivalence classes of identical feature vectors.
+
+The bundled catalog has 5,043 movies but only 914 distinct genre vectors and
+3,252 distinct (genre, score) vectors, so most distances a full scan computes
+are repeats. Movies are grouped twice:
+
+- groups: movies with identical feature vectors, which are always at the same
+  distance from a query, so a group's distance is computed once
+- classes: groups sharing a genre vector, ordered by score and cut into blocks
+  of a few groups each, so a block's score range is narrow
+
+A query computes the genre distance once per class, which together with the
+score gap to each block's range gives a lower bound for every movie in the
+block. Blocks are expanded in bound order until they hold k movies, which
+bounds the k-th distance; only the blocks whose bound is within it get exact
+distances (from the engine, one per group), and groups are then expanded into
+movies in distance order with ties broken by index. Results equal
+KNNEngine.kneighbours.
+"""
+import numpy as np
+
+from Genre_Index import PRUNE_TOLERANCE
+
+# Groups per block: smaller blocks give tighter bounds but more of them to bound
+BLOCK_GROUPS = 4
+
+
+def _ranges(starts, stops):
+    """Return the concatenation of arange(start, stop) for every pair, without a Python loop"""
+    lengths = stops - starts
+    firsts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return firsts + np.arange(int(lengths.sum()))
+
+
+class GroupedIndex:
+    """Exact search that computes one distance per distinct feature vector, and only for nearby ones"""
+
+    def __init__(self, engine, block_groups=BLOCK_GROUPS):
+        self.engine = engine
+        self.space = engine.space
+        matrix = np.asarray(engine.matrix)
+        # Rows compared as raw bytes: far faster than np.unique(axis=0) on millions of rows
+        flags = np.ascontiguousarray(matrix[:, :-1])
+        rows = flags.view(np.dtype((np.void, flags.dtype.itemsize * flags.shape[1]))).reshape(-1)
+        _, first, classes = np.unique(rows, return_index=True, return_inverse=True)
+        classes = classes.reshape(-1)
+        genres = flags[first]
+        raw_scores = matrix[:, -1]
+        self.n_classes = len(genres)
+
+        # Movies by class, then score, then ID: every group (and block) is a contiguous run
+        self.members = np.lexsort((np.arange(len(matrix)), raw_scores, classes)).astype(np.int32)
+        sorted_classes = classes[self.members]
+        sorted_scores = raw_scores[self.members]
+        new_group = np.ones(len(matrix), dtype=bool)
+        new_group[1:] = (sorted_classes[1:] != sorted_classes[:-1]) | (sorted_scores[1:] != sorted_scores[:-1])
+        group_starts = np.flatnonzero(new_group)
+        self.group_offsets = np.append(group_starts, len(matrix)).astype(np.int64)
+        self.group_sizes = np.diff(self.group_offsets)
+        # The first movie of a group stands for all of them when its distance is computed
+        self.group_rows = self.members[group_starts]
+        group_classes = sorted_classes[group_starts]
+
+        # Blocks of at most block_groups consecutive groups of one class
+        new_class = np.ones(len(group_starts), dtype=bool)
+        new_class[1:] = group_classes[1:] != group_classes[:-1]
+        class_starts = np.flatnonzero(new_class)
+        class_sizes = np.diff(np.append(class_starts, len(group_starts)))
+        rank = np.arange(len(group_starts)) - np.repeat(class_starts, class_sizes)
+        block_starts = np.flatnonzero(rank % block_groups == 0)
+        self.block_offsets = np.append(block_starts, len(group_starts)).astype(np.int64)
+        self.block_classes = group_classes[block_starts]
+        self.block_sizes = np.add.reduceat(self.group_sizes, block_starts)
+        group_scores = self.space.scores(np.asarray(matrix[self.group_rows], dtype=np.float64))
+        group_scores = group_scores * self.space.score_weight
+        self.block_low = np.minimum.reduceat(group_scores, block_starts)
+        self.block_high = np.maximum.reduceat(group_scores, block_starts)
+
+        # One row per genre vector with a zero score, so their distance to a query with
+        # a zero score is the genre part of the distance alone
+        self.classes = self.space.prepare(np.hstack([genres, np.zeros((len(genres), 1))]).astype(matrix.dtype))
+        # The bounds are computed in the engine's precision, allow for its rounding
+        self.tolerance = max(PRUNE_TOLERANCE, 8 * float(np.finfo(matrix.dtype).eps))
+
+    def __len__(self):
+        return len(self.engine)
+
+    @property
+    def n_groups(self):
+        return len(self.group_rows)
+
+    def _block_bounds(self, test_point):
+        """Lower bound on the distance from the query to every movie of each block"""
+        genre_only = np.array(test_point, dtype=self.engine.matrix.dtype)
+        genre_only[-1] = 0
+        genre = self.space.distances(self.classes, self.space.prepare(genre_only[None, :]))[0]
+        query_score = self.space.scores(np.asarray(test_point, dtype=np.float64)[None, :])[0] * self.space.score_weight
+        gap = np.maximum(np.maximum(self.block_low - query_score, query_score - self.block_high), 0)
+        genre = genre[self.block_classes]
+        if self.space.metric == 'euclidean':
+            return np.sqrt(genre * genre + gap * gap)
+        return genre + gap
+
+    def _kth(self, distances, sizes, k):
+        """The k-th smallest movie distance, given the distances and sizes of groups holding at least k movies"""
+        order = np.argsort(distances, kind='stable')
+        return distances[order[np.searchsorted(np.cumsum(sizes[order]), k)]]
+
+    def kneighbours(self, test_point, k):
+        """Method returns the indices and distances of the k nearest rows, same as KNNEngine.kneighbours"""
+        test_point = np.asarray(test_point, dtype=self.engine.matrix.dtype)
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=self.engine.matrix.dtype)
+        bounds = self._block_bounds(test_point)
+
+        # Every block holds a movie, so the k blocks with the smallest bounds hold k movies
+        # and give an upper bound on the k-th distance
+        first = np.argpartition(bounds, k - 1)[:k] if k < len(bounds) else np.arange(len(bounds))
+        groups = _ranges(self.block_offsets[first], self.block_offsets[first + 1])
+        distances = self.engine.distances_to(test_point, self.group_rows[groups])
+        kth = self._kth(distances, self.group_sizes[groups], k)
+
+        # Any other block that could hold a movie as near as that
+        within = bounds <= kth * (1 + self.tolerance) + self.tolerance
+        within[first] = False
+        blocks = np.flatnonzero(within)
+        if len(blocks):
+            more = _ranges(self.block_offsets[blocks], self.block_offsets[blocks + 1])
+            groups = np.concatenate([groups, more])
+            distances = np.concatenate([distances, self.engine.distances_to(test_point, self.group_rows[more])])
+            kth = self._kth(distances, self.group_sizes[groups], k)
+
+        # Expand the groups up to the k-th distance into movies, ties broken by index
+        near = distances <= kth
+        groups = groups[near]
+        ids = self.members[_ranges(self.group_offsets[groups], self.group_offsets[groups + 1])]
+        ids_distances = np.repeat(distances[near], self.group_sizes[groups])
+        best = np.lexsort((ids, ids_distances))[:k]
+        return ids[best].astype(np.intp), ids_distances[best]
+
+    def kneighbours_batch(self, test_points, k):
+        """Method returns the (n_queries x k) indices and distances of the k nearest rows for every query"""
+        queries = np.atleast_2d(np.asarray(test_points, dtype=self.engine.matrix.dtype))
+        k = max(0, min(k, len(self)))
+        results = [self.kneighbours(query, k) for query in queries]
+        if not results:
+            return np.empty((0, k), dtype=np.intp), np.empty((0, k), dtype=self.engine.matrix.dtype)
+        # Stacked as computed: the distances of a prepared float32 matrix can be float64
+        return np.stack([indices for indices, _ in results]), np.stack([distances for _, distances in results])
@@ -0,0 +1,157 @@
+"""Shared HTTP client for every outbound call (OMDb, IMDb pages, poster images).
+
+One requests.Session keeps a pool of keep-alive connections per host, so
+repeated lookups reuse TCP/TLS connections instead of opening a new one each
+time. Every request gets the same connect/read timeouts, idempotent GETs are
+retried a bounded number of times with exponential backoff on connection
+errors and 429/5xx answers, and a per-host semaphore caps how many requests
+are in flight to one host at once. Every call is counted by host and outcome
+(Metrics.py), with the time it took (to the response headers when streaming).
+
+set_rate_limit() caps the requests sent per second across all threads, every
+attempt counted: a lookup that reads an IMDb page and then a poster is charged
+twice, and a retried request once more for every retry.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import Metrics
+
+CONNECT_TIMEOUT = 3.05  # seconds
+READ_TIMEOUT = 10  # seconds
+MAX_PER_HOST = 8  # concurrent requests to one host
+POOL_HOSTS = 16  # hosts with a connection pool kept open
+RETRIES = 2
+BACKOFF = 0.3  # seconds, doubled on every retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+_session = None
+_lock = threading.Lock()
+_host_limits = {}
+_rate_limiter = None
+
+
+class RateLimiter:
+    """Token bucket shared by all threads"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def set_rate_limit(rate, burst=None):
+    """Send at most rate requests per second (retries included) from now on, 0 or None for no limit"""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rate, burst) if rate else None
+
+
+def _charge():
+    limiter = _rate_limiter
+    if limiter is not None:
+        limiter.acquire()
+
+
+class _ChargedRetry(Retry):
+    """Retry that takes a rate limit token before every retry it allows"""
+
+    def increment(self, *args, **kwargs):
+        retry = super().increment(*args, **kwargs)
+        _charge()
+        return retry
+
+
+def make_session(max_per_host=MAX_PER_HOST, retries=RETRIES):
+    """Build a session with pooled keep-alive connections and retry/backoff on idempotent requests"""
+    retry = _ChargedRetry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+    # Never more than max_per_host requests run against one host, so that many connections are enough
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=max_per_host, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def get_session():
+    """Return the process-wide session"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def _host_limit(host):
+    with _lock:
+        limit = _host_limits.get(host)
+        if limit is None:
+            limit = _host_limits[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+        return limit
+
+
+def _get(host, url, **kwargs):
+    """GET through the shared session, recording the outcome and the time it took"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = get_session().get(url, **kwargs)
+        outcome = str(response.status_code)
+        return response
+    except requests.Timeout:
+        outcome = 'timeout'
+        raise
+    finally:
+        Metrics.observe('external_request_seconds', time.perf_counter() - started, host=host)
+        Metrics.count('external_requests_total', host=host, outcome=outcome)
+
+
+def get(url, params=None, timeout=None, **kwargs):
+    """GET a URL through the shared session, waiting for a free slot on its host"""
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    host = urlsplit(url).netloc
+    _charge()
+    with _host_limit(host):
+        # The body is read before the slot is released (no streaming)
+        return _get(host, url, params=params, timeout=timeout, **kwargs)
+
+
+@contextmanager
+def stream(url, params=None, timeout=None, **kwargs):
+    """GET a URL without reading the body, the host slot is held until the block exits and the response is closed"""
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    host = urlsplit(url).netloc
+    _charge()
+    with _host_limit(host):
+        response = _get(host, url, params=params, timeout=timeout, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
@@ -0,0 +1,221 @@
+"""Lightweight timing spans and counters, exported in the Prometheus text format.
+
+    with Metrics.span('knn_genres'):
+        indices, distances = ...
+    Metrics.count('cache_requests_total', cache='omdb', result='hit')
+
+A span adds its duration to the movie_recommender_stage_seconds histogram of
+its stage (and counts the stage's errors); counters are plain totals. An
+observation is a perf_counter() pair and a dict update under a lock, a few
+microseconds, so spans go around whole stages, not inner loops. METRICS=0
+turns recording off.
+
+Metrics live in the process that records them. The API serves them at
+/metrics; the Streamlit app calls start_http_server(), which serves them at
+127.0.0.1:$METRICS_PORT/metrics only when METRICS_PORT is set (e.g. 9108), so
+running the app opens no port by default. Under gunicorn every worker keeps
+and serves its own.
+"""
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+
+ENABLED = os.getenv('METRICS', '1') != '0'
+METRICS_PORT = os.getenv('METRICS_PORT', '')
+PREFIX = 'movie_recommender_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'stage_seconds': 'Time spent in each stage of a recommendation page',
+    'stage_errors_total': 'Stages that ended with an exception',
+    'cache_requests_total': 'Cache lookups by cache and result (hit, miss, or shared with a running fetch)',
+    'external_requests_total': 'Outbound HTTP requests by host and outcome (status code, timeout or error)',
+    'external_request_seconds': 'Duration of outbound HTTP requests (to the headers when streamed), by host',
+}
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+
+class Registry:
+    """Counters and latency histograms keyed by metric name and label set"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def histogram(self, name, labels):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name, labels, seconds):
+        self.record(self.histogram(name, labels), seconds)
+
+    def record(self, histogram, seconds):
+        slot = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            histogram.counts[slot] += 1
+            histogram.sum += seconds
+
+    def clear(self):
+        """Reset every metric to zero (histograms stay registered, spans keep references to them)"""
+        with self.lock:
+            self.counters.clear()
+            for histogram in self.histograms.values():
+                histogram.counts = [0] * len(histogram.counts)
+                histogram.sum = 0.0
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(h.counts), h.sum) for key, h in self.histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {PREFIX}{name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+        for (name, labels), counts, total in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total!r}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+registry = Registry()
+
+
+def count(name, value=1, **labels):
+    """Add value to a counter"""
+    if ENABLED:
+        registry.inc(name, tuple(sorted(labels.items())), value)
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in a latency histogram"""
+    if ENABLED:
+        registry.observe(name, tuple(sorted(labels.items())), seconds)
+
+
+class span:
+    """Time a stage: with span('knn_genres'): ..., or @span('knn_genres') on a function"""
+
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        if ENABLED:
+            labels = (('stage', self.stage),)
+            registry.observe('stage_seconds', labels, time.perf_counter() - self.started)
+            if kind is not None:
+                registry.inc('stage_errors_total', labels)
+        return False
+
+    def __call__(self, function):
+        # The hot path of every instrumented function: no span object, the histogram looked up once
+        labels = (('stage', self.stage),)
+        histogram = registry.histogram('stage_seconds', labels)
+        perf_counter = time.perf_counter
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except BaseException:
+                if ENABLED:
+                    registry.inc('stage_errors_total', labels)
+                raise
+            finally:
+                if ENABLED:
+                    registry.record(histogram, perf_counter() - started)
+        return timed
+
+
+def render():
+    return registry.render()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT, host='127.0.0.1'):
+    """Serve /metrics on a background thread once per process, returns the server
+
+    Returns None when no port is given (METRICS_PORT is unset), metrics are off or the port is taken.
+    """
+    global _server
+    # Imported here: http.server alone would make importing this module (and Recommender) ten times slower
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with _server_lock:
+        if _server is None and ENABLED and port and int(port):
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError:
+                # Another process (an earlier app run) already serves this port
+                _server = False
+            else:
+                _server.daemon_threads = True
+                threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server or None
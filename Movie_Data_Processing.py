@@ -0,0 +1,109 @@
+"""Command-line rebuild of the Movie_Data_Processing notebook.
+
+Reads movie_metadata.csv in fixed-size chunks, one-hot encodes the genres with
+a vectorized string split and streams the rows into the binary catalog the app
+loads (and, with --json, into the legacy movie_data.json / movie_titles.json).
+Peak memory depends on the chunk size only, not on the size of the CSV.
+
+    python Movie_Data_Processing.py --csv ./Data/movie_metadata.csv --out ./Data/catalog --json
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from Catalog import CATALOG_DIR, CatalogWriter
+
+CSV_PATH = './Data/movie_metadata.csv'
+COLUMNS = ['genres', 'movie_title', 'imdb_score', 'movie_imdb_link', 'title_year']
+CHUNK_SIZE = 50000
+
+
+def read_chunks(csv_path, chunk_size=CHUNK_SIZE, usecols=COLUMNS):
+    """Yield the relevant columns of the metadata CSV chunk by chunk"""
+    return pd.read_csv(csv_path, usecols=usecols, chunksize=chunk_size)
+
+
+def scan_genres(csv_path, chunk_size=CHUNK_SIZE):
+    """First pass: return the sorted genre list and the number of movies"""
+    genres = set()
+    rows = 0
+    for chunk in read_chunks(csv_path, chunk_size, usecols=['genres']):
+        genres.update(chunk['genres'].str.split('|').explode().dropna().unique())
+        rows += len(chunk)
+    return sorted(genres), rows
+
+
+def encode_chunk(chunk, genres):
+    """Return the (rows x len(genres) + 1) feature matrix of a chunk: genre flags + IMDb score"""
+    flags = chunk['genres'].str.get_dummies(sep='|').reindex(columns=genres, fill_value=0)
+    matrix = np.empty((len(chunk), len(genres) + 1), dtype=np.float64)
+    matrix[:, :-1] = flags.to_numpy(dtype=np.float64)
+    matrix[:, -1] = chunk['imdb_score'].to_numpy(dtype=np.float64)
+    return matrix
+
+
+class JsonExporter:
+    """Stream rows into the legacy movie_data.json / movie_titles.json files"""
+
+    def __init__(self, data_path, titles_path):
+        self.data_file = open(data_path, 'w', encoding='utf-8')
+        self.titles_file = open(titles_path, 'w', encoding='utf-8')
+        self.data_file.write('[')
+        self.titles_file.write('[')
+        self.written = 0
+
+    def append(self, matrix, titles, links, start):
+        for offset, (row, title, link) in enumerate(zip(matrix, titles, links)):
+            separator = ', ' if self.written else ''
+            # Genre flags stay ints, the score stays a float, as the notebook wrote them
+            self.data_file.write(separator + json.dumps([int(v) for v in row[:-1]] + [float(row[-1])]))
+            self.titles_file.write(separator + json.dumps([title, start + offset, link]))
+            self.written += 1
+
+    def close(self):
+        for f in (self.data_file, self.titles_file):
+            f.write(']')
+            f.close()
+
+
+def build(csv_path=CSV_PATH, catalog_dir=CATALOG_DIR, chunk_size=CHUNK_SIZE, json_dir=None):
+    """Rebuild the catalog (and optionally the JSON files) from the metadata CSV"""
+    genres, rows = scan_genres(csv_path, chunk_size)
+    writer = CatalogWriter(catalog_dir, rows, len(genres) + 1, genres)
+    exporter = None
+    if json_dir is not None:
+        exporter = JsonExporter(os.path.join(json_dir, 'movie_data.json'), os.path.join(json_dir, 'movie_titles.json'))
+    start = 0
+    for chunk in read_chunks(csv_path, chunk_size):
+        matrix = encode_chunk(chunk, genres)
+        titles = chunk['movie_title'].fillna('').str.strip().tolist()
+        links = chunk['movie_imdb_link'].fillna('').str.strip().tolist()
+        years = chunk['title_year'].fillna(0).astype(np.int16).tolist()
+        writer.append(matrix, titles, links, years)
+        if exporter is not None:
+            exporter.append(matrix, titles, links, start)
+        start += len(chunk)
+    if exporter is not None:
+        exporter.close()
+    return writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the movie catalog from movie_metadata.csv')
+    parser.add_argument('--csv', default=CSV_PATH, help='IMDb 5000 style metadata CSV')
+    parser.add_argument('--out', default=CATALOG_DIR, help='output catalog directory')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='CSV rows processed per chunk')
+    parser.add_argument('--json', nargs='?', const='./Data', default=None, metavar='DIR',
+                        help='also write movie_data.json and movie_titles.json to DIR (default ./Data)')
+    args = parser.parse_args()
+
+    manifest = build(args.csv, args.out, args.chunk_size, args.json)
+    print(f"Wrote {manifest['rows']} movies x {len(manifest['genres'])} genres to {args.out} "
+          f"(version {manifest['version'][:12]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Precomputed "similar movies" index for Movie-based recommendations.
+
+Build it once after the data files change:
+
+    python Neighbour_Index.py --top 50 --workers 4
+
+The index stores the top-N neighbours of every movie as int32/float32 arrays
+next to a small meta file holding the version (SHA-256 of the feature matrix)
+of the catalog and the signature of the feature space it was built with, so
+the app can tell when it is stale and fall back to a live scan.
+
+After a CatalogUpdater commit, update_index() refreshes only the movies whose
+lists the change can affect and writes their new lists to a small delta file
+that overrides the base arrays, instead of rebuilding the whole index.
+"""
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+
+from Catalog import CATALOG_DIR, load_catalog
+from Classifier import FeatureSpace, KNNEngine
+
+INDEX_DIR = './Data/neighbours'
+DEFAULT_TOP = 50
+# Fold the delta into new base arrays once it holds this share of the movies
+COMPACT_SHARE = 0.05
+# Slack on the stored float32 distances when looking for lists a changed movie may enter
+STALE_TOLERANCE = 1e-6
+
+_worker_engine = None
+
+
+def _init_worker(matrix, space):
+    global _worker_engine
+    _worker_engine = KNNEngine(matrix, space=space)
+
+
+def _build_chunk(bounds):
+    start, stop, top = bounds
+    indices, distances = _worker_engine.kneighbours_batch(_worker_engine.matrix[start:stop], top)
+    return start, indices.astype(np.int32), distances.astype(np.float32)
+
+
+def build_index(data, top=DEFAULT_TOP, workers=None, chunk_size=256, space=None):
+    """Compute the top-N neighbours of every row in parallel, returns (neighbours, distances)"""
+    # Imported here, the app and the API only read the index and skip loading multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    matrix = np.ascontiguousarray(data, dtype=np.float64)
+    n = matrix.shape[0]
+    top = min(top, n)
+    neighbours = np.empty((n, top), dtype=np.int32)
+    distances = np.empty((n, top), dtype=np.float32)
+    chunks = [(start, min(start + chunk_size, n), top) for start in range(0, n, chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix, space)) as pool:
+        for start, chunk_indices, chunk_distances in pool.map(_build_chunk, chunks):
+            neighbours[start:start + len(chunk_indices)] = chunk_indices
+            distances[start:start + len(chunk_distances)] = chunk_distances
+    return neighbours, distances
+
+
+def _write_meta(index_dir, meta):
+    # Write the meta last, and swap it in, so a half-written index never looks fresh
+    tmp_path = os.path.join(index_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(index_dir, 'meta.json'))
+
+
+def _collect(index_dir, keep):
+    """Delete index files no meta refers to any more"""
+    for pattern in ('neighbours*.npy', 'distances*.npy', 'delta*.npz'):
+        for path in glob.glob(os.path.join(index_dir, pattern)):
+            if os.path.basename(path) not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def save_index(neighbours, distances, catalog_version, index_dir=INDEX_DIR, space=None, generation=0):
+    """Write the index arrays and their meta file"""
+    os.makedirs(index_dir, exist_ok=True)
+    suffix = f'.{generation}' if generation else ''
+    files = {'neighbours': f'neighbours{suffix}.npy', 'distances': f'distances{suffix}.npy', 'delta': None}
+    np.save(os.path.join(index_dir, files['neighbours']), neighbours)
+    np.save(os.path.join(index_dir, files['distances']), distances)
+    meta = {'catalog_version': catalog_version, 'rows': int(neighbours.shape[0]), 'top': int(neighbours.shape[1]),
+            'space': (space or FeatureSpace.raw()).signature, 'generation': generation, 'files': files}
+    _write_meta(index_dir, meta)
+    _collect(index_dir, set(files.values()))
+
+
+def index_stamp(index_dir=INDEX_DIR):
+    """Return a value that changes whenever a new meta file is swapped in (None without one)"""
+    try:
+        stat = os.stat(os.path.join(index_dir, 'meta.json'))
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class NeighbourIndex:
+    """Read-only view over a saved neighbour index, its delta overriding the base arrays"""
+
+    def __init__(self, neighbours, distances, meta, delta=None):
+        self.neighbours = neighbours
+        self.distances = distances
+        self.meta = meta
+        # Movie -> (neighbours, distances) lists updated since the base arrays were written
+        self.delta = delta or {}
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR):
+        """Open a saved index, returns None when it does not exist"""
+        try:
+            with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            # Indexes written before incremental updates have fixed file names and no delta
+            files = meta.get('files', {'neighbours': 'neighbours.npy', 'distances': 'distances.npy'})
+            neighbours = np.load(os.path.join(index_dir, files['neighbours']), mmap_mode='r')
+            distances = np.load(os.path.join(index_dir, files['distances']), mmap_mode='r')
+            delta = {}
+            if files.get('delta'):
+                with np.load(os.path.join(index_dir, files['delta'])) as saved:
+                    delta = {int(i): (n, d) for i, n, d in zip(saved['rows'], saved['neighbours'],
+                                                              saved['distances'])}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(neighbours, distances, meta, delta)
+
+    @property
+    def top(self):
+        return self.meta['top']
+
+    def is_fresh(self, catalog_version, rows, space=None):
+        """Check the index was built from the current catalog in the given feature space (raw by default)"""
+        # Indexes written before feature spaces existed were built in the raw space
+        built_in = self.meta.get('space', FeatureSpace.raw().signature)
+        return (self.meta.get('catalog_version') == catalog_version and self.meta.get('rows') == rows
+                and built_in == (space or FeatureSpace.raw()).signature)
+
+    def lookup(self, i, k):
+        """Return the indices and distances of the k nearest movies to movie i"""
+        if i in self.delta:
+            neighbours, distances = self.delta[i]
+            return neighbours[:k], distances[:k]
+        return self.neighbours[i, :k], self.distances[i, :k]
+
+
+def update_index(update, engine, index_dir=INDEX_DIR):
+    """Bring a saved index up to date with a CatalogUpdate, returns False when it has to be rebuilt instead
+
+    engine holds the updated catalog in the space the index was built in. Only
+    the changed movies get a full scan; any other movie's list changes only if
+    it contained an updated movie (its list is recomputed), or if a changed
+    movie is now closer than its current last neighbour (the movie is merged
+    into the list). A full rebuild would give the same lists.
+    """
+    index = NeighbourIndex.load(index_dir)
+    if index is None or not index.is_fresh(update.previous_version, len(engine) - len(update.appended),
+                                           engine.space):
+        return False
+    top = index.top
+    old_rows = index.meta['rows']
+    if old_rows < top or top == 0:
+        # Lists shorter than top grow with every append, a rebuild is as cheap as the update
+        return False
+
+    updated = set(update.updated)
+    lists = {}
+
+    def current(i):
+        if i in lists:
+            return lists[i]
+        return index.lookup(i, top)
+
+    def put(i, ids, distances):
+        order = KNNEngine.select(distances, top)
+        lists[i] = (ids[order].astype(np.int32), distances[order].astype(np.float32))
+
+    # Last neighbour distance of every existing movie, the bar a changed movie has to clear
+    worst = np.empty(old_rows)
+    worst[:index.distances.shape[0]] = index.distances[:, top - 1]
+    for i, (_, distances) in index.delta.items():
+        worst[i] = distances[top - 1]
+    slack = worst * (1 + STALE_TOLERANCE) + STALE_TOLERANCE
+
+    # Lists that held an updated movie: it may have moved away, recompute them from scratch.
+    # Only movies within their bar of the movie's old position can have held it
+    for i in update.updated:
+        was_near = np.flatnonzero(engine.distances(update.previous_rows[i])[:old_rows] <= slack)
+        for j in map(int, was_near):
+            if j not in updated and j not in lists and i in current(j)[0]:
+                ids, distances = engine.kneighbours(engine.matrix[j], top)
+                lists[j] = (ids.astype(np.int32), distances.astype(np.float32))
+
+    # Every changed movie gets a full scan of its own, and enters the lists whose bar it clears
+    for i in update.changed:
+        to_all = engine.distances(engine.matrix[i])
+        order = KNNEngine.select(to_all, top)
+        lists[i] = (order.astype(np.int32), to_all[order].astype(np.float32))
+        for j in np.flatnonzero(to_all[:old_rows] <= slack):
+            j = int(j)
+            if j in updated:
+                # Gets (or got) a full scan of its own
+                continue
+            ids = np.union1d(np.asarray(current(j)[0], dtype=np.intp), [i])
+            put(j, ids, engine.distances_to(engine.matrix[j], ids))
+
+    delta = dict(index.delta)
+    delta.update(lists)
+    rows = len(engine)
+    generation = index.meta.get('generation', 0) + 1
+    if len(delta) > COMPACT_SHARE * rows:
+        # Fold the delta into new base arrays
+        neighbours = np.empty((rows, top), dtype=np.int32)
+        distances = np.empty((rows, top), dtype=np.float32)
+        # Rows past the base arrays (appended since the last compaction) all live in the delta
+        base_rows = index.neighbours.shape[0]
+        neighbours[:base_rows] = index.neighbours
+        distances[:base_rows] = index.distances
+        for i, (ids, dists) in delta.items():
+            neighbours[i], distances[i] = ids, dists
+        save_index(neighbours, distances, update.version, index_dir, engine.space, generation)
+        return True
+
+    files = dict(index.meta.get('files', {'neighbours': 'neighbours.npy', 'distances': 'distances.npy'}))
+    files['delta'] = f'delta.{generation}.npz'
+    keys = np.array(sorted(delta), dtype=np.int64)
+    np.savez(os.path.join(index_dir, files['delta']), rows=keys,
+             neighbours=np.stack([delta[i][0] for i in keys]), distances=np.stack([delta[i][1] for i in keys]))
+    meta = dict(index.meta, catalog_version=update.version, rows=rows, generation=generation, files=files)
+    _write_meta(index_dir, meta)
+    _collect(index_dir, set(name for name in files.values() if name) | set(index.meta.get('files', {}).values()))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the top-N similar movies for every movie')
+    parser.add_argument('--catalog', default=CATALOG_DIR, help='catalog directory (falls back to the JSON files)')
+    parser.add_argument('--out', default=INDEX_DIR, help='output directory for the index')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='neighbours kept per movie')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--metric', choices=FeatureSpace.METRICS, default='euclidean', help='distance metric')
+    parser.add_argument('--score-weight', type=float, default=1.0, help='weight of the IMDb score feature')
+    parser.add_argument('--raw-score', action='store_true', help='do not normalize the score to [0, 1]')
+    args = parser.parse_args()
+
+    space = FeatureSpace(args.metric, score_weight=args.score_weight, normalize_score=not args.raw_score)
+    catalog = load_catalog(args.catalog)
+    neighbours, distances = build_index(catalog.matrix, top=args.top, workers=args.workers, space=space)
+    save_index(neighbours, distances, catalog.version, args.out, space)
+    print(f'Wrote top-{neighbours.shape[1]} neighbours for {neighbours.shape[0]} movies to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
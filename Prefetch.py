@@ -0,0 +1,143 @@
+"""Bulk prefetcher that warms the enrichment store for the whole catalog.
+
+Walks the catalog (or only the movies that show up most often in the
+precomputed neighbour lists the app serves), fetches plot/cast and posters
+concurrently under a global limit on the HTTP requests sent per second
+(Http.set_rate_limit) and writes everything into the persistent store the app
+reads from. Movies already in the store are skipped, so an interrupted run
+picks up where it stopped.
+
+    python Prefetch.py --workers 8 --rate 5
+    python Prefetch.py --top 500 --no-posters
+    python Prefetch.py --omdb-url http://127.0.0.1:8765/omdb/ --imdb-base http://127.0.0.1:8765
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import Enrichment
+import Http
+import Store
+from Catalog import CATALOG_DIR
+from Enrichment import fetch_movie_info, fetch_poster, is_failed_lookup, store_key
+from Neighbour_Index import INDEX_DIR
+from Recommender import Recommender
+
+
+def most_recommended(recommender, top):
+    """Return the movie indices that appear most often in the app's neighbour lists (catalog order without them)
+
+    The recommender holds the neighbour index only when it is fresh for its catalog
+    and feature space, so the ranking follows what the app shows.
+    """
+    index = recommender.neighbour_index
+    rows = len(recommender)
+    if index is None:
+        return list(range(min(top, rows)))
+    base = np.asarray(index.neighbours)
+    # Lists in the delta replace those of the base arrays
+    current = np.ones(base.shape[0], dtype=bool)
+    current[[i for i in index.delta if i < base.shape[0]]] = False
+    lists = [base[current].ravel()] + [np.asarray(ids) for ids, _ in index.delta.values()]
+    counts = np.bincount(np.concatenate(lists), minlength=rows)
+    order = np.lexsort((np.arange(rows), -counts))
+    return order[:top].tolist()
+
+
+def rebase_link(link, imdb_base):
+    """Point an IMDB link at another host (e.g. a local stub server)"""
+    if not imdb_base:
+        return link
+    path = link.split('imdb.com', 1)[-1]
+    return imdb_base.rstrip('/') + path
+
+
+def prefetch(movies, workers=8, rate=5.0, posters=True, progress_every=100):
+    """Fetch info (and posters) for (title, link) pairs missing from the store, returns the run statistics
+
+    rate caps the HTTP requests sent per second (0: unlimited), see Http.set_rate_limit.
+    """
+    store = Store.get_store()
+    stats = {'total': len(movies), 'skipped': 0, 'fetched': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def warm(title, link):
+        failed = False
+        if not any(fetch_movie_info(link, movie_title=title)):
+            failed = True
+        if posters and fetch_poster(link, movie_title=title) is None:
+            failed = True
+        return failed
+
+    def stored(key):
+        raw = store.get(key)
+        if raw is not None and is_failed_lookup(raw):
+            # Forget earlier failures so they are retried
+            store.delete(key)
+            return False
+        return raw is not None
+
+    todo = []
+    for title, link in movies:
+        keys = [store_key('info', link, title)] + ([store_key('poster', link, title)] if posters else [])
+        # Resume: movies already stored (and not expired) are skipped
+        if store is not None and all(stored(key) for key in keys):
+            stats['skipped'] += 1
+        else:
+            todo.append((title, link))
+
+    started = time.monotonic()
+    Http.set_rate_limit(rate)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(warm, title, link) for title, link in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    failed = future.result()
+                except Exception:
+                    failed = True
+                with lock:
+                    stats['failed' if failed else 'fetched'] += 1
+                if progress_every and done % progress_every == 0:
+                    elapsed = time.monotonic() - started
+                    print(f'{done}/{len(todo)} movies, {done / elapsed:.1f}/s, {stats["failed"]} failed', flush=True)
+    finally:
+        Http.set_rate_limit(None)
+    stats['seconds'] = time.monotonic() - started
+    stats['per_second'] = len(todo) / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm the enrichment store with posters and plots')
+    parser.add_argument('--catalog', default=CATALOG_DIR, help='catalog directory (falls back to the JSON files)')
+    parser.add_argument('--index', dest='index_dir', default=INDEX_DIR, help='neighbour index directory, for --top')
+    parser.add_argument('--top', type=int, default=None, help='only the N most recommended movies')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent fetches')
+    parser.add_argument('--rate', type=float, default=5.0, help='max HTTP requests sent per second (0: unlimited)')
+    parser.add_argument('--no-posters', action='store_true', help='fetch plot/cast only')
+    parser.add_argument('--store', default=None, help='store file (default: ENRICHMENT_STORE or Data/cache)')
+    parser.add_argument('--omdb-url', default=None, help='OMDB endpoint override, e.g. a local stub')
+    parser.add_argument('--imdb-base', default=None, help='rewrite IMDB links to this base URL, e.g. a local stub')
+    args = parser.parse_args()
+
+    if args.store is not None:
+        Store.STORE_PATH = args.store
+    if args.omdb_url:
+        Enrichment.OMDB_URL = args.omdb_url
+    # The catalog, feature space and neighbour index the app uses
+    recommender = Recommender.load(args.catalog, args.index_dir, content=False)
+    catalog = recommender.catalog
+    indices = most_recommended(recommender, args.top) if args.top else range(len(catalog))
+    movies = [(catalog.title(i), rebase_link(catalog.link(i), args.imdb_base)) for i in indices]
+
+    stats = prefetch(movies, args.workers, args.rate, not args.no_posters)
+    print(f"Done: {stats['fetched']} fetched, {stats['failed']} failed, {stats['skipped']} already stored "
+          f"of {stats['total']} in {stats['seconds']:.1f}s ({stats['per_second']:.1f} movies/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Recommendation core shared by the Streamlit app, the HTTP API and batch jobs.
+
+A Recommender holds everything one catalog version needs: the memory-mapped
+catalog, the KNN engine in the app's feature space, the genre index, and the
+precomputed neighbour and content indexes when they are fresh, the title
+index used to pick a movie, and the cache of genre query results. Apart from
+that cache, which has its own lock, it is built once and only read
+afterwards, so threads can share it, and so can processes forked after it
+was loaded.
+
+Importing this module is cheap: NumPy, the catalog and the indexes are only
+imported and loaded by the first get_recommender() or Recommender.load()
+call, so workers, tests and batch jobs pay for what they use.
+
+    import Recommender
+    indices, distances = Recommender.get_recommender().similar(movie_index, 10)
+"""
+import threading
+
+import Metrics
+
+# Same defaults as Catalog.CATALOG_DIR and Neighbour_Index.INDEX_DIR, repeated to keep the import light
+CATALOG_DIR = './Data/catalog'
+INDEX_DIR = './Data/neighbours'
+
+_NOT_LOADED = object()
+_live = None
+_live_lock = threading.Lock()
+
+
+def feature_space():
+    """The app's feature space: genre flags and a [0, 1] normalized score
+
+    The raw 1-10 score would outweigh every genre.
+    """
+    from Classifier import FeatureSpace
+    return FeatureSpace()
+
+
+def catalog_key(catalog_dir=CATALOG_DIR, index_dir=INDEX_DIR):
+    """Return (catalog version, neighbour index stamp), which changes whenever either is replaced"""
+    from Catalog import current_version
+    from Neighbour_Index import index_stamp
+    return current_version(catalog_dir), index_stamp(index_dir)
+
+
+def load_content_index(catalog):
+    """Open the cast, crew and keyword index (optional: needs scipy), None when missing or stale"""
+    try:
+        from Content_Similarity import ContentIndex
+    except ImportError:
+        return None
+    index = ContentIndex.load()
+    if index is None or not index.is_fresh(catalog.version, len(catalog)):
+        return None
+    return index
+
+
+class Recommender:
+    """Movie-based and Genre-based recommendations over one catalog version"""
+
+    def __init__(self, catalog, neighbour_index=None, content_index=None, space=None, load_content=False):
+        from Classifier import KNNEngine
+        from Genre_Index import GenreIndex
+        from Result_Cache import ResultCache, space_key
+
+        space = space if space is not None else feature_space()
+        self.catalog = catalog
+        self.data = catalog.matrix
+        # The prepared features of a catalog on disk are mapped, not copied into every process
+        self.engine = KNNEngine(catalog.matrix, space=space, features=catalog.features(space))
+        # Genre masks and postings, so genre queries only score movies sharing a selected genre
+        self.genre_index = GenreIndex(self.engine)
+        self.neighbour_index = neighbour_index
+        # With load_content the content index (and scipy) is only loaded when first used
+        self._content_index = _NOT_LOADED if load_content else content_index
+        self._titles = None
+        # Results of genre queries: a new catalog version gets a new Recommender, and so an empty cache
+        self.results = ResultCache()
+        self._space_key = space_key(space)
+        self._lock = threading.Lock()
+
+    @classmethod
+    @Metrics.span('load')
+    def load(cls, catalog_dir=CATALOG_DIR, index_dir=INDEX_DIR, content=True, space=None):
+        """Open the catalog and every index that was built for it"""
+        from Catalog import load_catalog
+        from Neighbour_Index import NeighbourIndex
+
+        space = space if space is not None else feature_space()
+        catalog = load_catalog(catalog_dir)
+        # Skip the similar-movies index when it was built from another catalog or space
+        neighbour_index = NeighbourIndex.load(index_dir)
+        if neighbour_index is not None and not neighbour_index.is_fresh(catalog.version, len(catalog), space):
+            neighbour_index = None
+        return cls(catalog, neighbour_index, space=space, load_content=content)
+
+    @property
+    def content_index(self):
+        if self._content_index is _NOT_LOADED:
+            with self._lock:
+                if self._content_index is _NOT_LOADED:
+                    self._content_index = load_content_index(self.catalog)
+        return self._content_index
+
+    @property
+    def titles(self):
+        """The title index, built on first use: exact, prefix and fuzzy lookups of a movie by title"""
+        if self._titles is None:
+            with self._lock:
+                if self._titles is None:
+                    from Title_Index import TitleIndex
+                    self._titles = TitleIndex.from_catalog(self.catalog)
+        return self._titles
+
+    @property
+    def version(self):
+        return self.catalog.version
+
+    @property
+    def genres(self):
+        from Catalog import GENRES
+        return self.catalog.genres or GENRES
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def genre_point(self, genres, score):
+        """Return the feature vector of a genre query: the selected genres and the wanted IMDb score"""
+        unknown = [genre for genre in genres if genre not in self.genres]
+        if unknown:
+            raise ValueError(f'Unknown genres: {", ".join(unknown)}')
+        test_point = [1 if genre in genres else 0 for genre in self.genres]
+        test_point.append(score)
+        return test_point
+
+    def table(self, indices):
+        """Build the [title, link, rating] rows for a list of movie indices"""
+        return [[self.catalog.title(i), self.catalog.link(i), self.data[i][-1]] for i in indices]
+
+    @Metrics.span('knn_genres')
+    def by_features(self, test_point, k):
+        """Return the indices and distances of the k movies nearest to a feature vector"""
+        return self.genre_index.kneighbours(test_point, k)
+
+    def by_genres(self, genres, score, k):
+        """Return the indices and distances of the k movies nearest to a genre query, cached by canonical query
+
+        The arrays may come from the cache, shared with other callers, and are read-only.
+        """
+        from Result_Cache import query_key
+        # Unknown genres are only checked on a miss: a query with them never gets into the cache
+        key = query_key(genres, score, self.version, self._space_key)
+        return self.results.get_or_compute(key, k, lambda k: self.by_features(self.genre_point(genres, score), k))
+
+    def genre_cursor(self, genres, score):
+        """Return a NeighbourCursor over the movies nearest to a genre query"""
+        self.genre_point(genres, score)
+        return NeighbourCursor(lambda k: self.by_genres(genres, score, k), len(self))
+
+    def similar_cursor(self, movie_index, by='genres'):
+        """Return a NeighbourCursor over the movies most like a catalog movie, by genres or by content"""
+        if by == 'content':
+            if self.content_index is None:
+                raise ValueError('The content index is not available for this catalog')
+            return NeighbourCursor(lambda k: self.similar_by_content(movie_index, k), len(self))
+        return NeighbourCursor(lambda k: self.neighbours(movie_index, k), len(self), skip=(movie_index,))
+
+    @Metrics.span('knn_batch')
+    def by_features_batch(self, test_points, k):
+        """Return the (n_queries x k) indices and distances for a batch of feature vectors, in one scan"""
+        return self.engine.kneighbours_batch(test_points, k)
+
+    @Metrics.span('knn_movie')
+    def neighbours(self, movie_index, k):
+        """Return the indices and distances of the k movies nearest to a catalog movie, itself included
+
+        The precomputed index answers when it is fresh, the live scan otherwise.
+        """
+        if self.neighbour_index is not None and k <= self.neighbour_index.top:
+            return self.neighbour_index.lookup(movie_index, k)
+        # Fall back to the live scan
+        return self.by_features(self.data[movie_index], k)
+
+    def similar(self, movie_index, k):
+        """Return the indices and distances of the k movies most like a catalog movie, without the movie itself"""
+        indices, distances = self.neighbours(movie_index, k + 1)
+        # Not always the first: movies with the same features are ordered by index, so a duplicate can precede it
+        keep = indices != movie_index
+        return indices[keep][:k], distances[keep][:k]
+
+    @Metrics.span('knn_content')
+    def similar_by_content(self, movie_index, k):
+        """Return the indices and cosine similarities of the k movies sharing the most cast, crew and keywords"""
+        if self.content_index is None:
+            raise ValueError('The content index is not available for this catalog')
+        return self.content_index.similar(movie_index, k)
+
+
+class NeighbourCursor:
+    """Page through the results of one query, best first, without a new search for every page
+
+    search(k) returns the indices and distances (or similarities) of the k best
+    movies, in order. The cursor keeps what it got and, when a page runs past
+    it, searches again for at least twice as many, so paging through n results
+    costs a few partial selections of at most 2n rather than one per page.
+    Movies already handed out (and those in skip, such as the query movie
+    itself) are never returned again.
+    """
+
+    def __init__(self, search, total, skip=()):
+        self.search = search
+        # No search can return more movies than this
+        self.total = total
+        self.skip = set(skip)
+        self.indices = []
+        self.distances = []
+        self.position = 0
+        self.requested = 0
+
+    @property
+    def exhausted(self):
+        return self.position >= len(self.indices) and self.requested >= self.total
+
+    def _extend(self, size):
+        k = min(self.total, max(2 * self.requested, self.position + size + len(self.skip)))
+        indices, distances = self.search(k)
+        # A search returning fewer than it was asked for has nothing more
+        self.requested = k if len(indices) >= k else self.total
+        returned = set(self.indices[:self.position]) | self.skip
+        fresh = [(i, d) for i, d in zip(indices.tolist(), distances.tolist()) if i not in returned]
+        self.indices[self.position:] = [i for i, _ in fresh]
+        self.distances[self.position:] = [d for _, d in fresh]
+
+    def next_page(self, size):
+        """Return the indices and distances of the next size results, shorter (or empty) at the end"""
+        while len(self.indices) - self.position < size and self.requested < self.total:
+            self._extend(size)
+        stop = self.position + size
+        page = self.indices[self.position:stop], self.distances[self.position:stop]
+        self.position = min(stop, len(self.indices))
+        return page
+
+
+class LiveRecommender:
+    """Hand out the Recommender of the current catalog, loading a new one after Catalog_Update.py changed it"""
+
+    def __init__(self, catalog_dir=CATALOG_DIR, index_dir=INDEX_DIR, **options):
+        self.catalog_dir = catalog_dir
+        self.index_dir = index_dir
+        self.options = options
+        self.lock = threading.Lock()
+        self.key = None
+        self.recommender = None
+
+    def get(self):
+        # Both stamps are cached stat() calls, cheap enough to check on every request
+        key = catalog_key(self.catalog_dir, self.index_dir)
+        if key != self.key:
+            with self.lock:
+                if key != self.key:
+                    self.recommender = Recommender.load(self.catalog_dir, self.index_dir, **self.options)
+                    self.key = key
+        return self.recommender
+
+
+def get_recommender():
+    """Return the process-wide Recommender of the current catalog, loading it on first use"""
+    global _live
+    if _live is None:
+        with _live_lock:
+            if _live is None:
+                _live = LiveRecommender()
+    return _live.get()
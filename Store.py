@@ -0,0 +1,146 @@
+"""Persistent on-disk store for enrichment results.
+
+A single SQLite file keyed by strings such as ``omdb:tt0499549`` holds OMDb
+JSON, parsed plot/cast and resized poster bytes. Entries carry their own
+expiry time, the file is kept under a byte budget by evicting the least
+recently used entries, and WAL mode lets several app processes read and write
+it at the same time. Because it lives on disk it survives restarts, so a movie
+that was viewed once costs no network calls afterwards.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+STORE_PATH = os.getenv('ENRICHMENT_STORE', './Data/cache/enrichment.sqlite3')
+MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+TOUCH_INTERVAL = 60  # seconds between access-time updates of one entry
+EVICT_EVERY = 64  # puts between size checks
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+'''
+
+
+class EnrichmentStore:
+    """Size-bounded, TTL-aware key/value store shared by threads and processes"""
+
+    def __init__(self, path=STORE_PATH, max_bytes=MAX_BYTES, default_ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.local = threading.local()
+        self.puts = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        # SQLite connections must not be shared between threads, keep one per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the stored bytes for a key, or None when missing or expired"""
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT value, expires_at, accessed_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        if expires_at <= now:
+            self.delete(key)
+            return None
+        if now - accessed_at > TOUCH_INTERVAL:
+            self._connection().execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        return bytes(value)
+
+    def put(self, key, value, ttl=None):
+        """Store bytes under a key for ttl seconds (default_ttl when omitted)"""
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (key, sqlite3.Binary(value), len(value), now + ttl, now))
+        with self.lock:
+            self.puts += 1
+            check = self.puts % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def get_json(self, key):
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def put_json(self, key, value, ttl=None):
+        self.put(key, json.dumps(value).encode('utf-8'), ttl)
+
+    def __contains__(self, key):
+        row = self._connection().execute(
+            'SELECT 1 FROM entries WHERE key = ? AND expires_at > ?', (key, time.time())).fetchone()
+        return row is not None
+
+    def size(self):
+        """Return the total size in bytes of the stored values"""
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until the store is under its byte budget"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+            excess = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0] - self.max_bytes
+            if excess > 0:
+                # Free an extra tenth of the budget so we do not evict on every put
+                excess += self.max_bytes // 10
+                freed = 0
+                doomed = []
+                for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at'):
+                    doomed.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany('DELETE FROM entries WHERE key = ?', doomed)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide store, or None when it cannot be opened (e.g. read-only disk)"""
+    global _store
+    with _store_lock:
+        if _store is None and not STORE_PATH:
+            # ENRICHMENT_STORE='' turns the persistent store off
+            _store = False
+        if _store is None:
+            try:
+                _store = EnrichmentStore(STORE_PATH)
+            except (OSError, sqlite3.Error):
+                _store = False
+        return _store or None
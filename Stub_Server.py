@@ -0,0 +1,166 @@
+"""Local stand-in for OMDb, IMDb title pages and poster images.
+
+Used to exercise the prefetcher and the enrichment code without touching the
+real services:
+
+    python Stub_Server.py --port 8765 --latency 0.05 --fail-rate 0.1
+    python Stub_Server.py --replay Benchmarks/fixtures --latency 0.2
+
+With --replay, saved responses are served instead of the generated ones: the
+*.json files of the directory as OMDb records and the *.html files as IMDb
+title pages, each movie ID always getting the same file. Image URLs on the
+IMDb and Amazon CDNs are rewritten to the stub's poster route, so nothing
+leaves the machine.
+
+    OMDb:    http://127.0.0.1:8765/omdb/?apikey=x&i=tt0499549
+    IMDb:    http://127.0.0.1:8765/title/tt0499549/
+    Posters: http://127.0.0.1:8765/poster/tt0499549.jpg
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import PIL.Image
+
+IMDB_PAGE = '''<html><head>
+<title>{title} - IMDb</title>
+<meta property="og:image" content="{base}/poster/{imdb_id}.jpg">
+<meta name="description" content="{title}. With Stub Actor, Other Actor. A stub plot for {title}.">
+<script type="application/ld+json">{json_ld}</script>
+</head><body><h1>{title}</h1></body></html>'''
+# Image hosts of saved pages and records, served by the poster route when replaying
+_MEDIA_URL = re.compile(rb'https?://(?:m\.media-amazon\.com|ia\.media-imdb\.com|[\w-]+\.cloudfront\.net)/')
+
+
+def _poster_bytes(size=(600, 900)):
+    buffer = io.BytesIO()
+    PIL.Image.new('RGB', size, (40, 40, 90)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def load_replay(directory):
+    """Read the saved responses of a directory, returns (OMDb records, IMDb pages) as lists of bytes"""
+    def read(pattern):
+        saved = []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            with open(path, 'rb') as f:
+                saved.append(f.read())
+        return saved
+    return read('*.json'), read('*.html')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real services
+    latency = 0.0
+    fail_rate = 0.0
+    poster = _poster_bytes()
+    # Saved responses to replay (see load_replay), generated ones when empty
+    records = []
+    pages = []
+    requests_served = 0
+    connections_opened = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections_opened += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _replayed(self, saved, imdb_id, base):
+        """The saved response of a movie, with its image URLs pointed at this server"""
+        body = saved[zlib.crc32(imdb_id.encode()) % len(saved)]
+        return _MEDIA_URL.sub(f'{base}/poster/'.encode(), body)
+
+    def do_GET(self):
+        with StubHandler.lock:
+            StubHandler.requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return self._send(503, b'unavailable', 'text/plain')
+        url = urlparse(self.path)
+        base = f'http://{self.headers.get("Host")}'
+        if url.path.startswith('/omdb'):
+            query = parse_qs(url.query)
+            imdb_id = query.get('i', [''])[0]
+            if not imdb_id:
+                return self._send(200, json.dumps({'Response': 'False', 'Error': 'Movie not found!'}).encode(),
+                                  'application/json')
+            if self.records:
+                return self._send(200, self._replayed(self.records, imdb_id, base), 'application/json')
+            record = {'Response': 'True', 'Title': f'Movie {imdb_id}', 'Plot': f'A stub plot for {imdb_id}.',
+                      'Actors': 'Stub Actor, Other Actor', 'Poster': f'{base}/poster/{imdb_id}.jpg'}
+            return self._send(200, json.dumps(record).encode(), 'application/json')
+        match = re.match(r'/title/(tt\d+)', url.path)
+        if match:
+            imdb_id = match.group(1)
+            if self.pages:
+                return self._send(200, self._replayed(self.pages, imdb_id, base), 'text/html; charset=utf-8')
+            title = f'Movie {imdb_id}'
+            json_ld = json.dumps({'@type': 'Movie', 'name': title, 'image': f'{base}/poster/{imdb_id}.jpg',
+                                  'description': f'A stub plot for {title}.',
+                                  'actor': [{'name': 'Stub Actor'}, {'name': 'Other Actor'}]})
+            page = IMDB_PAGE.format(title=title, base=base, imdb_id=imdb_id, json_ld=json_ld)
+            return self._send(200, page.encode(), 'text/html; charset=utf-8')
+        if url.path.startswith('/poster/'):
+            return self._send(200, self.poster, 'image/jpeg')
+        return self._send(404, b'not found', 'text/plain')
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that give up mid-response (timeouts, interrupted runs) are expected
+        pass
+
+
+def start_stub_server(port=0, latency=0.0, fail_rate=0.0, replay=None):
+    """Start the stub server on a background thread, returns (server, base_url)
+
+    replay: a directory of saved OMDb records (*.json) and IMDb pages (*.html) to serve
+    """
+    records, pages = load_replay(replay) if replay else ([], [])
+    handler = type('Handler', (StubHandler,), {'latency': latency, 'fail_rate': fail_rate,
+                                                'records': records, 'pages': pages})
+    server = StubServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve stub OMDb/IMDb/poster responses')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--replay', default=None, help='directory of saved OMDb (*.json) and IMDb (*.html) responses')
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.port, args.latency, args.fail_rate, args.replay)
+    print(f'Stub server on {base_url} (OMDb at {base_url}/omdb/)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Title lookup and search for picking a movie.
+
+Titles are normalized (accents folded, case folded, punctuation dropped) and
+indexed three ways:
+
+- a dict from normalized title to its movies, so resolving a title is O(1);
+  the release year tells remakes and duplicates apart
+- the sorted normalized titles, so a prefix is found by binary search
+- trigram postings over the distinct titles, so a typo still finds the title:
+  candidates come from the query's rarest trigrams, and are ranked by the
+  Dice similarity of their trigram sets
+
+A search touches the postings of a few trigrams and a bounded number of
+candidates, never the whole catalog.
+"""
+import bisect
+import re
+import unicodedata
+from array import array
+
+import numpy as np
+
+SEARCH_LIMIT = 20
+# Candidates read from the postings of a fuzzy query, rarest trigrams first
+MAX_CANDIDATE_POSTINGS = 5000
+# Candidates, sharing the most of those trigrams, whose similarity is computed
+MAX_RANKED = 200
+MIN_SIMILARITY = 0.3
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_title(title):
+    """Return the lookup key of a title: accents and case folded, punctuation and extra spaces dropped"""
+    folded = unicodedata.normalize('NFKD', title)
+    folded = ''.join(char for char in folded if not unicodedata.combining(char)).casefold()
+    return _NON_WORD.sub(' ', folded).strip()
+
+
+def trigrams(key):
+    """Return the set of character trigrams of a normalized title, padded so short words count too"""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Exact, prefix and fuzzy title search over a catalog's titles"""
+
+    def __init__(self, titles, years=None):
+        self.titles = titles
+        self.years = years
+        # Normalized title -> movie IDs, in catalog order
+        self.exact = {}
+        for i, title in enumerate(titles):
+            self.exact.setdefault(normalize_title(title), []).append(i)
+        self.keys = sorted(self.exact)
+        # Trigram -> positions in self.keys of the titles containing it, as one CSR array:
+        # the postings of trigram g are postings[offsets[g]:offsets[g + 1]], sorted
+        self.gram_ids = {}
+        gram_column, key_column = array('i'), array('i')
+        for position, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                gram_column.append(self.gram_ids.setdefault(gram, len(self.gram_ids)))
+                key_column.append(position)
+        gram_column = np.frombuffer(gram_column, dtype=np.int32)
+        key_column = np.frombuffer(key_column, dtype=np.int32)
+        order = np.argsort(gram_column, kind='stable')
+        self.postings = key_column[order]
+        # Number of distinct trigrams of each title, the other half of the Dice denominator
+        self.gram_counts = np.bincount(key_column, minlength=len(self.keys))
+        self.offsets = np.zeros(len(self.gram_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_column, minlength=len(self.gram_ids)), out=self.offsets[1:])
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(catalog.titles(), catalog.years)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def year(self, i):
+        if self.years is None or not self.years[i]:
+            return None
+        return int(self.years[i])
+
+    def label(self, i):
+        """Return the title shown for movie i, with its year when known"""
+        year = self.year(i)
+        return f'{self.titles[i]} ({year})' if year else self.titles[i]
+
+    def lookup(self, title, year=None):
+        """Return the IDs of the movies with this title (of this year when given), in catalog order"""
+        ids = self.exact.get(normalize_title(title), [])
+        if year is not None:
+            ids = [i for i in ids if self.year(i) == year]
+        return ids
+
+    def resolve(self, title, year=None):
+        """Return the ID of the movie with this title, None when there is none
+
+        Among several movies with the title, the year picks one; without a year,
+        or when none has it, the first one in the catalog wins.
+        """
+        ids = self.lookup(title)
+        if not ids:
+            return None
+        if year is not None:
+            ids = [i for i in ids if self.year(i) == year] or ids
+        return ids[0]
+
+    def _movies(self, keys, limit, seen):
+        """Expand normalized titles into movie IDs, one per (title, year)"""
+        found = []
+        for key in keys:
+            for i in self.exact[key]:
+                # Rows repeating a title and year are the same movie; without years keep them all
+                year = self.year(i)
+                label = (key, year) if year else i
+                if label not in seen:
+                    seen.add(label)
+                    found.append(i)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def prefix(self, query, limit=SEARCH_LIMIT):
+        """Return the normalized titles starting with the query, alphabetically"""
+        key = normalize_title(query)
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        stop = bisect.bisect_left(self.keys, key + '\uffff', start, min(len(self.keys), start + limit))
+        return self.keys[start:stop]
+
+    def fuzzy(self, query, limit=SEARCH_LIMIT, min_similarity=MIN_SIMILARITY):
+        """Return (normalized title, similarity) pairs of the titles closest to the query, best first"""
+        key = normalize_title(query)
+        if not key:
+            return []
+        grams = trigrams(key)
+        lists = sorted((self.postings[self.offsets[g]:self.offsets[g + 1]]
+                        for g in (self.gram_ids.get(gram) for gram in grams) if g is not None), key=len)
+        if not lists:
+            return []
+        # Gather candidates from the rarest trigrams first, up to a fixed number of postings, so
+        # a query made only of common trigrams still reads a bounded part of the index
+        chosen, total = [], 0
+        for ids in lists:
+            if total >= MAX_CANDIDATE_POSTINGS:
+                break
+            chosen.append(ids[:MAX_CANDIDATE_POSTINGS - total])
+            total += len(chosen[-1])
+        candidates, counts = np.unique(np.concatenate(chosen), return_counts=True)
+        if len(candidates) > MAX_RANKED:
+            candidates = candidates[np.argsort(-counts, kind='stable')[:MAX_RANKED]]
+        # Count the query trigrams every candidate has, by binary search in each sorted posting list
+        shared = np.zeros(len(candidates), dtype=np.int32)
+        for ids in lists:
+            found = np.minimum(np.searchsorted(ids, candidates), len(ids) - 1)
+            shared += ids[found] == candidates
+        similarity = 2 * shared / (len(grams) + self.gram_counts[candidates])
+        keep = np.flatnonzero(similarity >= min_similarity)
+        best = keep[np.lexsort((candidates[keep], -similarity[keep]))][:limit]
+        return [(self.keys[candidates[i]], float(similarity[i])) for i in best]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Return up to limit movie IDs for a typed query: exact title, then prefix, then fuzzy matches"""
+        key = normalize_title(query)
+        if not key:
+            return []
+        seen = set()
+        found = self._movies([key] if key in self.exact else [], limit, seen)
+        if len(found) < limit:
+            found += self._movies(self.prefix(key, limit), limit - len(found), seen)
+        if len(found) < limit:
+            found += self._movies([candidate for candidate, _ in self.fuzzy(key, limit)], limit - len(found), seen)
+        return found
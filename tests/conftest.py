@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The modules find the catalog and the caches through paths relative to the repository
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    from Catalog import Catalog
+    return Catalog.from_json(os.path.join(ROOT, 'Data', 'movie_data.json'),
+                             os.path.join(ROOT, 'Data', 'movie_titles.json'))
+
+
+@pytest.fixture(scope='session')
+def recommender(catalog):
+    """The bundled catalog without precomputed indexes, so every search is a live one"""
+    import Store
+    Store.STORE_PATH = ''
+    from Recommender import Recommender
+    return Recommender(catalog)
+
+
+@pytest.fixture(scope='session')
+def duplicated_movie(recommender):
+    """A movie with the same feature vector as a movie of lower index"""
+    data = recommender.data
+    for i in range(1, len(data)):
+        if (data[:i] == data[i]).all(axis=1).any():
+            return i
+    pytest.skip('the catalog has no duplicate feature vectors')
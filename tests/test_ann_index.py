@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+import Ann_Index
+from Ann_Index import IVFIndex
+from Catalog import write_catalog
+from Classifier import FeatureSpace, KNNEngine
+
+
+@pytest.fixture(scope='module')
+def engine(recommender):
+    return KNNEngine(recommender.data, space=FeatureSpace())
+
+
+def test_save_and_load(engine, tmp_path):
+    index = IVFIndex.build(engine)
+    index.save(str(tmp_path), catalog_version='v1')
+    assert sorted(os.listdir(tmp_path)) == ['centroids.1.npy', 'meta.json', 'offsets.1.npy', 'order.1.npy']
+    loaded = IVFIndex.load(engine, str(tmp_path), catalog_version='v1')
+    np.testing.assert_array_equal(loaded.order, index.order)
+    assert IVFIndex.load(engine, str(tmp_path), catalog_version='v2') is None
+
+
+def test_saves_never_touch_the_files_of_a_published_meta(engine, tmp_path):
+    IVFIndex.build(engine, n_lists=20).save(str(tmp_path), catalog_version='v1')
+    with open(tmp_path / 'meta.json', 'r', encoding='utf-8') as f:
+        first = json.load(f)
+    before = {name: np.load(tmp_path / name) for name in first['files'].values()}
+    IVFIndex.build(engine, n_lists=30, seed=1).save(str(tmp_path), catalog_version='v2')
+    # A reader that read the first meta just before the swap still gets the arrays it describes
+    for name, array in before.items():
+        np.testing.assert_array_equal(np.load(tmp_path / name), array)
+    assert IVFIndex.load(engine, str(tmp_path), catalog_version='v2').n_lists == 30
+    # Two generations back, the files are gone
+    IVFIndex.build(engine, n_lists=40).save(str(tmp_path), catalog_version='v3')
+    assert not any(os.path.exists(tmp_path / name) for name in before)
+    assert len(os.listdir(tmp_path)) == 7
+
+
+def run_main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['Ann_Index.py', *argv])
+    Ann_Index.main()
+    with open(os.path.join(argv[argv.index('--out') + 1], 'meta.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_main_follows_lists_and_nprobe(catalog, tmp_path, monkeypatch):
+    write_catalog(catalog.matrix, catalog, str(tmp_path / 'catalog'))
+    options = ['--catalog', str(tmp_path / 'catalog'), '--out', str(tmp_path / 'ann')]
+    meta = run_main(monkeypatch, *options, '--nprobe', '1')
+    assert (meta['lists'], meta['nprobe'], meta['generation']) == (71, 1, 1)
+    assert run_main(monkeypatch, *options, '--nprobe', '1')['generation'] == 1
+    meta = run_main(monkeypatch, *options, '--lists', '10', '--nprobe', '1')
+    assert (meta['lists'], meta['nprobe']) == (10, 1)
+    meta = run_main(monkeypatch, *options, '--nprobe', '4')
+    assert (meta['lists'], meta['nprobe']) == (10, 4)
+    assert run_main(monkeypatch, *options, '--nprobe', '4', '--rebuild')['lists'] == 71
@@ -0,0 +1,60 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client():
+    import Store
+    Store.STORE_PATH = ''
+    import Api
+    return Api.app.test_client()
+
+
+def batch(client, *queries):
+    return client.post('/recommend/batch', json={'queries': list(queries)})
+
+
+def test_similar_excludes_the_movie(client, duplicated_movie):
+    response = client.get(f'/movies/{duplicated_movie}/similar?k=3')
+    assert response.status_code == 200
+    ids = [movie['id'] for movie in response.get_json()['results']]
+    assert len(ids) == 3 and duplicated_movie not in ids
+
+
+def test_unknown_movie_is_not_found(client):
+    response = client.get('/movies/999999')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'No movie 999999'}
+    assert batch(client, {'movie': 999999}).status_code == 404
+
+
+@pytest.mark.parametrize('query', [
+    {'genres': ['Action'], 'score': None},
+    {'genres': ['Action'], 'score': float('nan')},
+    {'genres': ['Action'], 'score': float('inf')},
+    {'genres': ['Action'], 'score': True},
+    {'genres': ['Action'], 'score': [8]},
+    {'genres': 5},
+    {'genres': [5]},
+    {'genres': ['Unknown']},
+    {'genres': ['Action'], 'k': [1]},
+    {'genres': ['Action'], 'k': 0},
+    {'movie': None},
+    {'movie': [1]},
+    {'movie': 1.5},
+    {'movie': 1, 'by': 'nothing'},
+])
+def test_invalid_batch_query_is_a_bad_request(client, query):
+    response = batch(client, query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('score', ['nan', 'inf', 'eight'])
+def test_invalid_genre_score_is_a_bad_request(client, score):
+    assert client.get(f'/recommend/genres?genres=Action&score={score}').status_code == 400
+
+
+def test_genre_query_order_does_not_matter(client):
+    first = client.get('/recommend/genres?genres=Action,Sci-Fi&score=8&k=5').get_json()
+    second = batch(client, {'genres': ['Sci-Fi', 'Action'], 'score': 8.0, 'k': 5}).get_json()
+    assert first['results'] == second['results'][0]
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+from Catalog import Catalog, write_catalog
+from Classifier import FeatureSpace, KNNEngine
+
+
+@pytest.fixture
+def opened(catalog, tmp_path):
+    write_catalog(catalog.matrix, catalog, str(tmp_path))
+    return Catalog.open(str(tmp_path))
+
+
+def test_prepared_features_are_mapped_from_one_file(opened, tmp_path):
+    space = FeatureSpace()
+    features = opened.features(space)
+    assert isinstance(features, np.memmap) and not features.flags.writeable
+    np.testing.assert_array_equal(features, space.prepare(opened.matrix))
+    assert [name for name in os.listdir(tmp_path) if name.startswith('prepared.')] == [os.path.basename(
+        features.filename)]
+    # Another process opening the catalog maps the same file
+    assert Catalog.open(str(tmp_path)).features(space).filename == features.filename
+
+
+def test_unprepared_spaces_share_the_matrix(opened, catalog):
+    assert np.shares_memory(opened.features(FeatureSpace.raw()), opened.matrix)
+    assert opened.features(FeatureSpace('cosine')) is None
+    assert catalog.features(FeatureSpace()) is None
+
+
+def test_engine_over_mapped_features_equals_the_full_scan(opened):
+    space = FeatureSpace()
+    engine = KNNEngine(opened.matrix, space=space, features=opened.features(space))
+    expected = KNNEngine(np.array(opened.matrix), space=space)
+    for movie in (0, 17, 3575):
+        query = opened.matrix[movie]
+        for got, want in zip(engine.kneighbours(query, 10), expected.kneighbours(query, 10)):
+            np.testing.assert_array_equal(got, want)
@@ -0,0 +1,133 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from Catalog import GENRES, Catalog, CatalogUpdater, load_catalog, write_catalog
+from Catalog_Update import apply_updates
+from Classifier import FeatureSpace, KNNEngine
+from Content_Similarity import ContentIndex, save_content_index
+from Neighbour_Index import NeighbourIndex, build_index, save_index
+
+TOP = 10
+ROWS = 1200
+
+
+@pytest.fixture
+def dirs(catalog, tmp_path):
+    """A catalog of the first movies with a neighbour index and a content index built for it"""
+    catalog_dir, index_dir, content_dir = (str(tmp_path / name) for name in ('catalog', 'index', 'content'))
+    for path in (catalog_dir, index_dir, content_dir):
+        os.makedirs(path)
+    movies = [catalog[i] for i in range(ROWS)]
+    manifest = write_catalog(np.array(catalog.matrix[:ROWS]), movies, catalog_dir)
+    opened = Catalog.open(catalog_dir)
+    space = FeatureSpace()
+    save_index(*build_index(opened.matrix, top=TOP, workers=1, space=space), manifest['version'], index_dir, space)
+    content = sp.random(ROWS, 50, density=0.1, format='csr', random_state=0)
+    save_content_index(content, [f'token:{i}' for i in range(50)], manifest['version'], content_dir)
+    return catalog_dir, index_dir, content_dir
+
+
+def movie(catalog, source, **changes):
+    genres = [name for name, value in zip(GENRES, catalog.matrix[source][:-1]) if value]
+    fields = {'title': catalog.title(source), 'link': catalog.link(source), 'genres': genres,
+              'score': float(catalog.matrix[source][-1])}
+    fields.update(changes)
+    return fields
+
+
+def test_upserts_equal_a_full_rebuild(catalog, dirs):
+    catalog_dir, index_dir, content_dir = dirs
+    rebuilt = np.array(catalog.matrix[:ROWS])
+    titles = [catalog.title(i) for i in range(ROWS)]
+    links = [catalog.link(i) for i in range(ROWS)]
+    movies = [
+        # Found by link, only the score changes
+        movie(catalog, 7, score=2.5),
+        # Moved onto the vector of another movie
+        movie(catalog, 1500, title=catalog.title(30), link=catalog.link(30)),
+        # Replaced by row, so with a new title and link
+        dict(movie(catalog, 1600), row=45),
+        # New movies
+        movie(catalog, 2000),
+        movie(catalog, 2001, score=9.9),
+    ]
+    for i, source, score in ((7, 7, 2.5), (30, 1500, None), (45, 1600, None)):
+        rebuilt[i] = catalog.matrix[source]
+        if score is not None:
+            rebuilt[i, -1] = score
+    rebuilt = np.vstack([rebuilt, catalog.matrix[2000], catalog.matrix[2001]])
+    rebuilt[-1, -1] = 9.9
+    titles[45], links[45] = catalog.title(1600), catalog.link(1600)
+    titles += [catalog.title(2000), catalog.title(2001)]
+    links += [catalog.link(2000), catalog.link(2001)]
+
+    update, updated_index, no_content = apply_updates(movies, catalog_dir, index_dir, content_dir)
+    assert updated_index
+    opened = load_catalog(catalog_dir)
+    np.testing.assert_array_equal(opened.matrix, rebuilt)
+    assert [opened.title(i) for i in range(len(opened))] == titles
+    assert [opened.link(i) for i in range(len(opened))] == links
+
+    space = FeatureSpace()
+    index = NeighbourIndex.load(index_dir)
+    assert index.is_fresh(update.version, len(rebuilt), space)
+    engine = KNNEngine(rebuilt, space=space)
+    for i in range(len(rebuilt)):
+        expected, expected_distances = engine.kneighbours(rebuilt[i], TOP)
+        neighbours, distances = index.lookup(i, TOP)
+        np.testing.assert_array_equal(neighbours, expected)
+        np.testing.assert_array_equal(distances, expected_distances.astype(np.float32))
+
+    # The renamed movie and the new ones have no content until the index is rebuilt, the others keep theirs
+    assert sorted(no_content) == [45, ROWS, ROWS + 1]
+    content = ContentIndex.load(content_dir)
+    assert content.is_fresh(update.version, len(rebuilt))
+    before = sp.random(ROWS, 50, density=0.1, format='csr', random_state=0)
+    for i in (0, 7, 30):
+        np.testing.assert_array_equal(content.matrix[i].toarray(), before[i].toarray())
+    for i in no_content:
+        assert content.matrix[i].nnz == 0
+
+
+def test_a_stale_content_index_is_left_alone(catalog, dirs):
+    catalog_dir, index_dir, content_dir = dirs
+    save_content_index(sp.csr_matrix((ROWS, 5)), ['token'] * 5, 'other', content_dir)
+    assert apply_updates([movie(catalog, 2000)], catalog_dir, index_dir, content_dir)[2] is None
+    assert ContentIndex.load(content_dir).meta['catalog_version'] == 'other'
+
+
+def test_updaters_wait_for_each_other(catalog, dirs):
+    catalog_dir = dirs[0]
+    committed = []
+
+    def second():
+        with CatalogUpdater(catalog_dir) as updater:
+            updater.upsert(catalog.matrix[2001], catalog.title(2001), catalog.link(2001))
+            committed.append(updater.commit())
+
+    with CatalogUpdater(catalog_dir) as updater:
+        thread = threading.Thread(target=second)
+        thread.start()
+        thread.join(0.2)
+        # The second updater cannot open the catalog while the first holds it
+        assert thread.is_alive() and not committed
+        updater.upsert(catalog.matrix[2000], catalog.title(2000), catalog.link(2000))
+        first = updater.commit()
+    thread.join()
+    # It started from the first commit, so both movies are in
+    assert committed[0].previous_version == first.version
+    opened = Catalog.open(catalog_dir)
+    assert len(opened) == ROWS + 2 and opened.link(ROWS + 1) == catalog.link(2001)
+
+
+def test_load_catalog_only_falls_back_without_a_manifest(dirs, tmp_path):
+    catalog_dir = dirs[0]
+    manifest = Catalog.open(catalog_dir).manifest
+    os.remove(os.path.join(catalog_dir, manifest['files']['matrix']))
+    with pytest.raises(FileNotFoundError):
+        load_catalog(catalog_dir)
+    assert len(load_catalog(str(tmp_path / 'missing'))) > ROWS
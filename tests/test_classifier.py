@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from Classifier import FeatureSpace, KNearestNeighbours, KNNEngine
+
+
+@pytest.fixture(scope='module')
+def queries(recommender):
+    rng = np.random.default_rng(1)
+    points = np.array(recommender.data[rng.integers(0, len(recommender), 60)])
+    # Scores between the catalog's, so not every query sits on a movie
+    points[::3, -1] = rng.uniform(1, 10, 20)
+    return points
+
+
+@pytest.mark.parametrize('space', [FeatureSpace.raw(), FeatureSpace(), FeatureSpace('cosine'), FeatureSpace('jaccard')],
+                         ids=['raw', 'normalized', 'cosine', 'jaccard'])
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('k, max_bytes', [(10, 8 * 1024 * 1024), (25, 20000), (1, 5000)])
+def test_batch_equals_single_queries(recommender, queries, space, dtype, k, max_bytes):
+    engine = KNNEngine(recommender.data, dtype=dtype, space=space)
+    indices, distances = engine.kneighbours_batch(queries, k, max_bytes=max_bytes)
+    for row, query in enumerate(queries):
+        expected, expected_distances = engine.kneighbours(query, k)
+        np.testing.assert_array_equal(indices[row], expected)
+        np.testing.assert_array_equal(distances[row], expected_distances.astype(distances.dtype))
+
+
+def test_batch_k_beyond_the_catalog():
+    engine = KNNEngine([[1, 0, 5.0], [0, 1, 6.0], [1, 0, 5.0]])
+    indices, distances = engine.kneighbours_batch([[1, 0, 5.0]], 10)
+    assert indices.tolist() == [[0, 2, 1]]
+    assert distances[0, :2].tolist() == [0, 0]
+
+
+def test_fit_keeps_raw_euclidean_distances(recommender):
+    data = recommender.data.tolist()
+    model = KNearestNeighbours(data, [0] * len(data), data[5], 5)
+    model.fit()
+    assert [d for d, _ in model.distances] == [KNearestNeighbours.dist(data[5], data[i]) for i in model.indices]
+    # The app's engine measures in its own space, where the score spans [0, 1]
+    model = KNearestNeighbours(recommender.engine, [0] * len(data), data[5], 5)
+    model.fit()
+    expected = recommender.engine.kneighbours(data[5], 5)[1]
+    assert [d for d, _ in model.distances] == expected.tolist()
@@ -0,0 +1,55 @@
+import pytest
+
+import Enrichment
+import Http
+from Enrichment import TransientError
+from Store import EnrichmentStore
+from Stub_Server import start_stub_server
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    """A stub OMDB/IMDB server, an empty store and empty memo caches; returns a function setting its fail rate"""
+    server, base_url = start_stub_server()
+    store = EnrichmentStore(str(tmp_path / 'store.sqlite3'))
+    monkeypatch.setattr(Enrichment, 'get_store', lambda: store)
+    monkeypatch.setattr(Enrichment, 'OMDB_URL', base_url + '/omdb/')
+    monkeypatch.setattr(Enrichment, 'OMDB_API_KEY', 'test')
+    # No retries, so failures are quick
+    monkeypatch.setattr(Http, '_session', Http.make_session(retries=0))
+    Enrichment._omdb_cache.clear()
+    Enrichment._imdb_cache.clear()
+
+    def fail(rate):
+        server.RequestHandlerClass.fail_rate = rate
+    fail.base_url = base_url
+    fail.store = store
+    yield fail
+    server.shutdown()
+    Enrichment._omdb_cache.clear()
+    Enrichment._imdb_cache.clear()
+
+
+def test_failures_are_not_stored(stub):
+    link = stub.base_url + '/title/tt0000001/'
+    stub(1.0)
+    with pytest.raises(TransientError):
+        Enrichment.fetch_movie_info(link, 'Movie')
+    with pytest.raises(TransientError):
+        Enrichment.fetch_poster(link, 'Movie')
+    assert 'info:tt0000001' not in stub.store and 'poster:tt0000001' not in stub.store
+
+    # Once the services answer again, the movie is found
+    stub(0.0)
+    title, cast, story, _ = Enrichment.fetch_movie_info(link, 'Movie')
+    assert title == 'Movie tt0000001' and story
+    assert Enrichment.fetch_poster(link, 'Movie') is not None
+
+
+def test_missing_movie_is_stored_as_a_miss(stub, monkeypatch):
+    monkeypatch.setattr(Enrichment, 'OMDB_API_KEY', None)
+    link = stub.base_url + '/missing/tt0000002/'
+    assert not any(Enrichment.fetch_movie_info(link, 'Nothing'))
+    assert Enrichment.fetch_poster(link, 'Nothing') is None
+    assert Enrichment.is_failed_lookup(stub.store.get('info:tt0000002'))
+    assert Enrichment.is_failed_lookup(stub.store.get('poster:tt0000002'))
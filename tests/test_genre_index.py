@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from Classifier import FeatureSpace, KNNEngine
+from Genre_Index import GenreIndex
+
+SPACES = [FeatureSpace.raw(), FeatureSpace(), FeatureSpace(score_weight=3.0), FeatureSpace(genre_weights=0.5),
+          FeatureSpace('cosine'), FeatureSpace('jaccard', score_weight=0.5)]
+SPACE_IDS = ['raw', 'normalized', 'score-heavy', 'genre-light', 'cosine', 'jaccard']
+
+
+def genre_queries(recommender, n=40, seed=3):
+    """Genre queries like the app's: a few genres and a wanted score, plus catalog movies and no genre at all"""
+    rng = np.random.default_rng(seed)
+    n_genres = recommender.data.shape[1] - 1
+    queries = np.zeros((n, n_genres + 1))
+    for query in queries:
+        query[rng.choice(n_genres, rng.integers(1, 4), replace=False)] = 1
+        query[-1] = rng.integers(1, 11)
+    movies = np.array(recommender.data[rng.integers(0, len(recommender), 10)])
+    return np.vstack([queries, movies, np.zeros((1, n_genres + 1))])
+
+
+@pytest.mark.parametrize('space', SPACES, ids=SPACE_IDS)
+@pytest.mark.parametrize('k', [1, 10, 200])
+def test_equals_full_scan(recommender, space, k):
+    engine = KNNEngine(recommender.data, space=space)
+    index = GenreIndex(engine)
+    for query in genre_queries(recommender):
+        indices, distances = index.kneighbours(query, k)
+        expected, expected_distances = engine.kneighbours(query, k)
+        np.testing.assert_array_equal(indices, expected)
+        np.testing.assert_array_equal(distances, expected_distances)
+
+
+def test_needs_equal_genre_weights(recommender):
+    weights = np.ones(recommender.data.shape[1] - 1)
+    weights[0] = 2
+    with pytest.raises(ValueError):
+        GenreIndex(KNNEngine(recommender.data, space=FeatureSpace(genre_weights=weights)))
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Classifier import FeatureSpace, KNNEngine
+from Grouped_Index import GroupedIndex
+
+SPACES = [FeatureSpace.raw(), FeatureSpace(), FeatureSpace(score_weight=3.0), FeatureSpace('cosine'),
+          FeatureSpace('jaccard')]
+SPACE_IDS = ['raw', 'normalized', 'score-heavy', 'cosine', 'jaccard']
+
+
+@pytest.fixture(scope='module')
+def queries(recommender):
+    rng = np.random.default_rng(4)
+    points = np.array(recommender.data[rng.integers(0, len(recommender), 40)])
+    # Scores between the catalog's, and genre sets no movie has
+    points[::2, -1] = rng.uniform(1, 10, 20)
+    points[1::4, :-1] = rng.integers(0, 2, (10, points.shape[1] - 1))
+    return points
+
+
+@pytest.mark.parametrize('space', SPACES, ids=SPACE_IDS)
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('k', [1, 10, 300])
+def test_equals_full_scan(recommender, queries, space, dtype, k):
+    engine = KNNEngine(recommender.data, dtype=dtype, space=space)
+    index = GroupedIndex(engine)
+    assert index.n_groups < len(index)
+    indices, distances = index.kneighbours_batch(queries, k)
+    for row, query in enumerate(queries):
+        expected, expected_distances = engine.kneighbours(query, k)
+        np.testing.assert_array_equal(indices[row], expected)
+        np.testing.assert_array_equal(distances[row], expected_distances)
+
+
+def test_weighted_genres_and_k_beyond_the_catalog():
+    data = np.array([[1, 0, 5.0], [0, 1, 5.0], [1, 0, 5.0], [1, 1, 9.0]])
+    engine = KNNEngine(data, space=FeatureSpace(genre_weights=[2.0, 0.5]))
+    indices, distances = GroupedIndex(engine, block_groups=1).kneighbours([1, 0, 6.0], 10)
+    expected, expected_distances = engine.kneighbours([1, 0, 6.0], 10)
+    assert indices.tolist() == expected.tolist() == [0, 2, 3, 1]
+    np.testing.assert_array_equal(distances, expected_distances)
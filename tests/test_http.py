@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+import Http
+from Stub_Server import start_stub_server
+
+
+@pytest.fixture
+def server():
+    server, base_url = start_stub_server()
+    server.base_url = base_url
+    yield server
+    server.shutdown()
+    Http.set_rate_limit(None)
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+
+
+def test_every_request_and_retry_is_charged(server, monkeypatch):
+    monkeypatch.setattr(Http, 'BACKOFF', 0)
+    monkeypatch.setattr(Http, '_session', Http.make_session(retries=2))
+    limiter = CountingLimiter()
+    monkeypatch.setattr(Http, '_rate_limiter', limiter)
+    assert Http.get(server.base_url + '/title/tt0000001/').ok
+    with Http.stream(server.base_url + '/poster/tt0000001.jpg') as response:
+        assert response.ok
+    assert limiter.calls == 2
+    # Two retries of an unavailable service are two more requests
+    server.RequestHandlerClass.fail_rate = 1.0
+    assert Http.get(server.base_url + '/title/tt0000001/').status_code == 503
+    assert limiter.calls == 5
+
+
+def test_rate_limit_spaces_requests(server, monkeypatch):
+    monkeypatch.setattr(Http, '_session', Http.make_session(retries=0))
+    Http.set_rate_limit(50, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        Http.get(server.base_url + '/title/tt0000001/')
+    assert time.monotonic() - started >= 10 / 50 * 0.9
@@ -0,0 +1,13 @@
+from Catalog import Catalog
+from Movie_Data_Processing import build
+
+
+def test_missing_title_and_link_become_empty(tmp_path):
+    csv_path = tmp_path / 'movie_metadata.csv'
+    csv_path.write_text('genres,movie_title,imdb_score,movie_imdb_link,title_year\n'
+                        'Action|Sci-Fi,Avatar\xa0 ,7.9,http://www.imdb.com/title/tt0499549/,2009\n'
+                        'Drama,,6.1,,\n', encoding='utf-8')
+    build(str(csv_path), str(tmp_path / 'catalog'), chunk_size=1)
+    catalog = Catalog.open(str(tmp_path / 'catalog'))
+    assert [catalog.title(i) for i in range(len(catalog))] == ['Avatar', '']
+    assert catalog.link(1) == '' and catalog.year(1) is None
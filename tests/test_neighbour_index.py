@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from Catalog import CatalogUpdate
+from Classifier import FeatureSpace, KNNEngine
+from Neighbour_Index import NeighbourIndex, build_index, save_index, update_index
+
+TOP = 10
+ROWS = 1200
+SPACES = [FeatureSpace.raw(), FeatureSpace(), FeatureSpace('cosine'), FeatureSpace('jaccard')]
+SPACE_IDS = ['raw', 'normalized', 'cosine', 'jaccard']
+
+
+def assert_full_scan(index, matrix, space):
+    engine = KNNEngine(matrix, space=space)
+    for i in range(len(matrix)):
+        expected, expected_distances = engine.kneighbours(matrix[i], TOP)
+        neighbours, distances = index.lookup(i, TOP)
+        np.testing.assert_array_equal(neighbours, expected)
+        np.testing.assert_array_equal(distances, expected_distances.astype(np.float32))
+
+
+@pytest.mark.parametrize('space', SPACES, ids=SPACE_IDS)
+def test_build_equals_full_scan(recommender, tmp_path, space):
+    matrix = np.array(recommender.data[:ROWS])
+    neighbours, distances = build_index(matrix, top=TOP, workers=2, chunk_size=500, space=space)
+    save_index(neighbours, distances, 'v0', str(tmp_path), space)
+    index = NeighbourIndex.load(str(tmp_path))
+    assert index.is_fresh('v0', ROWS, space) and not index.is_fresh('v0', ROWS, FeatureSpace('jaccard', 2.0))
+    assert_full_scan(index, matrix, space)
+
+
+def changed_catalog(matrix, rng, updates, appends):
+    """Return the matrix with some rows moved and some appended, and the CatalogUpdate describing it"""
+    updated = sorted(rng.choice(len(matrix), updates, replace=False).tolist())
+    new = np.vstack([matrix, matrix[rng.integers(0, len(matrix), appends)]])
+    # Copies of other movies (ties with them) and brand new vectors, with new scores
+    new[updated] = matrix[rng.integers(0, len(matrix), updates)]
+    new[updated[::2], -1] = rng.uniform(1, 10, len(updated[::2])).round(1)
+    new[len(matrix)::2, -1] = rng.uniform(1, 10, len(new[len(matrix)::2])).round(1)
+    update = CatalogUpdate({'version': 'v1'}, 'v0', list(range(len(matrix), len(new))), updated,
+                           {i: matrix[i].copy() for i in updated})
+    return new, update
+
+
+@pytest.mark.parametrize('space', SPACES, ids=SPACE_IDS)
+@pytest.mark.parametrize('updates, appends, delta', [(1, 1, True), (40, 40, False)], ids=['delta', 'compacted'])
+def test_update_equals_rebuild(recommender, tmp_path, space, updates, appends, delta):
+    matrix = np.array(recommender.data[:ROWS])
+    save_index(*build_index(matrix, top=TOP, workers=2, chunk_size=500, space=space), 'v0', str(tmp_path), space)
+    new, update = changed_catalog(matrix, np.random.default_rng(updates), updates, appends)
+
+    assert update_index(update, KNNEngine(new, space=space), str(tmp_path))
+    index = NeighbourIndex.load(str(tmp_path))
+    assert index.is_fresh('v1', len(new), space)
+    # Few changes go to the delta file, many are folded into new base arrays
+    assert bool(index.meta['files']['delta']) == delta
+    assert_full_scan(index, new, space)
+
+
+def test_update_skips_a_stale_index(recommender, tmp_path):
+    matrix = np.array(recommender.data[:ROWS])
+    save_index(*build_index(matrix, top=TOP, workers=2, space=FeatureSpace()), 'v0', str(tmp_path), FeatureSpace())
+    new, update = changed_catalog(matrix, np.random.default_rng(0), 2, 2)
+    # Built in another space: the update cannot follow it
+    assert not update_index(update, KNNEngine(new), str(tmp_path))
+    assert NeighbourIndex.load(str(tmp_path)).meta['catalog_version'] == 'v0'
+
+
+def test_updates_stack_on_the_delta(recommender, tmp_path):
+    space = FeatureSpace()
+    matrix = np.array(recommender.data[:ROWS])
+    save_index(*build_index(matrix, top=TOP, workers=2, space=space), 'v0', str(tmp_path), space)
+    rng = np.random.default_rng(5)
+    for version in range(1, 4):
+        matrix, update = changed_catalog(matrix, rng, 1, 1)
+        update.previous_version, update.manifest = f'v{version - 1}', {'version': f'v{version}'}
+        assert update_index(update, KNNEngine(matrix, space=space), str(tmp_path))
+    index = NeighbourIndex.load(str(tmp_path))
+    assert index.is_fresh('v3', ROWS + 3, space) and index.meta['files']['delta']
+    assert_full_scan(index, matrix, space)
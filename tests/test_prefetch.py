@@ -0,0 +1,26 @@
+import numpy as np
+
+from Classifier import FeatureSpace
+from Neighbour_Index import NeighbourIndex
+from Prefetch import most_recommended
+from Recommender import Recommender
+
+TOP = 10
+
+
+def test_most_recommended_counts_the_lists_the_app_serves(recommender):
+    engine = recommender.engine
+    neighbours, distances = engine.kneighbours_batch(engine.matrix, TOP)
+    # A delta list replaces the base list of movie 3, the last movie only has one there
+    delta = {3: (np.full(TOP, 7), distances[3]), len(engine) - 1: (np.full(TOP, 9), distances[-1])}
+    index = NeighbourIndex(neighbours[:-1], distances[:-1], {'top': TOP}, delta)
+    served = Recommender(recommender.catalog, index, space=recommender.engine.space)
+
+    lists = np.concatenate([served.neighbours(i, TOP)[0] for i in range(len(served))])
+    counts = np.bincount(lists, minlength=len(served))
+    expected = np.lexsort((np.arange(len(served)), -counts))[:50].tolist()
+    assert most_recommended(served, 50) == expected
+
+
+def test_most_recommended_without_an_index(catalog):
+    assert most_recommended(Recommender(catalog, space=FeatureSpace()), 5) == [0, 1, 2, 3, 4]
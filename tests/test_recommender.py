@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def test_similar_excludes_the_movie_with_a_duplicate(recommender, duplicated_movie):
+    indices, distances = recommender.similar(duplicated_movie, 3)
+    assert duplicated_movie not in indices.tolist()
+    assert len(indices) == 3
+    # Its duplicate is still a neighbour, at distance 0
+    assert distances[0] == 0
+
+
+def test_similar_is_neighbours_without_the_movie(recommender):
+    for movie in (0, 44, 3575):
+        indices, distances = recommender.similar(movie, 10)
+        expected, expected_distances = recommender.neighbours(movie, 11)
+        keep = expected != movie
+        np.testing.assert_array_equal(indices, expected[keep][:10])
+        np.testing.assert_array_equal(distances, expected_distances[keep][:10])
+
+
+def page_through(cursor, size, pages):
+    indices, distances = [], []
+    for _ in range(pages):
+        page, page_distances = cursor.next_page(size)
+        indices += page
+        distances += page_distances
+    return indices, distances
+
+
+def test_genre_cursor_pages_equal_one_search(recommender):
+    cursor = recommender.genre_cursor(['Action', 'Sci-Fi'], 8)
+    indices, distances = page_through(cursor, 10, 20)
+    expected, expected_distances = recommender.by_features(recommender.genre_point(['Action', 'Sci-Fi'], 8), 200)
+    assert indices == expected.tolist()
+    assert distances == expected_distances.tolist()
+
+
+def test_similar_cursor_pages_equal_similar(recommender, duplicated_movie):
+    for movie in (0, duplicated_movie):
+        indices, _ = page_through(recommender.similar_cursor(movie), 7, 30)
+        assert indices == recommender.similar(movie, 210)[0].tolist()
+
+
+def test_cursor_never_repeats_and_ends(recommender):
+    cursor = recommender.genre_cursor(['Drama'], 6)
+    seen = []
+    while True:
+        page, _ = cursor.next_page(500)
+        if not page:
+            break
+        seen += page
+    assert cursor.exhausted
+    assert len(seen) == len(set(seen)) == len(recommender)
+
+
+def test_cursor_searches_grow_geometrically(recommender):
+    from Recommender import NeighbourCursor
+    asked = []
+
+    def search(k):
+        asked.append(k)
+        return recommender.by_features(recommender.genre_point(['Comedy'], 7), k)
+    page_through(NeighbourCursor(search, len(recommender)), 10, 20)
+    assert asked == [10, 20, 40, 80, 160, 320]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import Result_Cache
+from Result_Cache import ResultCache, query_key
+from Store import EnrichmentStore
+
+MOVIES = 6
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = EnrichmentStore(str(tmp_path / 'store.sqlite3'))
+    monkeypatch.setattr(Result_Cache, 'get_store', lambda: store)
+    return store
+
+
+def search(calls=None):
+    """The k nearest of MOVIES movies, recording the k of every search"""
+    def compute(k):
+        if calls is not None:
+            calls.append(k)
+        k = min(k, MOVIES)
+        return np.arange(k)[::-1].copy(), np.linspace(0, 1, MOVIES)[:k]
+    return compute
+
+
+def test_canonical_key():
+    assert query_key(['Sci-Fi', 'Action', 'Action'], 8, 'v1') == query_key(['Action', 'Sci-Fi'], 8.0, 'v1')
+    assert query_key(['Action'], 8, 'v1') != query_key(['Action'], 8, 'v2')
+
+
+def test_memory_hits_and_hit_rate(store):
+    cache = ResultCache()
+    first = cache.get_or_compute('a', 3, search())
+    second = cache.get_or_compute('a', 3, search())
+    assert np.shares_memory(first[0], second[0]) and not first[0].flags.writeable
+    assert cache.stats()['hit_rate'] == 0.5
+
+
+def test_smaller_k_is_a_slice_of_a_larger_search(store):
+    calls = []
+    cache = ResultCache(store=False)
+    cache.get_or_compute('a', 4, search(calls))
+    indices, distances = cache.get_or_compute('a', 2, search(calls))
+    assert indices.tolist() == [3, 2] and distances.tolist() == [0.0, 0.2]
+    # A larger k searches again and replaces the entry
+    cache.get_or_compute('a', 5, search(calls))
+    cache.get_or_compute('a', 4, search(calls))
+    assert calls == [4, 5]
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+
+
+def test_a_complete_result_serves_any_k(store):
+    calls = []
+    cache = ResultCache(store=False)
+    cache.get_or_compute('a', 10, search(calls))
+    indices, _ = cache.get_or_compute('a', 50, search(calls))
+    assert len(indices) == MOVIES and calls == [10]
+
+
+def test_every_search_is_written_to_the_store(store):
+    ResultCache().get_or_compute('a', 3, search())
+    assert store.get_json('a')['k'] == 3
+
+
+def test_other_process_reads_the_store(store):
+    ResultCache().get_or_compute('a', 4, search())
+    other = ResultCache()
+    indices, distances = other.get_or_compute('a', 3, lambda k: pytest.fail('searched again'))
+    assert indices.tolist() == [3, 2, 1] and distances.tolist() == [0.0, 0.2, 0.4]
+    assert other.stats()['store_hits'] == 1
+    # A stored search for a smaller k does not serve a larger one
+    calls = []
+    other.get_or_compute('a', 5, search(calls))
+    assert calls == [5] and store.get_json('a')['k'] == 5
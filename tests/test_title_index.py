@@ -0,0 +1,51 @@
+import pytest
+
+from Title_Index import TitleIndex, normalize_title
+
+
+@pytest.fixture(scope='module')
+def titles(catalog):
+    return TitleIndex.from_catalog(catalog)
+
+
+def labels(titles, ids):
+    return [titles.titles[i] for i in ids]
+
+
+def test_exact_lookup_folds_case_accents_and_punctuation(titles):
+    assert normalize_title('  Amélie!! ') == 'amelie'
+    assert labels(titles, titles.lookup('AVATAR')) == ['Avatar']
+    assert labels(titles, titles.search('amelie', 1)) == ['Amélie']
+    assert titles.resolve('No Such Movie Anywhere') is None
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('termnator', 'The Terminator'),
+    ('the dark knigt', 'The Dark Knight'),
+    ('pirates of the carribean', "Pirates of the Caribbean: At World's End"),
+    ('Inceptoin', 'Inception'),
+])
+def test_typos_find_the_title(titles, query, expected):
+    found = labels(titles, titles.search(query, 5))
+    assert found[0] == expected
+    key, similarity = titles.fuzzy(query, 1)[0]
+    assert key == normalize_title(expected) and 0 < similarity < 1
+
+
+def test_prefix_search(titles):
+    keys = titles.prefix('Star Wars: Ep', 10)
+    assert keys and all(key.startswith('star wars ep') for key in keys) and keys == sorted(keys)
+    assert labels(titles, titles.search('avat', 1)) == ['Avatar']
+    # The exact title comes first, then the titles it starts
+    found = labels(titles, titles.search('The Dark Knight', 2))
+    assert found == ['The Dark Knight', 'The Dark Knight Rises']
+
+
+def test_years_tell_remakes_apart():
+    titles = TitleIndex(['King Kong', 'King Kong', 'Kingpin', 'King Kong'], [1933, 2005, 1996, 2005])
+    assert titles.lookup('king kong') == [0, 1, 3]
+    assert titles.lookup('king kong', 1933) == [0]
+    assert titles.resolve('King Kong', 2005) == 1 and titles.resolve('King Kong', 1976) == 0
+    # Rows repeating a title and year are listed once
+    assert titles.search('king kong', 5) == [0, 1, 2]
+    assert titles.label(0) == 'King Kong (1933)'